@@ -0,0 +1,350 @@
+import time
+import threading
+from collections import deque
+from types import SimpleNamespace
+from typing import Any, Dict, List, Optional, Tuple
+
+from client_pool import ClientPool, Endpoint, endpoints_from_env, _error_status
+from intent_classification import classify_email, completion_usage
+
+CONGESTION_STATUS = {429, 503, 504}
+
+
+class AdaptiveConcurrencyLimiter:
+    """
+    AIMD limit on the number of concurrent LLM requests.
+
+    The limit grows additively (by about one per round of `limit` successful requests)
+    while requests succeed with normal latency and the limit is actually reached, and is
+    cut multiplicatively on HTTP 429/503/504, timeouts and connection errors, or a latency
+    spike. LLM latency grows with the length of the output, so spikes are judged per
+    completion token: a request is a spike when it takes spike_factor times (and at least
+    min_spike seconds) longer than the smoothed seconds per token predict for its output
+    (counted as at least min_tokens, which covers the fixed time to the first token).
+    At most one cut is made per smoothed latency period, so a burst of rejections from
+    the same overload counts once.
+    """
+
+    def __init__(self,
+                 initial_limit: float = 4,
+                 min_limit: float = 1,
+                 max_limit: float = 64,
+                 increase: float = 1.0,
+                 backoff: float = 0.5,
+                 spike_factor: float = 2.0,
+                 min_spike: float = 0.1,
+                 min_tokens: int = 64,
+                 smoothing: float = 0.05,
+                 max_wait: float = 120.0,
+                 history_size: int = 1000):
+        """
+        Args:
+            initial_limit: Concurrent requests allowed at first
+            min_limit: Lowest limit
+            max_limit: Highest limit
+            increase: Limit added per round of `limit` healthy requests
+            backoff: Factor the limit is multiplied by on congestion
+            spike_factor: Latency above this multiple of the smoothed latency counts as a spike
+            min_spike: Seconds a spike must exceed the expected latency by (ignores jitter of fast calls)
+            min_tokens: Fewest completion tokens a request is counted as (also used when usage is unknown)
+            smoothing: Weight of each new sample in the smoothed latency
+            max_wait: Longest time a request waits for a free slot before failing
+            history_size: Number of limit changes kept in the history
+        """
+        self.limit = float(initial_limit)
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.increase = increase
+        self.backoff = backoff
+        self.spike_factor = spike_factor
+        self.min_spike = min_spike
+        self.min_tokens = min_tokens
+        self.smoothing = smoothing
+        self.max_wait = max_wait
+        self._condition = threading.Condition()
+        self._start = time.monotonic()
+        self._last_decrease = 0.0
+        self.smoothed_latency: Optional[float] = None
+        self.smoothed_token_latency: Optional[float] = None   # Seconds per (counted) completion token
+        self.in_flight = 0
+        self.successes = 0
+        self.rejections = 0
+        self.timeouts = 0
+        self.spikes = 0
+        self.errors = 0
+        self.decreases = 0
+        self.peak_limit = self.limit
+        self.history: deque = deque(maxlen=history_size)   # (seconds since start, limit, reason)
+        self.history.append((0.0, self.limit, "initial"))
+
+    def acquire(self) -> bool:
+        """Wait for a free slot; returns whether the request filled the limit"""
+        deadline = time.monotonic() + self.max_wait
+        with self._condition:
+            while self.in_flight >= max(1, int(self.limit)):
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise RuntimeError(f"No LLM request slot free within {self.max_wait:.0f}s "
+                                       f"(limit {self.limit:.1f})")
+                self._condition.wait(remaining)
+            self.in_flight += 1
+            return self.in_flight >= int(self.limit)
+
+    def _is_spike(self, latency: float, tokens: int) -> bool:
+        if self.smoothed_token_latency is None:
+            return False
+        expected = self.smoothed_token_latency * tokens
+        return latency > self.spike_factor * expected and latency - expected > self.min_spike
+
+    def _smooth(self, latency: float, tokens: int):
+        if self.smoothed_latency is None:
+            self.smoothed_latency, self.smoothed_token_latency = latency, latency / tokens
+        else:
+            self.smoothed_latency += self.smoothing * (latency - self.smoothed_latency)
+            self.smoothed_token_latency += self.smoothing * (latency / tokens - self.smoothed_token_latency)
+
+    def _record(self, reason: str):
+        self.history.append((time.monotonic() - self._start, self.limit, reason))
+
+    def _decrease(self, reason: str):
+        # Once per smoothed latency period: the rejections of one overload arrive together
+        now = time.monotonic()
+        if now - self._last_decrease < (self.smoothed_latency or 0.0):
+            return
+        self._last_decrease = now
+        self.decreases += 1
+        self.limit = max(self.min_limit, self.limit * self.backoff)
+        self._record(reason)
+
+    def release(self, latency: Optional[float] = None, saturated: bool = False, congestion: Optional[str] = None,
+                completion_tokens: int = 0):
+        """
+        Free a slot and adjust the limit.
+
+        Args:
+            latency: Seconds the request took (None if it failed)
+            saturated: Whether the request filled the limit when it started
+            congestion: '429', 'timeout' or similar if the request failed from overload
+            completion_tokens: Output tokens of the response (0 if unknown)
+        """
+        tokens = max(completion_tokens, self.min_tokens)
+        with self._condition:
+            self.in_flight -= 1
+            if congestion is not None:
+                if congestion == "timeout":
+                    self.timeouts += 1
+                else:
+                    self.rejections += 1
+                self._decrease(congestion)
+            elif latency is None:
+                self.errors += 1
+            elif self._is_spike(latency, tokens):
+                self.spikes += 1
+                self._smooth(latency, tokens)
+                self._decrease("latency spike")
+            else:
+                self.successes += 1
+                self._smooth(latency, tokens)
+                # Only grow a limit that is being used, so it can't drift far above real demand
+                if saturated and self.limit < self.max_limit:
+                    previous = int(self.limit)
+                    self.limit = min(self.max_limit, self.limit + self.increase / self.limit)
+                    self.peak_limit = max(self.peak_limit, self.limit)
+                    if int(self.limit) != previous:
+                        self._record("increase")
+            self._condition.notify_all()
+
+    def report(self) -> Dict[str, Any]:
+        """Current limit and counters"""
+        with self._condition:
+            return {
+                "limit": self.limit,
+                "in_flight": self.in_flight,
+                "smoothed_latency": self.smoothed_latency,
+                "smoothed_token_latency": self.smoothed_token_latency,
+                "successes": self.successes,
+                "rejections": self.rejections,
+                "timeouts": self.timeouts,
+                "spikes": self.spikes,
+                "errors": self.errors,
+                "decreases": self.decreases,
+                "peak_limit": self.peak_limit
+            }
+
+    def limit_history(self) -> List[Tuple[float, float, str]]:
+        """(seconds since start, limit, reason) of every limit change"""
+        with self._condition:
+            return list(self.history)
+
+
+def client_without_retries(endpoints: List[Endpoint]):
+    """
+    Client for an AdaptiveClient: neither the SDK nor the pool may retry 429s, or the
+    limiter never sees them. One endpoint gets its SDK client (built with max_retries=0);
+    several get a ClientPool with one attempt per request (it still balances requests
+    and rests an endpoint for its retry-after period).
+    """
+    if not endpoints:
+        raise RuntimeError("GROQ_API_KEY not found in environment")
+    if len(endpoints) == 1:
+        endpoints[0].build_client()
+        return endpoints[0].client
+    return ClientPool(endpoints, max_attempts=1)
+
+
+class AdaptiveClient:
+    """
+    Runs LLM requests under an AdaptiveConcurrencyLimiter.
+
+    Requests rejected for overload (429/503/504, timeouts, connection errors) cut the
+    limit and are retried after the provider's retry-after period; other errors are
+    raised unchanged. The client is a drop-in replacement for the instructor-patched
+    client (or a ClientPool), e.g. classify_email(email, llm_client=AdaptiveClient()).
+
+    By default requests go to the endpoints configured in the environment (see
+    endpoints_from_env) through client_without_retries. A client passed in must not
+    retry 429s itself.
+    """
+
+    def __init__(self, client=None, limiter: Optional[AdaptiveConcurrencyLimiter] = None, max_attempts: int = 4,
+                 endpoints: Optional[List[Endpoint]] = None):
+        """
+        Args:
+            client: Client the requests are sent with, without retries of its own
+                (default: client_without_retries of `endpoints`)
+            limiter: Limiter to use (default: a new AdaptiveConcurrencyLimiter)
+            max_attempts: Attempts per request when it is rejected for overload
+            endpoints: Endpoints used when no client is given (default: from the environment)
+        """
+        self.client = client
+        self.endpoints = endpoints
+        self.limiter = limiter or AdaptiveConcurrencyLimiter()
+        self.max_attempts = max_attempts
+        self._client_lock = threading.Lock()
+
+        # Same call shape as the patched SDK client
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    def create(self, **kwargs):
+        """Send a chat completion under the concurrency limit (same arguments as the patched client)"""
+        if self.client is None:
+            with self._client_lock:
+                if self.client is None:
+                    self.client = client_without_retries(self.endpoints or endpoints_from_env())
+
+        for attempt in range(1, self.max_attempts + 1):
+            saturated = self.limiter.acquire()
+            start_time = time.perf_counter()
+            try:
+                response = self.client.chat.completions.create(**kwargs)
+            except Exception as e:
+                status, retry_after, connection_error = _error_status(e)
+                if connection_error or isinstance(e, TimeoutError):
+                    congestion = "timeout"
+                elif status in CONGESTION_STATUS:
+                    congestion = str(status)
+                else:
+                    self.limiter.release()
+                    raise
+                self.limiter.release(congestion=congestion)
+                if attempt == self.max_attempts:
+                    raise
+                time.sleep(retry_after if retry_after is not None else (self.limiter.smoothed_latency or 0.1))
+                continue
+            self.limiter.release(time.perf_counter() - start_time, saturated,
+                                 completion_tokens=completion_usage(response)["completion_tokens"])
+            return response
+
+    def report(self) -> Dict[str, Any]:
+        return self.limiter.report()
+
+    def print_report(self):
+        report = self.report()
+        print("\n--- Adaptive Concurrency ---")
+        print(f"Limit: {report['limit']:.1f} (peak {report['peak_limit']:.1f}), "
+              f"{report['decreases']} cuts; smoothed latency: {(report['smoothed_latency'] or 0) * 1000:.0f} ms")
+        print(f"Successes: {report['successes']}, 429/503/504: {report['rejections']}, "
+              f"timeouts: {report['timeouts']}, latency spikes: {report['spikes']}, other errors: {report['errors']}")
+
+
+def run_capacity_profile(profile: List[Tuple[float, int]], concurrency: Optional[int] = None,
+                         workers: int = 48, latency: float = 0.2) -> Dict[str, Any]:
+    """
+    Load a local mock endpoint whose capacity (concurrent requests before HTTP 429)
+    changes over time, with an adaptive limit or a fixed number of concurrent requests.
+    Emails go through classify_email with the same client `stream --adaptive` uses
+    (an AdaptiveClient over client_without_retries).
+
+    Args:
+        profile: (seconds, capacity) phases of the mock endpoint
+        concurrency: Fixed concurrent requests (None: adaptive limit)
+        workers: Threads generating load
+        latency: Seconds each mock completion takes
+
+    Returns:
+        Dict with per-phase rows (capacity, completed, 429s, mean limit) and the client used
+    """
+    from mock_llm_server import start_mock_server
+    from email_preprocessing import preprocess_email
+
+    server = start_mock_server(latency=latency, capacity=profile[0][1])
+    endpoints = [Endpoint(name="mock", api_key="test", base_url=f"http://127.0.0.1:{server.server_port}")]
+    if concurrency is None:
+        client = AdaptiveClient(limiter=AdaptiveConcurrencyLimiter(max_limit=workers), endpoints=endpoints)
+        adaptive = client
+    else:
+        client, adaptive = client_without_retries(endpoints), None
+    fixed = threading.Semaphore(concurrency or workers)
+    email = preprocess_email("Subject: Closing dates\n\nPlease send the escrow schedule for 125 King St.")
+    stop = threading.Event()
+    completed = [0]
+    lock = threading.Lock()
+
+    def call():
+        with fixed:
+            return classify_email(email, model="mock", llm_client=client)
+
+    def worker():
+        while not stop.is_set():
+            try:
+                call()
+            except Exception:
+                continue
+            with lock:
+                completed[0] += 1
+
+    threads = [threading.Thread(target=worker, daemon=True) for _ in range(workers)]
+    for thread in threads:
+        thread.start()
+
+    rows = []
+    for seconds, capacity in profile:
+        server.state.capacity = capacity
+        done_before, rejected_before = completed[0], server.state.rate_limited
+        limits, phase_end = [], time.monotonic() + seconds
+        while time.monotonic() < phase_end:
+            time.sleep(0.05)
+            limits.append(adaptive.limiter.limit if adaptive else concurrency)
+        rows.append({"capacity": capacity, "completed": completed[0] - done_before,
+                     "rejected": server.state.rate_limited - rejected_before,
+                     "mean_limit": sum(limits) / len(limits), "seconds": seconds})
+
+    stop.set()
+    for thread in threads:
+        thread.join()
+    server.shutdown()
+    return {"phases": rows, "client": adaptive}
+
+
+# Test function
+if __name__ == "__main__":
+    # Capacity drifts up and down, as provider capacity does through the day
+    profile = [(5, 8), (5, 24), (5, 4), (5, 16)]
+    result = run_capacity_profile(profile)
+    for row in result["phases"]:
+        print(f"Capacity {row['capacity']:>2}: mean limit {row['mean_limit']:5.1f}, "
+              f"{row['completed'] / row['seconds']:.0f} req/s, {row['rejected']} rejected")
+    result["client"].print_report()
+    print("Limit history (last 10 changes):")
+    for elapsed, limit, reason in result["client"].limiter.limit_history()[-10:]:
+        print(f"  {elapsed:6.2f}s  {limit:5.1f}  {reason}")
@@ -0,0 +1,272 @@
+import json
+import time
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from groq import Groq
+from instructor import openai_schema
+from pydantic import ValidationError
+
+from system_prompt import ENHANCED_SYSTEM_PROMPT
+from intent_classification import (
+    EmailClassification, DEFAULT_MODEL, MAX_COMPLETION_TOKENS, apply_preprocessing_hints
+)
+from email_preprocessing import preprocess_email
+from client_pool import endpoints_from_env
+from token_accounting import check_token_budget
+from result_export import ResultWriter
+
+BATCH_ENDPOINT = "/v1/chat/completions"
+TERMINAL_STATUSES = {"completed", "failed", "expired", "cancelled"}
+
+# Same function schema instructor sends for EmailClassification in tool-call mode
+CLASSIFICATION_TOOL = {"type": "function", "function": openai_schema(EmailClassification).openai_schema}
+CLASSIFICATION_TOOL_CHOICE = {"type": "function", "function": {"name": CLASSIFICATION_TOOL["function"]["name"]}}
+
+
+def batch_request_line(custom_id: str, text: str, model: str = DEFAULT_MODEL) -> Dict:
+    """
+    One line of a batch request file: a chat completion for one email.
+
+    The text goes through the same token budget check as interactive requests, so an
+    email too long for the model's context window is trimmed instead of failing in the batch.
+    """
+    budget = check_token_budget(ENHANCED_SYSTEM_PROMPT, text, MAX_COMPLETION_TOKENS, model)
+    return {
+        "custom_id": custom_id,
+        "method": "POST",
+        "url": BATCH_ENDPOINT,
+        "body": {
+            "model": model,
+            "temperature": 0.1,
+            "max_completion_tokens": MAX_COMPLETION_TOKENS,
+            "messages": [
+                {"role": "system", "content": ENHANCED_SYSTEM_PROMPT},
+                {"role": "user", "content": budget.text}
+            ],
+            "tools": [CLASSIFICATION_TOOL],
+            "tool_choice": CLASSIFICATION_TOOL_CHOICE
+        }
+    }
+
+
+def build_batch_file(emails: Iterable[Tuple[str, str]], path: str, model: str = DEFAULT_MODEL) -> int:
+    """
+    Write a batch request file (JSONL) for (id, raw email text) pairs.
+
+    Emails are preprocessed as classify_email would; the two preprocessing flags
+    classify_email applies to its result (attachments, urgency) are written to
+    '<path>.hints' (JSON lines keyed by custom_id) so merged batch results match
+    interactive ones.
+
+    Returns:
+        Number of requests written
+    """
+    written = 0
+    seen = set()
+    with open(path, "w", encoding="utf-8", buffering=1 << 20) as requests_file, \
+            open(path + ".hints", "w", encoding="utf-8", buffering=1 << 20) as hints_file:
+        for custom_id, email_text in emails:
+            if custom_id in seen:
+                raise ValueError(f"Duplicate custom id: {custom_id}")
+            seen.add(custom_id)
+
+            processed = preprocess_email(email_text)
+            requests_file.write(json.dumps(batch_request_line(custom_id, processed.clean_text, model),
+                                           ensure_ascii=False) + "\n")
+            hints_file.write(json.dumps({"custom_id": custom_id, "has_attachments": processed.has_attachments,
+                                         "urgent_indicators": processed.urgent_indicators},
+                                        ensure_ascii=False) + "\n")
+            written += 1
+    return written
+
+
+def batch_client(base_url: Optional[str] = None, api_key: Optional[str] = None) -> Groq:
+    """Plain (not instructor-patched) Groq client for the files and batches API"""
+    if api_key is None:
+        endpoints = endpoints_from_env()
+        if not endpoints:
+            raise RuntimeError("GROQ_API_KEY not found in environment")
+        api_key = endpoints[0].api_key
+        base_url = base_url or endpoints[0].base_url
+    return Groq(api_key=api_key, base_url=base_url)
+
+
+def submit_batch(client: Groq, path: str, completion_window: str = "24h") -> str:
+    """Upload a batch request file and create the batch; returns the batch id"""
+    with open(path, "rb") as f:
+        uploaded = client.files.create(file=f, purpose="batch")
+    batch = client.batches.create(input_file_id=uploaded.id, endpoint=BATCH_ENDPOINT,
+                                  completion_window=completion_window)
+    print(f"[Batch] Submitted {path} as batch {batch.id} (file {uploaded.id})")
+    return batch.id
+
+
+def wait_for_batch(client: Groq, batch_id: str, poll_interval: float = 30.0, timeout: Optional[float] = None):
+    """Poll a batch until it reaches a terminal status; returns the final batch object"""
+    deadline = time.monotonic() + timeout if timeout is not None else None
+    while True:
+        batch = client.batches.retrieve(batch_id)
+        counts = batch.request_counts
+        progress = f" ({counts.completed}/{counts.total} done, {counts.failed} failed)" if counts else ""
+        print(f"[Batch] {batch_id}: {batch.status}{progress}")
+        if batch.status in TERMINAL_STATUSES:
+            return batch
+        if deadline is not None and time.monotonic() >= deadline:
+            raise TimeoutError(f"Batch {batch_id} not finished after {timeout}s (status: {batch.status})")
+        time.sleep(poll_interval)
+
+
+def download_file(client: Groq, file_id: str, path: str):
+    """Download a batch output or error file"""
+    response = client.files.content(file_id)
+    with open(path, "wb") as f:
+        for chunk in response.iter_bytes():
+            f.write(chunk)
+
+
+def parse_batch_output(path: str) -> Iterator[Tuple[str, Optional[EmailClassification], Optional[str]]]:
+    """
+    Validate the lines of a batch output (or error) file.
+
+    Yields:
+        (custom_id, classification, None) for valid results and
+        (custom_id, None, error message) for failed or invalid ones
+    """
+    with open(path, "rb") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            custom_id = record.get("custom_id")
+            response = record.get("response") or {}
+            if record.get("error") or response.get("status_code") != 200:
+                error = record.get("error") or response.get("body", {}).get("error") or response
+                yield custom_id, None, f"request failed: {error}"
+                continue
+
+            try:
+                message = response["body"]["choices"][0]["message"]
+                tool_calls = message.get("tool_calls") or []
+                arguments = tool_calls[0]["function"]["arguments"] if tool_calls else message.get("content")
+                yield custom_id, EmailClassification.model_validate_json(arguments), None
+            except (KeyError, IndexError, TypeError, ValidationError) as e:
+                yield custom_id, None, f"invalid response: {e}"
+
+
+@dataclass
+class MergeReport:
+    """Outcome of merging batch results"""
+    succeeded: int = 0
+    failed: Dict[str, str] = field(default_factory=dict)     # custom_id -> error
+    missing: List[str] = field(default_factory=list)         # custom_ids without any result
+
+
+def merge_results(request_path: str, output_paths: List[str], export_path: str) -> MergeReport:
+    """
+    Merge validated batch results back by custom id and export them in request order.
+
+    Args:
+        request_path: The batch request file (its '.hints' sidecar is applied to the results)
+        output_paths: Downloaded output / error files of the batch
+        export_path: Where results are written (JSON lines via ResultWriter, .gz/.zst supported)
+
+    Returns:
+        MergeReport with counts, per-request errors and ids that got no result
+    """
+    report = MergeReport()
+    results: Dict[str, EmailClassification] = {}
+    for path in output_paths:
+        for custom_id, classification, error in parse_batch_output(path):
+            if classification is not None:
+                results[custom_id] = classification
+            else:
+                report.failed[custom_id] = error
+
+    with open(request_path + ".hints", encoding="utf-8") as hints, ResultWriter(export_path) as writer:
+        for line in hints:
+            hint = json.loads(line)
+            custom_id = hint["custom_id"]
+            classification = results.pop(custom_id, None)
+            if classification is None:
+                if custom_id not in report.failed:
+                    report.missing.append(custom_id)
+                continue
+
+            # Same adjustments classify_email makes from preprocessing metadata
+            apply_preprocessing_hints(classification, hint["has_attachments"], hint["urgent_indicators"])
+            writer.write(custom_id, classification)
+            report.succeeded += 1
+
+    for custom_id in results:
+        report.failed[custom_id] = "custom id not in the request file"
+    return report
+
+
+def run_batch_job(emails: Iterable[Tuple[str, str]], request_path: str, export_path: str,
+                  client: Optional[Groq] = None, model: str = DEFAULT_MODEL,
+                  poll_interval: float = 30.0, timeout: Optional[float] = None) -> MergeReport:
+    """
+    Build, submit and wait for a batch, then validate and merge its results.
+
+    Args:
+        emails: (id, raw email text) pairs
+        request_path: Where the batch request file is written
+        export_path: Where merged results are written
+        client: Groq client for the files/batches API (default: from the environment)
+        model: Model used for classification
+        poll_interval: Seconds between status polls
+        timeout: Give up waiting after this many seconds (None: wait for the completion window)
+
+    Returns:
+        MergeReport
+    """
+    client = client or batch_client()
+    count = build_batch_file(emails, request_path, model)
+    print(f"[Batch] Wrote {count} requests to {request_path}")
+
+    batch = wait_for_batch(client, submit_batch(client, request_path), poll_interval, timeout)
+    output_paths = []
+    for kind, file_id in (("output", batch.output_file_id), ("errors", batch.error_file_id)):
+        if file_id:
+            path = f"{request_path}.{kind}.jsonl"
+            download_file(client, file_id, path)
+            output_paths.append(path)
+
+    report = merge_results(request_path, output_paths, export_path)
+    print(f"[Batch] {batch.status}: {report.succeeded} merged into {export_path}, "
+          f"{len(report.failed)} failed, {len(report.missing)} missing")
+    return report
+
+
+def iter_input_emails(path: str) -> Iterator[Tuple[str, str]]:
+    """(id, text) pairs from an mbox archive or a JSON lines file with email_id/content fields"""
+    if path.endswith((".jsonl", ".ndjson")):
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    record = json.loads(line)
+                    yield record["email_id"], record["content"]
+        return
+
+    from mail_corpus import MailCorpus, message_text
+    with MailCorpus(path) as corpus:
+        corpus.open_index()
+        for entry in corpus.entries:
+            # Only the subject and the decoded body are sent; the header block is dropped
+            yield entry.message_id, message_text(corpus.slice(entry))
+
+
+# Test function
+if __name__ == "__main__":
+    import os
+    import tempfile
+    from mock_llm_server import start_mock_server
+    from synthetic_corpus import SyntheticCorpusGenerator
+
+    server = start_mock_server(batch_delay=0.5, error_rate=0.05)
+    directory = tempfile.mkdtemp()
+    emails = ((email.email_id, email.content) for email in SyntheticCorpusGenerator(seed=3).generate(50))
+    report = run_batch_job(emails, os.path.join(directory, "requests.jsonl"), os.path.join(directory, "results.jsonl"),
+                           client=batch_client(f"http://127.0.0.1:{server.server_port}", "test"), poll_interval=0.2)
+    print(f"Failed: {report.failed}")
@@ -0,0 +1,437 @@
+import argparse
+import json
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from intent_classification import EmailClassification
+
+
+def sample_classification() -> EmailClassification:
+    """A fixed, valid classification used by simulated backends"""
+    return EmailClassification(
+        primary_intent="intent_transaction_date_navigator",
+        secondary_intents=[],
+        intent_details=[{
+            "intent": "intent_transaction_date_navigator",
+            "confidence": 0.95,
+            "key_actions": ["Extract closing dates", "Create a schedule of escrow dates"]
+        }],
+        priority="high",
+        overall_confidence=0.95,
+        key_information=["125 King St property", "Escrow process focus"],
+        entities_mentioned=["125 King St"],
+        suggested_action="Compile escrow timeline document",
+        specialists_required=["Transaction specialist"],
+        estimated_completion_time="2-3 hours",
+        attachments_mentioned=False,
+        follow_up_required=True
+    )
+
+
+def benchmark_hedging(calls: int = 400, concurrency: int = 8, seed: int = 0):
+    """
+    Compare tail latency with and without hedging against a simulated LLM whose
+    latency is mostly fast with occasional slow responses.
+    """
+    from hedging import HedgedClassifier
+
+    rng = random.Random(seed)
+    rng_lock = threading.Lock()
+    result = sample_classification()
+
+    def simulated_llm(processed, **kwargs):
+        with rng_lock:
+            latency = rng.lognormvariate(-3.5, 0.3)   # ~30 ms median
+            if rng.random() < 0.03:
+                latency += 0.6   # Occasional slow response
+        time.sleep(latency)
+        return result
+
+    hedger = HedgedClassifier(classify_fn=simulated_llm, hedge_percentile=95, max_hedge_rate=0.1,
+                              initial_delay=0.1, max_workers=concurrency * 2)
+    email = "Subject: Closing dates\nPlease send the escrow schedule for 125 King St."
+
+    start_time = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(lambda _: hedger.classify(email), range(calls)))
+    elapsed = time.perf_counter() - start_time
+
+    print(f"Hedging benchmark: {calls} calls, concurrency {concurrency}, {elapsed:.2f}s")
+    hedger.print_report()
+    hedger.shutdown()
+
+
+def benchmark_memory(count: int = 20000):
+    """
+    Compare the memory held by `count` preprocessed emails in the compact ProcessedEmail
+    against the previous representation (separate body, clean_text, paragraphs and a
+    metadata dict per email). The compact objects are measured after clean_text was read,
+    as it is by every classification.
+    """
+    import tracemalloc
+    from dataclasses import dataclass
+    from typing import Any, Dict, List
+    from email_preprocessing import preprocess_email
+    from test import test_emails
+
+    @dataclass
+    class LegacyProcessedEmail:
+        subject: str
+        body: str
+        clean_text: str
+        metadata: Dict[str, Any]
+        paragraphs: List[str]
+
+    # Vary each email so no strings are shared between copies
+    emails = [f"{test_emails[i % len(test_emails)]['content']}\nRef #{i}" for i in range(count)]
+
+    def measure(build):
+        tracemalloc.start()
+        items = [build(email) for email in emails]
+        current, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        del items
+        return current
+
+    def build_compact(email):
+        processed = preprocess_email(email)
+        processed.clean_text
+        return processed
+
+    def build_legacy(email):
+        processed = preprocess_email(email)
+        return LegacyProcessedEmail(processed.subject, processed.body, processed.clean_text,
+                                    processed.metadata, processed.paragraphs)
+
+    compact = measure(build_compact)
+    legacy = measure(build_legacy)
+
+    print(f"Memory benchmark: {count} preprocessed emails")
+    print(f"  previous representation: {legacy / 2**20:.1f} MiB ({legacy / count:.0f} bytes/email)")
+    print(f"  compact ProcessedEmail:  {compact / 2**20:.1f} MiB ({compact / count:.0f} bytes/email)")
+    print(f"  reduction: {1 - compact / legacy:.0%}")
+
+
+def benchmark_preprocess(count: int = 20000):
+    """preprocess_email with every metadata detector run (previous behaviour) vs only what classify_email reads"""
+    from email_preprocessing import preprocess_email, METADATA_FIELDS
+    from synthetic_corpus import SyntheticCorpusGenerator
+
+    emails = [email.content for email in SyntheticCorpusGenerator(seed=1, max_filler_paragraphs=4).generate(count)]
+    paths = [
+        ("all metadata fields (previous)", lambda text: preprocess_email(text, fields=METADATA_FIELDS).clean_text),
+        ("classify_email path (lazy)", lambda text: (lambda p: (p.clean_text, p.has_attachments, p.urgent_indicators))(preprocess_email(text))),
+        ("clean_text only (lazy)", lambda text: preprocess_email(text).clean_text),
+    ]
+
+    print(f"Preprocess benchmark: {count} synthetic emails")
+    for name, fn in paths:
+        start_time = time.perf_counter()
+        for text in emails:
+            fn(text)
+        elapsed = time.perf_counter() - start_time
+        print(f"  {name:<32} {elapsed:.2f}s ({count / elapsed:,.0f} emails/s)")
+
+
+def _legacy_html_strip(body: str) -> str:
+    """The previous regex-based HTML handling of preprocess_email, for comparison"""
+    import re
+    body = re.sub(r'<(?!\/?(b|i|u|strong|em)>)[^>]*>', ' ', body)
+    body = re.sub(r'<\/?(?:b|i|u|strong|em)>', '', body)
+    body = re.sub(r'&nbsp;', ' ', body)
+    body = re.sub(r'&lt;', '<', body)
+    body = re.sub(r'&gt;', '>', body)
+    body = re.sub(r'&amp;', '&', body)
+    body = re.sub(r'&quot;', '"', body)
+    return body
+
+
+def _newsletter_html(size_bytes: int) -> str:
+    """Outlook/newsletter-like HTML of roughly size_bytes"""
+    head = ("<html><head><title>Weekly Listings</title><style>" + "td.c{font-family:Arial;color:#333;} " * 200 +
+            "</style><script>var t = 1 < 2 && 3 > 2;</script></head><body>")
+    row = ("<tr><td class=\"c\"><b>Riverfront Lofts</b>&nbsp;&ndash;&nbsp;12,500&nbsp;sq&nbsp;ft</td>"
+           "<td class=\"c\">$32.50 &euro;/sf &middot; NNN &amp; CAM</td><td>Class&nbsp;A &hellip;</td></tr>\n")
+    items = "<ol><li>Base rent &mdash; $32.50</li><li>Escalations 3%</li><li>TI allowance</li></ol>\n"
+    block = "<p>Available this week:</p><table>" + row * 20 + "</table>" + items
+    body = block * max(1, (size_bytes - len(head)) // len(block))
+    return head + body + "<p>Regards,<br>Listings Team</p></body></html>"
+
+
+def benchmark_html(sizes=(1, 4), chunk_size: int = 64 * 1024):
+    """
+    Regex tag stripping (previous path) vs html_to_text vs the streaming HtmlTextExtractor
+    fed in chunks, on MB-sized HTML
+    """
+    from html_to_text import html_to_text, HtmlTextExtractor
+    from email_preprocessing import preprocess_email
+
+    for megabytes in sizes:
+        document = _newsletter_html(megabytes * 2**20)
+
+        start_time = time.perf_counter()
+        legacy = _legacy_html_strip(document)
+        legacy_time = time.perf_counter() - start_time
+
+        start_time = time.perf_counter()
+        text = html_to_text(document)
+        convert_time = time.perf_counter() - start_time
+
+        start_time = time.perf_counter()
+        extractor = HtmlTextExtractor()
+        for offset in range(0, len(document), chunk_size):
+            extractor.feed(document[offset:offset + chunk_size])
+        extractor.close()
+        streamed = extractor.get_text()
+        stream_time = time.perf_counter() - start_time
+
+        start_time = time.perf_counter()
+        preprocess_email("Subject: Weekly listings\n\n" + document).clean_text
+        preprocess_time = time.perf_counter() - start_time
+
+        print(f"HTML benchmark: {len(document) / 2**20:.1f} MiB document")
+        print(f"  regex strip (previous): {legacy_time:.3f}s, {len(legacy) / 2**20:.2f} MiB text, "
+              f"style/script kept: {'td.c{' in legacy}, undecoded entities: {legacy.count('&ndash;')}")
+        print(f"  html_to_text:           {convert_time:.3f}s, {len(text) / 2**20:.2f} MiB text, "
+              f"style/script kept: {'td.c{' in text}, undecoded entities: {text.count('&ndash;')}")
+        print(f"  streaming parser:       {stream_time:.3f}s ({chunk_size // 1024} KiB chunks), "
+              f"same text: {streamed == text}")
+        print(f"  full preprocess_email:  {preprocess_time:.3f}s")
+
+
+def benchmark_export(count: int = 100000):
+    """Per-object pretty-printed JSON (previous output path) vs the buffered JSONL export and reader"""
+    import os
+    import tempfile
+    from result_export import ResultWriter, read_results
+    from intent_classification import EmailClassification
+
+    result = sample_classification()
+    directory = tempfile.mkdtemp()
+
+    start_time = time.perf_counter()
+    with open(os.path.join(directory, "pretty.json"), "w", encoding="utf-8") as f:
+        for _ in range(count):
+            f.write(result.model_dump_json(indent=2) + "\n")
+    pretty_time = time.perf_counter() - start_time
+    pretty_size = os.path.getsize(os.path.join(directory, "pretty.json"))
+
+    print(f"Export benchmark: {count} results")
+    print(f"  model_dump_json(indent=2) per object: {pretty_time:.2f}s ({count / pretty_time:,.0f}/s), "
+          f"{pretty_size / 2**20:.1f} MiB")
+
+    for name in ("results.jsonl", "results.jsonl.gz"):
+        path = os.path.join(directory, name)
+        start_time = time.perf_counter()
+        with ResultWriter(path) as writer:
+            for i in range(count):
+                writer.write(f"msg-{i}", result)
+        write_time = time.perf_counter() - start_time
+
+        start_time = time.perf_counter()
+        read = sum(1 for _ in read_results(path))
+        read_time = time.perf_counter() - start_time
+        print(f"  ResultWriter {name:<17} write {write_time:.2f}s ({count / write_time:,.0f}/s), "
+              f"{os.path.getsize(path) / 2**20:.1f} MiB; read {read} in {read_time:.2f}s ({read / read_time:,.0f}/s)")
+
+    # Reading the same file through json.loads + model_validate
+    start_time = time.perf_counter()
+    with open(os.path.join(directory, "results.jsonl"), encoding="utf-8") as f:
+        read = sum(1 for line in f if EmailClassification.model_validate(json.loads(line)["classification"]))
+    read_time = time.perf_counter() - start_time
+    print(f"  json.loads + model_validate per line: read {read} in {read_time:.2f}s ({read / read_time:,.0f}/s)")
+
+
+def benchmark_pool(key_counts=(1, 2, 4), rate_limit: int = 20, seconds: float = 3.0, concurrency: int = 32):
+    """
+    Throughput of a ClientPool over 1, 2 and 4 local mock endpoints, each limited to
+    rate_limit requests per second, plus one endpoint that always fails (ejected and retried elsewhere).
+    """
+    from client_pool import ClientPool, Endpoint
+    from mock_llm_server import start_mock_server
+    from intent_classification import EmailClassification
+    from token_accounting import COMPACT_SYSTEM_PROMPT
+
+    messages = [{"role": "system", "content": COMPACT_SYSTEM_PROMPT},
+                {"role": "user", "content": "Please send the escrow schedule for 125 King St."}]
+
+    for key_count in key_counts:
+        servers = [start_mock_server(latency=0.02, rate_limit=rate_limit, rate_window=1.0) for _ in range(key_count)]
+        servers.append(start_mock_server(error_rate=1.0))
+        pool = ClientPool([Endpoint(name=f"key-{i}", api_key="test", base_url=f"http://127.0.0.1:{server.server_port}",
+                                    request_limit=rate_limit) for i, server in enumerate(servers)],
+                          quota_window=1.0, ejection_time=0.5)
+        calls = int(rate_limit * key_count * seconds)
+
+        start_time = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            list(executor.map(lambda _: pool.chat.completions.create(
+                model="mock", response_model=EmailClassification, messages=messages), range(calls)))
+        elapsed = time.perf_counter() - start_time
+
+        rejected = sum(server.state.rate_limited for server in servers)
+        print(f"Pool benchmark: {key_count} key(s) x {rate_limit} req/s: {calls} calls in {elapsed:.2f}s "
+              f"= {calls / elapsed:.1f} req/s ({rejected} rejected by rate limits)")
+        pool.print_report()
+        for server in servers:
+            server.shutdown()
+
+
+def benchmark_segments(runs: int = 5, first_token_latency: float = 0.3, seconds_per_token: float = 0.012):
+    """
+    Wall-clock time of one classify_email call vs segment-parallel classification of the
+    multi-item test email, against a simulated LLM whose latency grows with output length.
+    """
+    from types import SimpleNamespace
+    from intent_classification import classify_email
+    from segment_classification import classify_segmented, SegmentClassification
+    from test import test_emails
+
+    intents = ["intent_amendment_abstraction", "intent_transaction_date_navigator",
+               "intent_clause_protect", "intent_company_research"]
+    full = EmailClassification.model_validate({**sample_classification().model_dump(mode="json"),
+        "primary_intent": intents[0],
+        "secondary_intents": intents[1:],
+        "intent_details": [{"intent": intent, "confidence": 0.9,
+                            "key_actions": ["Review the relevant documents in detail",
+                                            "Summarize the findings for the deal team",
+                                            "Flag anything that needs legal attention"]} for intent in intents],
+        "key_information": ["Jackson Heights amendment: rent escalations and renewal changes",
+                            "Riverfront Lofts: inspection, loan contingency and closing dates by tomorrow",
+                            "5th Avenue draft lease lacks indemnity; broad assignment clause",
+                            "Background check on Evergreen Property Holdings (portfolio, principals, litigation)"],
+        "entities_mentioned": ["Jackson Heights", "Riverfront Lofts", "5th Avenue", "Evergreen Property Holdings"],
+    })
+    segment = SegmentClassification(
+        intent=intents[1], confidence=0.93, priority="high", actionable=True,
+        summary="Critical dates schedule for the Riverfront Lofts acquisition",
+        key_actions=["Extract inspection, contingency and closing dates", "Deliver schedule by tomorrow"],
+        entities=["Riverfront Lofts"], specialist="Transaction coordinator", estimated_hours=2
+    )
+    output_tokens = {EmailClassification: len(full.model_dump_json()) // 4,
+                     SegmentClassification: len(segment.model_dump_json()) // 4}
+
+    def create(response_model, **kwargs):
+        time.sleep(first_token_latency + seconds_per_token * output_tokens[response_model])
+        return full.model_copy(deep=True) if response_model is EmailClassification else segment
+
+    llm = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create)))
+    email = next(e for e in test_emails if e["name"] == "Complex multi-intent email with numbered items")["content"]
+
+    for name, classify in (("single call", classify_email), ("segmented", classify_segmented)):
+        start_time = time.perf_counter()
+        for _ in range(runs):
+            classify(email, llm_client=llm)
+        elapsed = (time.perf_counter() - start_time) / runs
+        print(f"Segments benchmark: {name}: {elapsed * 1000:.0f} ms per email")
+    print(f"  Output tokens: full classification ~{output_tokens[EmailClassification]}, "
+          f"per segment ~{output_tokens[SegmentClassification]}")
+
+
+def benchmark_shadow(calls: int = 300, concurrency: int = 8):
+    """
+    Primary-path latency with and without shadow mode, mirroring every call to a
+    simulated candidate that is 10x slower (samples beyond max_pending are dropped).
+    """
+    from shadow_mode import ShadowClassifier
+    from helper import percentile
+
+    result = sample_classification()
+
+    def simulated_llm(latency):
+        def classify(processed, **kwargs):
+            time.sleep(latency)
+            return result
+        return classify
+
+    primary = simulated_llm(0.02)
+    email = "Subject: Closing dates\nPlease send the escrow schedule for 125 King St."
+    shadow = ShadowClassifier(candidate_fn=simulated_llm(0.2), primary_fn=primary, sample_rate=1.0,
+                              max_workers=4, max_pending=8, seed=0)
+
+    for name, classify in (("without shadow", lambda: primary(email)), ("with shadow", lambda: shadow.classify(email))):
+        def timed(_):
+            start_time = time.perf_counter()
+            classify()
+            return time.perf_counter() - start_time
+
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            latencies = list(executor.map(timed, range(calls)))
+        print(f"Shadow benchmark: primary {name}: p50 {percentile(latencies, 50) * 1000:.1f} ms, "
+              f"p95 {percentile(latencies, 95) * 1000:.1f} ms")
+    shadow.shutdown()
+    shadow.print_report()
+
+
+def benchmark_coalescing(distinct: int = 20, copies: int = 10, concurrency: int = 32, latency: float = 0.1):
+    """
+    LLM requests and wall-clock time for a burst of duplicate emails (each of `distinct`
+    emails arriving `copies` times at once) with and without request coalescing.
+    """
+    from types import SimpleNamespace
+    from request_coalescing import CoalescingClassifier
+    from intent_classification import classify_email
+
+    result = sample_classification()
+    requests = []
+
+    def create(**kwargs):
+        requests.append(1)
+        time.sleep(latency)
+        return result.model_copy(deep=True)
+
+    llm = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create)))
+    emails = [f"Subject: Closing dates {i}\nPlease send the escrow schedule for {100 + i} King St."
+              for i in range(distinct)] * copies
+    random.Random(0).shuffle(emails)
+    coalescer = CoalescingClassifier()
+
+    for name, classify in (("without coalescing", classify_email), ("with coalescing", coalescer.classify)):
+        requests.clear()
+        start_time = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            list(executor.map(lambda email: classify(email, llm_client=llm), emails))
+        elapsed = time.perf_counter() - start_time
+        print(f"Coalescing benchmark: {name}: {len(emails)} emails, {len(requests)} LLM requests in {elapsed:.2f}s")
+    coalescer.print_report()
+
+
+def benchmark_adaptive(profile=((4, 8), (4, 24), (4, 4), (4, 16))):
+    """
+    Completed requests and 429s against a mock endpoint whose capacity changes over time,
+    with fixed concurrency (low and high) and with the adaptive AIMD limit.
+    """
+    from adaptive_concurrency import run_capacity_profile
+
+    print(f"Capacity profile (seconds, concurrent requests): {list(profile)}")
+    for name, concurrency in (("fixed 4", 4), ("fixed 24", 24), ("adaptive", None)):
+        result = run_capacity_profile(list(profile), concurrency=concurrency)
+        phases = result["phases"]
+        completed = sum(row["completed"] for row in phases)
+        rejected = sum(row["rejected"] for row in phases)
+        limits = ", ".join(f"{row['mean_limit']:.1f}" for row in phases)
+        print(f"Adaptive benchmark: {name}: {completed} completed, {rejected} rejected with 429 "
+              f"(mean limit per phase: {limits})")
+
+
+BENCHMARKS = {
+    "hedging": benchmark_hedging,
+    "memory": benchmark_memory,
+    "preprocess": benchmark_preprocess,
+    "html": benchmark_html,
+    "export": benchmark_export,
+    "pool": benchmark_pool,
+    "segments": benchmark_segments,
+    "shadow": benchmark_shadow,
+    "coalescing": benchmark_coalescing,
+    "adaptive": benchmark_adaptive,
+}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Performance benchmarks for the email classification system")
+    parser.add_argument("name", choices=sorted(BENCHMARKS), help="Benchmark to run")
+    args = parser.parse_args()
+    BENCHMARKS[args.name]()
@@ -37,4 +37,5 @@ def process_email_batch(emails):
             print(f"Error classifying email: {e}")
 
 
-process_email_batch(sample_emails)
+if __name__ == "__main__":
+    process_email_batch(sample_emails)
@@ -0,0 +1,286 @@
+import os
+import json
+import time
+import threading
+from collections import deque
+from dataclasses import dataclass, field
+from types import SimpleNamespace
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+import instructor
+from groq import Groq, APIConnectionError as GroqConnectionError
+
+from token_accounting import estimate_messages_tokens
+
+# Generic OpenAI-compatible endpoints use the openai package when it is installed
+try:
+    from openai import OpenAI, APIConnectionError as OpenAIConnectionError
+except ImportError:
+    OpenAI = None
+    OpenAIConnectionError = GroqConnectionError
+
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+CONNECTION_ERRORS = (GroqConnectionError, OpenAIConnectionError)
+
+
+@dataclass
+class Endpoint:
+    """One API key / endpoint of the pool, with its limits and live state"""
+    name: str
+    api_key: str
+    base_url: Optional[str] = None      # None: the Groq API
+    kind: str = "groq"                  # 'groq' (Groq SDK) or 'openai' (any OpenAI-compatible server)
+    request_limit: Optional[int] = None  # Requests per quota window (RPM with the default 60 s window)
+    token_limit: Optional[int] = None    # Tokens per quota window (TPM with the default 60 s window)
+
+    client: Any = field(default=None, repr=False)
+    in_flight: int = 0
+    requests: int = 0
+    failures: int = 0
+    ejections: int = 0
+    consecutive_failures: int = 0
+    ejected_until: float = 0.0
+    _window: Deque[Tuple[float, int]] = field(default_factory=deque, repr=False)   # (time, tokens) of recent requests
+    _window_tokens: int = field(default=0, repr=False)
+
+    def build_client(self):
+        """Create the instructor-patched SDK client (SDK retries are off; the pool retries elsewhere)"""
+        if self.kind == "openai":
+            if OpenAI is None:
+                raise RuntimeError(f"Endpoint {self.name} needs the 'openai' package (pip install openai).")
+            sdk = OpenAI(api_key=self.api_key, base_url=self.base_url, max_retries=0)
+        else:
+            sdk = Groq(api_key=self.api_key, base_url=self.base_url, max_retries=0)
+        self.client = instructor.patch(sdk)
+
+    def expire(self, now: float, window: float):
+        """Drop requests older than the quota window"""
+        while self._window and now - self._window[0][0] >= window:
+            self._window_tokens -= self._window.popleft()[1]
+
+    def headroom(self, tokens: int) -> float:
+        """Fraction of the quota still available after a request of `tokens` (negative if it doesn't fit)"""
+        fractions = [1.0]
+        if self.request_limit:
+            fractions.append((self.request_limit - len(self._window) - 1) / self.request_limit)
+        if self.token_limit:
+            fractions.append((self.token_limit - self._window_tokens - tokens) / self.token_limit)
+        return min(fractions)
+
+
+def _error_status(error: BaseException) -> Tuple[Optional[int], Optional[float], bool]:
+    """(HTTP status, retry-after seconds, is connection error) found anywhere in an exception chain"""
+    seen = set()
+    while error is not None and id(error) not in seen:
+        seen.add(id(error))
+        if isinstance(error, CONNECTION_ERRORS):
+            return None, None, True
+        status = getattr(error, "status_code", None)
+        if isinstance(status, int):
+            retry_after = None
+            response = getattr(error, "response", None)
+            if response is not None:
+                try:
+                    retry_after = float(response.headers.get("retry-after"))
+                except (TypeError, ValueError):
+                    pass
+            return status, retry_after, False
+        error = error.__cause__ or error.__context__
+    return None, None, False
+
+
+class ClientPool:
+    """
+    Spreads chat completion requests over several API keys / OpenAI-compatible endpoints.
+
+    Each request goes to the healthy endpoint with the most remaining quota (requests and
+    tokens in the current window), divided by its in-flight load. Requests wait when every
+    endpoint's quota is used up, so no endpoint is pushed past its own limits. The request is
+    retried on another endpoint after HTTP 429, 5xx or a connection error: on 429 the endpoint
+    rests for its retry-after period; on other failures it is ejected for an exponentially
+    growing period and, once back, receives one probe request at a time until one succeeds.
+
+    The pool is a drop-in replacement for the instructor-patched client:
+        pool.chat.completions.create(model=..., response_model=..., messages=...)
+    """
+
+    def __init__(self,
+                 endpoints: List[Endpoint],
+                 max_attempts: int = 4,
+                 ejection_time: float = 5.0,
+                 max_ejection_time: float = 60.0,
+                 quota_window: float = 60.0,
+                 max_wait: float = 120.0):
+        """
+        Args:
+            endpoints: Endpoints of the pool
+            max_attempts: Attempts per request across endpoints
+            ejection_time: Base ejection period after a failure (doubles per consecutive failure)
+            max_ejection_time: Upper bound of the ejection period
+            quota_window: Length in seconds of the window request_limit/token_limit apply to
+            max_wait: Longest time a request waits for quota before failing
+        """
+        if not endpoints:
+            raise ValueError("ClientPool needs at least one endpoint")
+        self.endpoints = endpoints
+        self.max_attempts = max_attempts
+        self.ejection_time = ejection_time
+        self.max_ejection_time = max_ejection_time
+        self.quota_window = quota_window
+        self.max_wait = max_wait
+        self._condition = threading.Condition()
+
+        for endpoint in self.endpoints:
+            if endpoint.client is None:
+                endpoint.build_client()
+
+        # Same call shape as the patched SDK client
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    def _acquire(self, tokens: int, exclude: set) -> Endpoint:
+        """Reserve quota on the best endpoint (preferring ones not in `exclude`), waiting while none has room"""
+        deadline = time.monotonic() + self.max_wait
+        with self._condition:
+            while True:
+                now = time.monotonic()
+                best, best_score = None, None
+                wake_at = deadline
+                for endpoint in self.endpoints:
+                    endpoint.expire(now, self.quota_window)
+                    if endpoint.ejected_until > now:
+                        wake_at = min(wake_at, endpoint.ejected_until)
+                        continue
+                    if endpoint.consecutive_failures and endpoint.in_flight:
+                        continue   # Back from ejection: one probe request at a time until it succeeds
+                    headroom = endpoint.headroom(tokens)
+                    if headroom < 0:
+                        if endpoint._window:
+                            wake_at = min(wake_at, endpoint._window[0][0] + self.quota_window)
+                        continue
+                    # Endpoints this request already failed on are only used when nothing else is available
+                    score = (endpoint.name not in exclude, (headroom + 1e-3) / (endpoint.in_flight + 1))
+                    if best_score is None or score > best_score:
+                        best, best_score = endpoint, score
+
+                if best is not None:
+                    best.in_flight += 1
+                    best.requests += 1
+                    best._window.append((now, tokens))
+                    best._window_tokens += tokens
+                    return best
+
+                if now >= deadline:
+                    raise RuntimeError("No LLM endpoint available: all are ejected or out of quota")
+                self._condition.wait(max(0.001, wake_at - now))
+
+    def _release(self, endpoint: Endpoint, error: Optional[BaseException] = None, status: Optional[int] = None,
+                 retry_after: Optional[float] = None):
+        with self._condition:
+            endpoint.in_flight -= 1
+            if error is None:
+                endpoint.consecutive_failures = 0
+            else:
+                endpoint.failures += 1
+                endpoint.ejections += 1
+                if status == 429:
+                    # Out of quota, not unhealthy: rest until the provider says the limit resets
+                    period = retry_after if retry_after is not None else self.ejection_time
+                else:
+                    endpoint.consecutive_failures += 1
+                    backoff = self.ejection_time * 2 ** (endpoint.consecutive_failures - 1)
+                    period = min(backoff, self.max_ejection_time)
+                endpoint.ejected_until = max(endpoint.ejected_until, time.monotonic() + period)
+                print(f"[Pool] Ejected {endpoint.name} for {period:.1f}s: {status or type(error).__name__}")
+            self._condition.notify_all()
+
+    def create(self, **kwargs):
+        """Send a chat completion through the pool (same arguments as the patched client)"""
+        tokens = estimate_messages_tokens(kwargs.get("messages", [])) + kwargs.get("max_completion_tokens", 0)
+        tried = set()
+        last_error = None
+
+        for _ in range(self.max_attempts):
+            endpoint = self._acquire(tokens, tried)
+            try:
+                response = endpoint.client.chat.completions.create(**kwargs)
+            except Exception as e:
+                status, retry_after, connection_error = _error_status(e)
+                if not connection_error and status not in RETRYABLE_STATUS:
+                    self._release(endpoint)
+                    raise
+                self._release(endpoint, e, status, retry_after)
+                tried.add(endpoint.name)
+                last_error = e
+                continue
+            self._release(endpoint)
+            return response
+
+        raise last_error
+
+    def report(self) -> List[Dict[str, Any]]:
+        """Per-endpoint request, failure and health counters"""
+        now = time.monotonic()
+        with self._condition:
+            return [{
+                "name": e.name,
+                "requests": e.requests,
+                "failures": e.failures,
+                "ejections": e.ejections,
+                "in_flight": e.in_flight,
+                "healthy": e.ejected_until <= now
+            } for e in self.endpoints]
+
+    def print_report(self):
+        print("\n--- Client Pool ---")
+        for row in self.report():
+            status = "healthy" if row["healthy"] else "ejected"
+            print(f"  {row['name']}: {row['requests']} requests, {row['failures']} failures, "
+                  f"{row['ejections']} ejections ({status})")
+
+
+def load_endpoints(path: str) -> List[Endpoint]:
+    """
+    Load endpoints from a JSON file: a list of objects with name, api_key (or api_key_env),
+    and optionally base_url, kind, request_limit and token_limit.
+    """
+    with open(path, encoding="utf-8") as f:
+        configs = json.load(f)
+    endpoints = []
+    for config in configs:
+        config = dict(config)
+        if "api_key_env" in config:
+            config["api_key"] = os.environ[config.pop("api_key_env")]
+        endpoints.append(Endpoint(**config))
+    return endpoints
+
+
+def endpoints_from_env() -> List[Endpoint]:
+    """
+    Endpoints configured in the environment: LLM_ENDPOINTS_FILE (JSON, see load_endpoints),
+    else comma-separated GROQ_API_KEYS, else the single GROQ_API_KEY.
+    Limits of Groq keys come from GROQ_RPM / GROQ_TPM when set.
+    """
+    if os.getenv("LLM_ENDPOINTS_FILE"):
+        return load_endpoints(os.environ["LLM_ENDPOINTS_FILE"])
+
+    keys = [key.strip() for key in os.getenv("GROQ_API_KEYS", "").split(",") if key.strip()]
+    if not keys and os.getenv("GROQ_API_KEY"):
+        keys = [os.environ["GROQ_API_KEY"]]
+    rpm = int(os.environ["GROQ_RPM"]) if os.getenv("GROQ_RPM") else None
+    tpm = int(os.environ["GROQ_TPM"]) if os.getenv("GROQ_TPM") else None
+    return [Endpoint(name=f"groq-{i}", api_key=key, request_limit=rpm, token_limit=tpm) for i, key in enumerate(keys)]
+
+
+# Test function
+if __name__ == "__main__":
+    from mock_llm_server import start_mock_server
+    from intent_classification import EmailClassification
+
+    servers = [start_mock_server(rate_limit=5, rate_window=1.0), start_mock_server(error_rate=1.0)]
+    pool = ClientPool([Endpoint(name=f"mock-{i}", api_key="test", base_url=f"http://127.0.0.1:{s.server_port}",
+                                request_limit=5) for i, s in enumerate(servers)], quota_window=1.0)
+    for _ in range(5):
+        result = pool.chat.completions.create(model="mock", response_model=EmailClassification,
+                                              messages=[{"role": "user", "content": "Please abstract the lease."}])
+        print(result.primary_intent)
+    pool.print_report()
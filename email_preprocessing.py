@@ -1,38 +1,268 @@
 import re 
-from typing import Dict, Any, List  
-from dataclasses import dataclass 
+import threading
+from array import array
+from enum import IntFlag
+from typing import Dict, Any, Iterable, List, Optional, Tuple, Union  
+
+from html_to_text import html_to_text, looks_like_html
+
+class EmailFlags(IntFlag):
+    """Boolean metadata of a ProcessedEmail packed into a single int"""
+    HAS_ATTACHMENTS = 1
+    HAS_NUMBERED_LIST = 2
+    HAS_BULLET_LIST = 4
+    URGENT_INDICATORS = 8
+
+
+# Entities decoded in plain-text emails (in this order, as before HTML conversion was added)
+PLAIN_TEXT_ENTITIES = (("&nbsp;", " "), ("&lt;", "<"), ("&gt;", ">"), ("&amp;", "&"), ("&quot;", '"'))
+
+# Paragraphs are separated by one or more blank lines
+PARAGRAPH_BREAK_PATTERN = re.compile(r'\n\s*\n')
+
+# Detectors behind the lazily computed metadata fields
+ATTACHMENT_PATTERN = re.compile(r"\b(?:attach|attached|attachment|enclosed|pdf|doc|file)\b", re.IGNORECASE)
+URGENCY_PATTERN = re.compile(r"\b(?:urgent|asap|immediately|time-sensitive|deadline|critical|today)\b", re.IGNORECASE)
+NUMBERED_LINE_PATTERN = re.compile(r"\n\s*\d+\.\s")
+# Look for patterns like "1.", "2.", "1)", "2)", etc.
+NUMBERED_ITEM_PATTERN = re.compile(r"(?:^|\n)\s*(?:\d+[\.\)]) .+", re.MULTILINE)
+BULLET_ITEM_PATTERN = re.compile(r"(?:^|\n)\s*(?:[\•\-\*\+]) .+", re.MULTILINE)
+
+# Improved patterns for property and company detection
+ENTITY_PATTERNS = [
+    # Properties
+    re.compile(r"\b[A-Z][a-zA-Z\s\-']*(Building|Property|Tower|Plaza|Avenue|Street|St\.|Ave\.|Heights|Lofts|Office|Space|Retail|Complex|Center|Mall|Suites|Park|Campus)\b", re.IGNORECASE),
+    re.compile(r"\b\d+\s+[A-Z][a-zA-Z\s\-']*(Street|St\.|Avenue|Ave\.|Road|Rd\.|Boulevard|Blvd\.|Lane|Ln\.|Drive|Dr\.|Place|Pl\.)\b", re.IGNORECASE),
+    # Companies
+    re.compile(r"\b[A-Z][a-zA-Z\s\-&']*(LLC|Inc\.|Corp|Corporation|Holdings|Properties|Group|Partners|Trust|Associates|Company|Co\.|Ltd\.)\b", re.IGNORECASE),
+    re.compile(r"\b[A-Z][a-zA-Z\s\-&']*(?:Real Estate|Investments|Development|Management)\b", re.IGNORECASE),
+]
+
+# Metadata fields computed on first access; preprocess_email(fields=...) computes some up front
+METADATA_FIELDS = ("has_attachments", "urgent_indicators", "has_numbered_list", "has_bullet_list",
+                   "numbered_items_count", "potential_entities")
+
+# Bits of ProcessedEmail._computed recording which detectors have run
+_ATTACHMENTS_DONE = 1
+_URGENCY_DONE = 2
+_NUMBERED_DONE = 4
+_BULLETS_DONE = 8
+_ENTITIES_DONE = 16
+
+# Guards the read-modify-write of _flags and _computed: a ProcessedEmail can be read from
+# several threads at once (e.g. hedged requests). One lock for all instances keeps them
+# picklable, and it is only taken once per detector run.
+_DETECTOR_LOCK = threading.Lock()
+
 
-@dataclass 
 class ProcessedEmail:
-    """Container for preprocessed email data"""
-    subject: str 
-    body: str 
-    clean_text: str   # Combined and cleaned version for classification 
-    metadata: Dict[str, Any]   # Store any extracted metadata 
-    paragraphs: List[str]  # Store individual paragraphs
-
-def preprocess_email(email_text: str) -> ProcessedEmail:
+    """
+    Container for preprocessed email data.
+
+    Compact representation for bulk workloads: the body is the only text buffer kept,
+    paragraphs are (start, end) offsets into it, boolean metadata is packed into
+    EmailFlags, and `paragraphs`, `clean_text` and `metadata` are materialised on access.
+
+    Everything clean_text depends on is done by preprocess_email; clean_text and the
+    metadata dict are built on first access and kept, like each metadata detector
+    (attachments, urgency, lists, entities), which runs only when its field is first read.
+
+    Instances are built by preprocess_email. The constructor takes the body's paragraph
+    offsets rather than the subject/body/clean_text/metadata/paragraphs fields of the
+    former dataclass.
+    """
+    __slots__ = ("subject", "body", "_paragraph_spans", "_flags", "line_count",
+                 "_numbered_item_spans", "_potential_entities", "_computed", "_clean_text", "_metadata")
+
+    def __init__(self, subject: str, body: str, paragraph_spans: array, line_count: int):
+        self.subject = subject
+        self.body = body
+        self._paragraph_spans = paragraph_spans      # Flattened (start, end) pairs into body
+        self._flags = EmailFlags(0)                  # Bits are valid once their detector ran
+        self.line_count = line_count
+        self._numbered_item_spans = None             # None when no numbered items were found
+        self._potential_entities = ()
+        self._computed = 0                           # Which detectors have run
+        self._clean_text = None                      # Built on first access
+        self._metadata = None                        # Built on first access
+
+    def __repr__(self):
+        return f"ProcessedEmail(subject={self.subject!r}, paragraph_count={self.paragraph_count})"
+
+    def _record(self, done: int, found: EmailFlags = EmailFlags(0)):
+        """Mark a detector as run and set the flags it found"""
+        with _DETECTOR_LOCK:
+            self._flags |= found
+            self._computed |= done
+
+    @property
+    def has_attachments(self) -> bool:
+        if not self._computed & _ATTACHMENTS_DONE:
+            found = EmailFlags.HAS_ATTACHMENTS if ATTACHMENT_PATTERN.search(self.body) else EmailFlags(0)
+            self._record(_ATTACHMENTS_DONE, found)
+        return bool(self._flags & EmailFlags.HAS_ATTACHMENTS)
+
+    @property
+    def urgent_indicators(self) -> bool:
+        if not self._computed & _URGENCY_DONE:
+            urgent = URGENCY_PATTERN.search(self.body) or URGENCY_PATTERN.search(self.subject)
+            self._record(_URGENCY_DONE, EmailFlags.URGENT_INDICATORS if urgent else EmailFlags(0))
+        return bool(self._flags & EmailFlags.URGENT_INDICATORS)
+
+    def _detect_numbered_list(self):
+        """Numbered list flag and item offsets (potential multi-intent indicator)"""
+        flags = EmailFlags(0)
+        if NUMBERED_LINE_PATTERN.search(self.body):
+            flags |= EmailFlags.HAS_NUMBERED_LIST
+        spans = None
+        for match in NUMBERED_ITEM_PATTERN.finditer(self.body):
+            if spans is None:
+                spans = array('I')
+                flags |= EmailFlags.HAS_NUMBERED_LIST
+            spans.append(match.start())
+            spans.append(match.end())
+        self._numbered_item_spans = spans
+        self._record(_NUMBERED_DONE, flags)
+
+    @property
+    def has_numbered_list(self) -> bool:
+        if not self._computed & _NUMBERED_DONE:
+            self._detect_numbered_list()
+        return bool(self._flags & EmailFlags.HAS_NUMBERED_LIST)
+
+    @property
+    def has_bullet_list(self) -> bool:
+        if not self._computed & _BULLETS_DONE:
+            found = EmailFlags.HAS_BULLET_LIST if BULLET_ITEM_PATTERN.search(self.body) else EmailFlags(0)
+            self._record(_BULLETS_DONE, found)
+        return bool(self._flags & EmailFlags.HAS_BULLET_LIST)
+
+    @property
+    def potential_entities(self) -> tuple:
+        """Property and company names found in the body"""
+        if not self._computed & _ENTITIES_DONE:
+            cleaned_entities = set()
+            for pattern in ENTITY_PATTERNS:
+                for entity in pattern.findall(self.body):
+                    # Remove leading/trailing whitespace and normalize internal spaces
+                    clean_entity = re.sub(r'\s+', ' ', entity.strip())
+                    if clean_entity:
+                        cleaned_entities.add(clean_entity)
+            self._potential_entities = tuple(cleaned_entities)
+            self._record(_ENTITIES_DONE)
+        return self._potential_entities
+
+    @property
+    def flags(self) -> EmailFlags:
+        """All boolean metadata (runs any detector that has not run yet)"""
+        for name in ("has_attachments", "urgent_indicators", "has_numbered_list", "has_bullet_list"):
+            getattr(self, name)
+        return self._flags
+
+    @property
+    def paragraph_count(self) -> int:
+        return len(self._paragraph_spans) // 2
+
+    @property
+    def numbered_items_count(self) -> int:
+        if not self._computed & _NUMBERED_DONE:
+            self._detect_numbered_list()
+        return len(self._numbered_item_spans) // 2 if self._numbered_item_spans is not None else 0
+
+    def list_item_spans(self) -> List[Tuple[int, int]]:
+        """(start, end) offsets in body of the numbered list items, or of the bullet items if there are none"""
+        if not self._computed & _NUMBERED_DONE:
+            self._detect_numbered_list()
+        spans = self._numbered_item_spans
+        if spans is not None:
+            return [(spans[i], spans[i + 1]) for i in range(0, len(spans), 2)]
+        return [match.span() for match in BULLET_ITEM_PATTERN.finditer(self.body)]
+
+    @property
+    def paragraphs(self) -> List[str]:
+        """Individual paragraphs (sliced from the body on access)"""
+        spans = self._paragraph_spans
+        return [self.body[spans[i]:spans[i + 1]] for i in range(0, len(spans), 2)]
+
+    @property
+    def clean_text(self) -> str:
+        """Combined and cleaned version for classification (built on first access)"""
+        if self._clean_text is not None:
+            return self._clean_text
+
+        # Combine subject and body for classification, preserving paragraph structure
+        paragraphs = self.paragraphs
+        if self.subject:
+            paragraphs = [f"Subject: {self.subject}"] + paragraphs
+
+        # Create clean text while preserving paragraph structure
+        clean_text = "\n\n".join(paragraphs)
+
+        # Normalize whitespace within paragraphs but preserve paragraph breaks
+        clean_text = re.sub(r'[ \t]+', ' ', clean_text)  # Replace multiple spaces/tabs with single space
+        clean_text = re.sub(r'\n{3,}', '\n\n', clean_text)  # Replace 3+ newlines with double newline
+        self._clean_text = clean_text.strip()
+        return self._clean_text
+
+    @property
+    def metadata(self) -> Dict[str, Any]:
+        """All extracted metadata as a dictionary (runs every detector; built on first access)"""
+        if self._metadata is not None:
+            return self._metadata
+
+        flags = self.flags
+        metadata = {
+            "has_attachments": bool(flags & EmailFlags.HAS_ATTACHMENTS),
+            "has_numbered_list": bool(flags & EmailFlags.HAS_NUMBERED_LIST),
+            "has_bullet_list": bool(flags & EmailFlags.HAS_BULLET_LIST),
+            "urgent_indicators": bool(flags & EmailFlags.URGENT_INDICATORS),
+            "potential_entities": list(self.potential_entities),
+            "line_count": self.line_count,
+            "paragraph_count": self.paragraph_count
+        }
+        spans = self._numbered_item_spans
+        if spans is not None:
+            metadata["numbered_items_count"] = self.numbered_items_count
+            metadata["numbered_items_sample"] = [self.body[spans[i]:spans[i + 1]] for i in range(0, min(len(spans), 6), 2)]
+        self._metadata = metadata
+        return metadata
+
+
+def _paragraph_spans(body: str) -> array:
+    """(start, end) offsets of the stripped, non-empty paragraphs of body"""
+    spans = array('I')
+    position = 0
+    boundaries = [(m.start(), m.end()) for m in PARAGRAPH_BREAK_PATTERN.finditer(body)] + [(len(body), len(body))]
+    for start_of_break, end_of_break in boundaries:
+        segment = body[position:start_of_break]
+        stripped = segment.strip()
+        if stripped:
+            start = position + (len(segment) - len(segment.lstrip()))
+            spans.append(start)
+            spans.append(start + len(stripped))
+        position = end_of_break
+    return spans
+
+
+def preprocess_email(email_text: Union[str, bytes, memoryview],
+                     fields: Optional[Iterable[str]] = None) -> ProcessedEmail:
     """
     Preprocess email text to make it suitable for classification.
     Handles multi-line text and preserves paragraph structure.
 
     Args:
         email_text: Raw email text which may include subject, signatures, etc.
+            Bytes or a memoryview (e.g. a slice of a memory-mapped corpus) are decoded as UTF-8.
+        fields: Metadata fields (see METADATA_FIELDS) to compute up front; all others are
+            computed on first access
 
     Returns:
         ProcessedEmail object with cleaned text and extracted metadata 
     
     """
-    # Initialize metadata dictionary 
-    metadata = {
-        "has_attachments": False,
-        "has_numbered_list": False,
-        "has_bullet_list": False,
-        "urgent_indicators": False,
-        "potential_entities": [],
-        "line_count": 0,
-        "paragraph_count": 0
-    }
+    # Decode raw bytes straight from the caller's buffer
+    if isinstance(email_text, (bytes, memoryview)):
+        email_text = str(email_text, 'utf-8', errors='replace')
 
     # Normalize line endings (in case of mixed line endings)
     email_text = email_text.replace('\r\n', '\n').replace('\r', '\n')
@@ -42,7 +272,7 @@ def preprocess_email(email_text: str) -> ProcessedEmail:
 
     # Count lines before any processing
     lines = email_text.split('\n')
-    metadata["line_count"] = len(lines)
+    line_count = len(lines)
 
     # Extract subject if present (looks for "Subject:" at the beginning of a line)
     subject_match = re.search(r"(?:^|\n)Subject:[ \t]*(.*?)(?:\n|$)", email_text, re.IGNORECASE | re.DOTALL)
@@ -61,6 +291,19 @@ def preprocess_email(email_text: str) -> ProcessedEmail:
     else:
         subject = ""
 
+    # Handle HTML content: convert to text in one streaming pass (drops style/script/head,
+    # keeps paragraph and list structure, decodes all entities) before headers and
+    # signatures are stripped, so those patterns see real line breaks
+    if looks_like_html(subject):
+        subject = html_to_text(subject)
+    if looks_like_html(email_text):
+        email_text = html_to_text(email_text)
+    elif '&' in email_text:
+        # Plain text: only the entities the earlier tag stripping decoded, as legacy
+        # references without ';' are ordinary text here (e.g. "Smith&notice")
+        for entity, char in PLAIN_TEXT_ENTITIES:
+            email_text = email_text.replace(entity, char)
+
     # Handle email forwarding and reply headers
     email_text = re.sub(r"(?:^|\n)[-]+\s*Forwarded.*?[-]+(?:\n|$)", "\n", 
                        email_text, flags=re.IGNORECASE | re.DOTALL)
@@ -97,110 +340,27 @@ def preprocess_email(email_text: str) -> ProcessedEmail:
     body = re.sub(r"\nThanks,.*?$", "", body, flags=re.DOTALL)  # Remove "Thanks," and everything after
     body = re.sub(r"\nBest,.*?$", "", body, flags=re.DOTALL)  # Remove "Best," and everything after
 
-    # Handle HTML content
-    # Remove simple HTML tags (preserving content between them)
-    body = re.sub(r'<(?!\/?(b|i|u|strong|em)>)[^>]*>', ' ', body)  # Replace tags with space
-    body = re.sub(r'<\/?(?:b|i|u|strong|em)>', '', body)  # Remove formatting tags but keep content
-    
-    # Convert HTML entities
-    body = re.sub(r'&nbsp;', ' ', body)
-    body = re.sub(r'&lt;', '<', body)
-    body = re.sub(r'&gt;', '>', body)
-    body = re.sub(r'&amp;', '&', body)
-    body = re.sub(r'&quot;', '"', body)
-
-    # Check for attachments mentioned
-    if re.search(r"\b(?:attach|attached|attachment|enclosed|pdf|doc|file)\b", body, re.IGNORECASE):
-        metadata["has_attachments"] = True
-
-    # Check for urgency indicators
-    if re.search(r"\b(?:urgent|asap|immediately|time-sensitive|deadline|critical|today)\b", 
-                body + " " + subject, re.IGNORECASE):
-        metadata["urgent_indicators"] = True
-
-    # Check for numbered lists (potential multi-intent indicator)
-    if re.search(r"\n\s*\d+\.\s", body):
-        metadata["has_numbered_list"] = True
-
-    # detection for numbered lists (potential multi-intent indicator)
-    # Look for patterns like "1.", "2.", "1)", "2)", etc.
-    numbered_list_pattern = r"(?:^|\n)\s*(?:\d+[\.\)]) .+"
-    if re.search(numbered_list_pattern, body, re.MULTILINE):
-        metadata["has_numbered_list"] = True
-
-        # Extract numbered list items
-        numbered_items = re.findall(numbered_list_pattern, body, re.MULTILINE)
-        metadata["numbered_items_count"] = len(numbered_items)
-
-        # Store first few items for reference
-        if numbered_items:
-            metadata["numbered_items_sample"] = numbered_items[:3]
-
-    # Detect bullet lists
-    bullet_list_pattern = r"(?:^|\n)\s*(?:[\•\-\*\+]) .+"
-    if re.search(bullet_list_pattern, body, re.MULTILINE):
-        metadata["has_bullet_list"] = True
-
-    # Extract potential entities (companies, properties)
-    # Improved patterns for property and company detection
-    property_patterns = [
-        r"\b[A-Z][a-zA-Z\s\-']*(Building|Property|Tower|Plaza|Avenue|Street|St\.|Ave\.|Heights|Lofts|Office|Space|Retail|Complex|Center|Mall|Suites|Park|Campus)\b",
-        r"\b\d+\s+[A-Z][a-zA-Z\s\-']*(Street|St\.|Avenue|Ave\.|Road|Rd\.|Boulevard|Blvd\.|Lane|Ln\.|Drive|Dr\.|Place|Pl\.)\b"
-    ]
-    
-    company_patterns = [
-        r"\b[A-Z][a-zA-Z\s\-&']*(LLC|Inc\.|Corp|Corporation|Holdings|Properties|Group|Partners|Trust|Associates|Company|Co\.|Ltd\.)\b",
-        r"\b[A-Z][a-zA-Z\s\-&']*(?:Real Estate|Investments|Development|Management)\b"
-    ]
+    # Metadata detectors (attachments, urgency, lists, entities) run lazily on the ProcessedEmail
 
-    # Apply all patterns
-    potential_entities = []
-    for pattern in property_patterns:
-        matches = re.findall(pattern, body, re.IGNORECASE)
-        potential_entities.extend(matches)
-    
-    for pattern in company_patterns:
-        matches = re.findall(pattern, body, re.IGNORECASE)
-        potential_entities.extend(matches)
-
-    # Clean up entities
-    cleaned_entities = []
-    for entity in potential_entities:
-        # Remove leading/trailing whitespace and normalize internal spaces
-        clean_entity = re.sub(r'\s+', ' ', entity.strip())
-        if clean_entity:
-            cleaned_entities.append(clean_entity)
-    
-    metadata["potential_entities"] = list(set(cleaned_entities))
-    
     # Break the body into paragraphs (for better structure preservation)
-    # A paragraph is defined as text separated by one or more blank lines
-    paragraphs = re.split(r'\n\s*\n', body)
-    paragraphs = [p.strip() for p in paragraphs if p.strip()]
-    metadata["paragraph_count"] = len(paragraphs)
+    # A paragraph is defined as text separated by one or more blank lines;
+    # only their offsets are stored, clean_text is built from them on access
+    paragraph_spans = _paragraph_spans(body)
     
-    # Combine subject and body for classification, preserving paragraph structure
-    if subject:
-        clean_paragraphs = [f"Subject: {subject}"] + paragraphs
-    else:
-        clean_paragraphs = paragraphs
-    
-    # Create clean text while preserving paragraph structure
-    clean_text = "\n\n".join(clean_paragraphs)
-    
-    # Normalize whitespace within paragraphs but preserve paragraph breaks
-    clean_text = re.sub(r'[ \t]+', ' ', clean_text)  # Replace multiple spaces/tabs with single space
-    clean_text = re.sub(r'\n{3,}', '\n\n', clean_text)  # Replace 3+ newlines with double newline
-    clean_text = clean_text.strip()
-    
-    return ProcessedEmail(
+    processed = ProcessedEmail(
         subject=subject,
         body=body,
-        clean_text=clean_text,
-        metadata=metadata,
-        paragraphs=paragraphs
+        paragraph_spans=paragraph_spans,
+        line_count=line_count
     )
 
+    # Compute requested metadata fields now (e.g. before handing the email to another process)
+    for field in fields or ():
+        if field not in METADATA_FIELDS:
+            raise ValueError(f"Unknown metadata field: {field}")
+        getattr(processed, field)
+    return processed
+
 
 # Test function
 if __name__ == "__main__":
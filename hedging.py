@@ -0,0 +1,151 @@
+import time
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import Callable, Dict, Union
+
+from email_preprocessing import preprocess_email, ProcessedEmail
+from intent_classification import classify_email, EmailClassification
+from helper import percentile
+
+
+class HedgedClassifier:
+    """
+    Cuts tail latency by hedging slow LLM calls.
+
+    If a classification hasn't returned after the configured percentile of recent
+    latencies, a duplicate request is sent; the first valid EmailClassification wins
+    and the other request is cancelled (or, if already running, its result is discarded).
+    Hedges are capped at max_hedge_rate of all calls so extra token spend stays bounded.
+    """
+
+    def __init__(self,
+                 classify_fn: Callable[..., EmailClassification] = classify_email,
+                 hedge_percentile: float = 95.0,
+                 max_hedge_rate: float = 0.1,
+                 initial_delay: float = 5.0,
+                 min_samples: int = 20,
+                 window: int = 500,
+                 max_workers: int = 16):
+        """
+        Args:
+            classify_fn: Function performing a single classification (default: classify_email)
+            hedge_percentile: Percentile of recent latencies after which a hedge is sent
+            max_hedge_rate: Maximum fraction of calls that may send a hedge
+            initial_delay: Hedge delay in seconds used until min_samples latencies are recorded
+            min_samples: Number of latencies needed before the percentile is used
+            window: Number of recent latencies kept
+            max_workers: Size of the thread pool running requests
+        """
+        self.classify_fn = classify_fn
+        self.hedge_percentile = hedge_percentile
+        self.max_hedge_rate = max_hedge_rate
+        self.initial_delay = initial_delay
+        self.min_samples = min_samples
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="hedge")
+        self._lock = threading.Lock()
+        self._recent_latencies = deque(maxlen=window)   # Latency of each individual request
+        self.primary_latencies = []     # What each call would have taken without hedging
+        self.effective_latencies = []   # What each call actually took
+        self.calls = 0
+        self.hedges_sent = 0
+        self.hedges_won = 0
+
+    def hedge_delay(self) -> float:
+        """Current delay before sending a hedge"""
+        with self._lock:
+            if len(self._recent_latencies) < self.min_samples:
+                return self.initial_delay
+            return percentile(list(self._recent_latencies), self.hedge_percentile)
+
+    def _claim_hedge(self) -> bool:
+        """Reserve a hedge if the cap allows one; check and count in one step so concurrent calls can't overshoot"""
+        with self._lock:
+            if self.hedges_sent + 1 > self.max_hedge_rate * self.calls:
+                return False
+            self.hedges_sent += 1
+            return True
+
+    def _timed_call(self, processed: ProcessedEmail, kwargs: dict, is_primary: bool) -> EmailClassification:
+        start_time = time.perf_counter()
+        try:
+            return self.classify_fn(processed, **kwargs)
+        finally:
+            latency = time.perf_counter() - start_time
+            with self._lock:
+                self._recent_latencies.append(latency)
+                if is_primary:
+                    self.primary_latencies.append(latency)
+
+    def classify(self, email: Union[str, ProcessedEmail], **classify_kwargs) -> EmailClassification:
+        """
+        Classify an email, sending a hedge request if the first one is slow.
+
+        Args:
+            email: Raw email text or an already preprocessed email
+            **classify_kwargs: Extra keyword arguments for the classify function
+
+        Returns:
+            The first valid EmailClassification returned
+        """
+        processed = email if isinstance(email, ProcessedEmail) else preprocess_email(email)
+        start_time = time.perf_counter()
+        with self._lock:
+            self.calls += 1
+
+        primary = self._executor.submit(self._timed_call, processed, classify_kwargs, True)
+        done, _ = wait([primary], timeout=self.hedge_delay())
+
+        pending = {primary}
+        hedge = None
+        if not done and self._claim_hedge():
+            print("[Debug] Classification is slow, sending hedge request.")
+            hedge = self._executor.submit(self._timed_call, processed, classify_kwargs, False)
+            pending.add(hedge)
+
+        first_error = None
+        try:
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    if future.exception() is None and isinstance(future.result(), EmailClassification):
+                        if future is hedge:
+                            with self._lock:
+                                self.hedges_won += 1
+                        return future.result()
+                    first_error = first_error or future.exception() or ValueError("Invalid classification result")
+            raise first_error
+        finally:
+            # The losing request is cancelled if it hasn't started; otherwise its result is dropped
+            for future in pending:
+                future.cancel()
+            with self._lock:
+                self.effective_latencies.append(time.perf_counter() - start_time)
+
+    def report(self) -> Dict[str, float]:
+        """Hedge rate and p50/p99 latency without hedging (primary request) and with it"""
+        with self._lock:
+            primary = list(self.primary_latencies)
+            effective = list(self.effective_latencies)
+            calls, sent, won = self.calls, self.hedges_sent, self.hedges_won
+        return {
+            "calls": calls,
+            "hedge_rate": sent / calls if calls else 0.0,
+            "hedges_won": won,
+            "p50_before": percentile(primary, 50),
+            "p99_before": percentile(primary, 99),
+            "p50_after": percentile(effective, 50),
+            "p99_after": percentile(effective, 99),
+        }
+
+    def print_report(self):
+        """Print hedge rate and latency percentiles before and after hedging"""
+        report = self.report()
+        print("\n--- Hedged Request Report ---")
+        print(f"Calls: {report['calls']}, Hedge Rate: {report['hedge_rate']:.1%}, Hedges Won: {report['hedges_won']}")
+        print(f"p50 latency: {report['p50_before']:.2f}s before, {report['p50_after']:.2f}s after")
+        print(f"p99 latency: {report['p99_before']:.2f}s before, {report['p99_after']:.2f}s after")
+
+    def shutdown(self):
+        """Stop the worker threads (waits for running requests)"""
+        self._executor.shutdown(wait=True)
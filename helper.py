@@ -49,3 +49,14 @@ def display_classification(result):
     print("\nJSON Output for system integration:")
     print(result.model_dump_json(indent=2))
 
+
+
+def percentile(values, pct):
+    """Percentile (0-100) of a list of numbers using linear interpolation; 0.0 for an empty list"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = (len(ordered) - 1) * pct / 100
+    lower = int(rank)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (rank - lower)
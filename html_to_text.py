@@ -0,0 +1,174 @@
+import re
+from html.parser import HTMLParser
+from typing import List
+
+# Elements whose content is never shown to the reader
+SKIPPED_TAGS = {"style", "script", "title", "noscript", "template", "svg", "xml"}
+
+# Elements that may appear in <head>; any other element (or text) starts the body, as in
+# browsers, so a <head> that is never closed doesn't hide the whole document
+HEAD_CONTENT_TAGS = {"title", "meta", "link", "style", "script", "base", "noscript", "template"}
+
+# Elements that start a new paragraph / a new line
+PARAGRAPH_TAGS = {"p", "h1", "h2", "h3", "h4", "h5", "h6", "blockquote", "table", "ul", "ol", "dl", "pre", "address"}
+LINE_TAGS = {"div", "section", "article", "header", "footer", "tr", "dt", "dd", "hr", "center", "form", "fieldset"}
+CELL_TAGS = {"td", "th"}
+
+# Detects markup worth converting (a tag name right after '<')
+HTML_TAG_PATTERN = re.compile(
+    r"<(?:!doctype|html|head|body|div|p|br|span|table|tr|td|li|ul|ol|b|i|u|strong|em|font|a|img|style|script|h[1-6])\b[^>]*>",
+    re.IGNORECASE
+)
+
+_INLINE_WHITESPACE_PATTERN = re.compile(r"[^\S\n]+")
+_LINE_BREAK_PATTERN = re.compile(r"[^\S\n]*\n\s*")
+
+
+def looks_like_html(text: str) -> bool:
+    """Whether text contains HTML markup"""
+    return HTML_TAG_PATTERN.search(text) is not None
+
+
+class HtmlTextExtractor(HTMLParser):
+    """
+    Streaming HTML-to-text converter.
+
+    Feed it HTML in one or many chunks; text is produced in a single pass. Content of
+    style/script and of the document head is dropped, line breaks inside text are kept,
+    paragraphs become blank-line separated blocks, list items become '1. ' (ordered) or
+    '• ' (unordered) lines so list detection in preprocessing keeps working, and every
+    named and numeric entity is decoded.
+    """
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self._parts: List[str] = []
+        self._skip_depth = 0
+        self._pre_depth = 0
+        self._in_head = False
+        self._lists: List[List] = []   # Stack of [is_ordered, next_number]
+
+    def _break(self, text: str):
+        """Add a line or paragraph break, merging it with a preceding break"""
+        if not self._parts:
+            return
+        last = self._parts[-1]
+        if last.endswith("\n"):
+            if text == "\n\n" and not last.endswith("\n\n"):
+                self._parts.append("\n")
+            return
+        self._parts.append(text)
+
+    def handle_starttag(self, tag, attrs):
+        if tag == "head":
+            self._in_head = True
+            return
+        if self._in_head and tag not in HEAD_CONTENT_TAGS:
+            self._in_head = False
+        if tag in SKIPPED_TAGS:
+            self._skip_depth += 1
+            return
+        if self._skip_depth:
+            return
+
+        if tag == "br":
+            self._parts.append("\n")
+        elif tag in PARAGRAPH_TAGS:
+            self._break("\n\n")
+            if tag == "pre":
+                self._pre_depth += 1
+            elif tag in ("ul", "ol"):
+                start = dict(attrs).get("start")
+                self._lists.append([tag == "ol", int(start) if start and start.isdigit() else 1])
+        elif tag == "li":
+            self._break("\n")
+            if self._lists and self._lists[-1][0]:
+                self._parts.append(f"{self._lists[-1][1]}. ")
+                self._lists[-1][1] += 1
+            else:
+                self._parts.append("• ")
+        elif tag in LINE_TAGS:
+            self._break("\n")
+        elif tag in CELL_TAGS:
+            self._parts.append(" ")
+        elif tag == "img":
+            alt = dict(attrs).get("alt")
+            if alt:
+                self._parts.append(alt)
+
+    def handle_startendtag(self, tag, attrs):
+        # <br/>, <hr/>, <img/> ...; void elements never have content to skip
+        if tag not in SKIPPED_TAGS:
+            self.handle_starttag(tag, attrs)
+
+    def handle_endtag(self, tag):
+        if tag == "head":
+            self._in_head = False
+            return
+        if tag in SKIPPED_TAGS:
+            self._skip_depth = max(0, self._skip_depth - 1)
+            return
+        if self._skip_depth:
+            return
+
+        if tag in PARAGRAPH_TAGS:
+            if tag == "pre":
+                self._pre_depth = max(0, self._pre_depth - 1)
+            elif tag in ("ul", "ol") and self._lists:
+                self._lists.pop()
+            self._break("\n\n")
+        elif tag in LINE_TAGS or tag == "li":
+            self._break("\n")
+
+    def handle_data(self, data):
+        if self._skip_depth:
+            return
+        if self._in_head:
+            if data.isspace():
+                return
+            self._in_head = False
+        if not self._pre_depth:
+            if data.isspace():
+                # Whitespace between tags is only formatting of the HTML source
+                if self._parts and not self._parts[-1].endswith((" ", "\n")):
+                    self._parts.append(" ")
+                return
+            # Collapse spaces but keep the line structure of the text (as plain-text mail does)
+            data = _INLINE_WHITESPACE_PATTERN.sub(" ", data)
+            data = _LINE_BREAK_PATTERN.sub(lambda m: "\n\n" if m.group().count("\n") > 1 else "\n", data)
+        self._parts.append(data)
+
+    def get_text(self) -> str:
+        """Text produced so far, with line-level whitespace tidied"""
+        text = "".join(self._parts)
+        text = re.sub(r"[ \t]*\n[ \t]*", "\n", text)   # Spaces around line breaks
+        text = re.sub(r"[ \t]{2,}", " ", text)
+        text = re.sub(r"\n{3,}", "\n\n", text)
+        return text.strip()
+
+
+def html_to_text(html: str) -> str:
+    """
+    Convert HTML to plain text in one pass.
+
+    Args:
+        html: HTML document or fragment
+
+    Returns:
+        Plain text with paragraph and list structure preserved and entities decoded
+    """
+    extractor = HtmlTextExtractor()
+    extractor.feed(html)
+    extractor.close()
+    return extractor.get_text()
+
+
+# Test function
+if __name__ == "__main__":
+    sample = """<html><head><style>p { color: red; }</style></head><body>
+<p>Dear Team,</p>
+<p>Please compare the LOI&nbsp;and lease for <i>Westside Plaza</i> &mdash; focus on:</p>
+<ol><li>Base rent</li><li>CAM charges &amp; caps</li></ol>
+<script>track();</script>
+<p>Regards,<br>Jessica</p></body></html>"""
+    print(html_to_text(sample))
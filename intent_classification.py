@@ -1,31 +1,54 @@
 # Step 1: Import necessary Libraries 
 
 from enum import Enum 
-from typing import List, Optional 
-from pydantic import BaseModel, Field 
+from typing import List, Optional, Tuple, Union 
+from pydantic import BaseModel, Field, PrivateAttr 
 import instructor
 import os
-import json 
 from groq import Groq
 
-from system_prompt import ENHANCED_SYSTEM_PROMPT
+from system_prompt import ENHANCED_SYSTEM_PROMPT, TRIAGE_SYSTEM_PROMPT
+from token_accounting import COMPACT_SYSTEM_PROMPT, COMPACTION_REPORT, TokenLedger, check_token_budget, token_ledger
 from email_preprocessing import preprocess_email, ProcessedEmail
 
+from client_pool import ClientPool, endpoints_from_env
+
 from dotenv import load_dotenv 
 
 # load .env into environment 
 load_dotenv()
 
-# grab the key 
-api_key = os.getenv("GROQ_API_KEY")
-if not api_key:
-    raise RuntimeError("GROQ_API_KEY not found in environment")
-
 # Step 2: Patch your LLM with instructor 
 
-# Instructor makes it easy to get structured data like JSON from LLMs 
+# Instructor makes it easy to get structured data like JSON from LLMs.
+# The client is created on first use (see get_client) so importing this module
+# does not require an API key.
+client = None
+
+
+def get_client():
+    """
+    Return the shared LLM client, creating it on first use.
+
+    Several keys or endpoints (GROQ_API_KEYS or LLM_ENDPOINTS_FILE) are load balanced
+    by a ClientPool; a single GROQ_API_KEY uses the instructor-patched Groq client directly.
+    """
+    global client
+    if client is None:
+        endpoints = endpoints_from_env()
+        if not endpoints:
+            raise RuntimeError("GROQ_API_KEY not found in environment")
+        if len(endpoints) == 1 and not os.getenv("LLM_ENDPOINTS_FILE"):
+            client = instructor.patch(Groq(api_key=endpoints[0].api_key))
+        else:
+            client = ClientPool(endpoints)
+    return client
 
-client = instructor.patch(Groq(api_key=api_key))
+# Default (large) model and a fast small model for simple emails
+DEFAULT_MODEL = "llama3-70b-8192"
+SMALL_MODEL = "llama-3.1-8b-instant"
+MAX_COMPLETION_TOKENS = 1024
+TRIAGE_MAX_COMPLETION_TOKENS = 128
 
 # Step 3: Define Pydantic data models 
 
@@ -51,6 +74,15 @@ class IntentDetails(BaseModel):
     confidence: float = Field(ge=0, le=1, description="Confidence score for this intent")
     key_actions: List[str] = Field(description="Specific actions needed for this intent")
 
+class EmailTriage(BaseModel):
+    """Slim first-pass classification: intents, priority and confidence only"""
+    primary_intent: EmailIntent
+    secondary_intents: List[EmailIntent] = Field(default_factory=list, description="Additional intents identified in the email")
+    priority: EmailPriority
+    overall_confidence: float = Field(ge=0, le=1, description="Overall confidence score for the triage")
+    # Priority as returned by the model, before the urgent-indicator upgrade
+    _model_priority: Optional[EmailPriority] = PrivateAttr(default=None)
+
 class EmailClassification(BaseModel):
     """Complete classification of an email, potentially with multiple intents"""
     primary_intent: EmailIntent
@@ -68,66 +100,125 @@ class EmailClassification(BaseModel):
 
 # Step 4: Define the classification function 
 
-def classify_email(email_text: str, use_preprocessing: bool = True) -> EmailClassification:
+def _prepare_text(email_text: Union[str, ProcessedEmail], use_preprocessing: bool):
+    """Return (processed_email or None, text sent to the model) for classify_email/triage_email"""
+    # Reuse the preprocessing done by the caller, or preprocess the email if requested
+    if isinstance(email_text, ProcessedEmail):
+        print("[Debug] Using preprocessed email provided by caller.")
+        return email_text, email_text.clean_text
+
+    if use_preprocessing:
+        processed_email = preprocess_email(email_text)
+
+        # Print preprocessing info for debugging
+        print(f"[Debug] Email preprocessing applied.")
+        print(f"[Debug] Subject extracted: {processed_email.subject}")
+        # Only the cheap structural fields; metadata detectors run when a field is read
+        print(f"[Debug] Paragraphs: {processed_email.paragraph_count}, lines: {processed_email.line_count}")
+
+        # Use the cleaned text for classification
+        return processed_email, processed_email.clean_text
+
+    print("[Debug] Email preprocessing skipped.")
+    return None, email_text
+
+
+def _request_structured(response_model, system_prompt: str, text: str, context: Optional[str],
+                        model: str, max_completion_tokens: int, tokens_saved: int = 0, llm_client=None,
+                        ledger: Optional[TokenLedger] = token_ledger):
+    """Send one structured-output request, checking the token budget and recording usage in ledger (None: not recorded)"""
+    # Make sure the request fits the model's context window
+    budget = check_token_budget(system_prompt + (context or ""), text, max_completion_tokens, model)
+    print(f"[Debug] Estimated prompt tokens: ~{budget.prompt_tokens} "
+          f"(~{tokens_saved} saved by prompt compaction)")
+
+    messages = [
+        {
+            "role": "system",
+            "content": system_prompt,
+        }
+    ]
+    if context:
+        messages.append({"role": "system", "content": context})
+    messages.append({"role": "user", "content": budget.text})
+
+    # Make the API call with preprocessed text
+    response = (llm_client or get_client()).chat.completions.create(
+        model=model,
+        response_model=response_model,
+        temperature=0.1,  # Lower temperature for more consistent outputs
+        max_completion_tokens=max_completion_tokens,
+        messages=messages
+    )
+    if ledger is not None:
+        ledger.record(budget.prompt_tokens, tokens_saved, completion_usage(response))
+    return response
+
+
+def _upgrade_priority(response, urgent_indicators: bool):
+    """Raise the priority one level if preprocessing found urgent indicators"""
+    if urgent_indicators and response.priority != EmailPriority.URGENT:
+        # Consider upgrading priority if urgent indicators were found
+        if response.priority == EmailPriority.LOW:
+            response.priority = EmailPriority.MEDIUM
+        elif response.priority == EmailPriority.MEDIUM:
+            response.priority = EmailPriority.HIGH
+
+
+def apply_preprocessing_hints(response: EmailClassification, has_attachments: bool, urgent_indicators: bool):
+    """
+    Adjust a classification with what preprocessing detected: mark attachments as
+    mentioned and raise the priority one level for urgent emails.
+    """
+    # Update attachments_mentioned if detected in preprocessing
+    if has_attachments:
+        response.attachments_mentioned = True
+    # Update priority if urgent indicators were found
+    _upgrade_priority(response, urgent_indicators)
+
+
+def classification_prompt(compact: bool = False) -> Tuple[str, int]:
+    """System prompt used by classify_email and the tokens it saves over the full prompt"""
+    if compact:
+        return COMPACT_SYSTEM_PROMPT, COMPACTION_REPORT.tokens_saved
+    return ENHANCED_SYSTEM_PROMPT, 0
+
+
+def classify_email(email_text: Union[str, ProcessedEmail], use_preprocessing: bool = True, context: Optional[str] = None,
+                   model: str = DEFAULT_MODEL, llm_client=None, compact_prompt: bool = False,
+                   ledger: Optional[TokenLedger] = token_ledger) -> EmailClassification:
     """  
     Classifies real estate emails using the GROQ LLama-3.3-70b-versatile model
     and returns structured information with support for multiple intents.
 
     Args:
-        email_text: The content of the email to classify 
-        use_preprocessing: Whether to apply email preprocessing (default: True)
+        email_text: The content of the email to classify, or an already preprocessed
+            ProcessedEmail (in which case preprocessing is not repeated)
+        use_preprocessing: Whether to apply email preprocessing to raw text (default: True)
+        context: Optional compact context (e.g. the prior classification of an
+            email thread) sent alongside the email text
+        model: Model used for classification (default: DEFAULT_MODEL)
+        llm_client: Client (or ClientPool) to send the request with (default: the shared client)
+        compact_prompt: Send the compacted system prompt (minified JSON examples, ~4% fewer
+            prompt tokens) instead of ENHANCED_SYSTEM_PROMPT (default: False)
+        ledger: TokenLedger the request's token use is recorded in (default: the shared token_ledger)
 
     Returns:
         EmailClassification object with primary and secondary intents and other relevant information
 
     """
     try:
-        # Preprocess the email if requested
-        if use_preprocessing:
-            processed_email = preprocess_email(email_text)
-            # Use the cleaned text for classification
-            text_for_classification = processed_email.clean_text
-            
-            # Print preprocessing info for debugging
-            print(f"[Debug] Email preprocessing applied.")
-            print(f"[Debug] Subject extracted: {processed_email.subject}")
-            print(f"[Debug] Metadata extracted: {json.dumps(processed_email.metadata, indent=2)}")
-        else:
-            text_for_classification = email_text
-            print("[Debug] Email preprocessing skipped.")
-        
-        # Make the API call with preprocessed text
-        response = client.chat.completions.create(
-            model="llama3-70b-8192",
-            response_model=EmailClassification,
-            temperature=0.1,  # Lower temperature for more consistent outputs
-            max_completion_tokens=1024,
-            messages=[
-                {
-                    "role": "system",
-                    "content": ENHANCED_SYSTEM_PROMPT,
-                },
-                {"role": "user", "content": text_for_classification}
-            ]
-        )
+        processed_email, text_for_classification = _prepare_text(email_text, use_preprocessing)
+
+        system_prompt, tokens_saved = classification_prompt(compact_prompt)
+        response = _request_structured(EmailClassification, system_prompt, text_for_classification,
+                                       context, model, MAX_COMPLETION_TOKENS, tokens_saved, llm_client, ledger)
         
         # If preprocessing was used, we can enhance the result with metadata
-        if use_preprocessing and hasattr(processed_email, 'metadata'):
-            # We could override certain fields based on metadata
-            # For example, update attachments_mentioned if detected in preprocessing
-            if processed_email.metadata.get("has_attachments"):
-                response.attachments_mentioned = True
-                
+        if processed_email is not None:
             # Enhance entities if needed (could merge entities from preprocessing)
             # This is optional as the LLM should already detect entities
-            
-            # Update priority if urgent indicators were found
-            if processed_email.metadata.get("urgent_indicators") and response.priority != EmailPriority.URGENT:
-                # Consider upgrading priority if urgent indicators were found
-                if response.priority == EmailPriority.LOW:
-                    response.priority = EmailPriority.MEDIUM
-                elif response.priority == EmailPriority.MEDIUM:
-                    response.priority = EmailPriority.HIGH
+            apply_preprocessing_hints(response, processed_email.has_attachments, processed_email.urgent_indicators)
         
         return response
     
@@ -135,4 +226,91 @@ def classify_email(email_text: str, use_preprocessing: bool = True) -> EmailClas
         print(f"Error during email classification: {str(e)}")
         # Re-raise or handle the error according to your application's needs
         raise
+
+
+def triage_email(email_text: Union[str, ProcessedEmail], use_preprocessing: bool = True,
+                 model: str = DEFAULT_MODEL, llm_client=None) -> EmailTriage:
+    """
+    First-pass triage: only intents, priority and confidence, using a short prompt
+    and a small completion budget.
+
+    Args:
+        email_text: The content of the email, or an already preprocessed ProcessedEmail
+        use_preprocessing: Whether to apply email preprocessing to raw text (default: True)
+        model: Model used for triage (default: DEFAULT_MODEL)
+        llm_client: Client (or ClientPool) to send the request with (default: the shared client)
+
+    Returns:
+        EmailTriage object with primary and secondary intents, priority and confidence
+    """
+    try:
+        processed_email, text_for_classification = _prepare_text(email_text, use_preprocessing)
+        response = _request_structured(EmailTriage, TRIAGE_SYSTEM_PROMPT, text_for_classification,
+                                       None, model, TRIAGE_MAX_COMPLETION_TOKENS, llm_client=llm_client)
+        response._model_priority = response.priority
+        if processed_email is not None:
+            _upgrade_priority(response, processed_email.urgent_indicators)
+        return response
+
+    except Exception as e:
+        print(f"Error during email triage: {str(e)}")
+        raise
+
+
+def needs_full_classification(triage: EmailTriage, confidence_threshold: float = 0.8) -> bool:
+    """
+    Whether a triaged email needs the full classification: high/urgent priority,
+    multiple intents, or a low-confidence triage.
+    """
+    return (
+        triage.priority in (EmailPriority.HIGH, EmailPriority.URGENT)
+        or bool(triage.secondary_intents)
+        or triage.overall_confidence < confidence_threshold
+    )
+
+
+def complete_classification(email_text: Union[str, ProcessedEmail], triage: EmailTriage,
+                            model: str = DEFAULT_MODEL, llm_client=None, compact_prompt: bool = False,
+                            ledger: Optional[TokenLedger] = token_ledger) -> EmailClassification:
+    """
+    Follow-up call filling in the full detail (actions, entities, specialists, ...) for
+    a triaged email, with the triage result as context.
+
+    Args:
+        email_text: The content of the email, or the ProcessedEmail used for triage
+        triage: The EmailTriage returned by triage_email
+        model: Model used for the full classification (default: DEFAULT_MODEL)
+        llm_client: Client (or ClientPool) to send the request with (default: the shared client)
+        compact_prompt: Send the compacted system prompt (see classify_email)
+        ledger: TokenLedger the request's token use is recorded in (default: the shared token_ledger)
+
+    Returns:
+        EmailClassification object
+    """
+    secondary = ", ".join(intent.value for intent in triage.secondary_intents) or "none"
+    # The model's own triage priority: classify_email applies the urgent-indicator upgrade
+    # again, so passing the upgraded priority would raise it twice
+    priority = triage._model_priority or triage.priority
+    context = (
+        f"A first-pass triage classified this email as primary_intent={triage.primary_intent.value}; "
+        f"secondary_intents={secondary}; priority={priority.value}. "
+        f"Confirm or correct it and provide the full classification."
+    )
+    return classify_email(email_text, context=context, model=model, llm_client=llm_client,
+                          compact_prompt=compact_prompt, ledger=ledger)
+
+
+def completion_usage(result: BaseModel) -> dict:
+    """
+    Token usage of the completion behind a result returned by classify_email.
+
+    Returns:
+        Dictionary with 'prompt_tokens' and 'completion_tokens' (0 if the usage is unknown)
+    """
+    raw_response = getattr(result, "_raw_response", None)
+    usage = getattr(raw_response, "usage", None)
+    return {
+        "prompt_tokens": getattr(usage, "prompt_tokens", 0) or 0,
+        "completion_tokens": getattr(usage, "completion_tokens", 0) or 0
+    }
     
\ No newline at end of file
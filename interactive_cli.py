@@ -1,15 +1,40 @@
 import argparse
+import functools
 import json
 import sys
 
-from intent_classification import classify_email
-from email_preprocessing import preprocess_email
+from intent_classification import (
+    classify_email, classification_prompt, triage_email, needs_full_classification, complete_classification,
+    DEFAULT_MODEL, MAX_COMPLETION_TOKENS
+)
+from pipeline import PipelineContext, preprocess_stage, classify_stage
+from helper import read_multiline
+from thread_processing import ThreadTracker
+from mail_corpus import MailCorpus, process_entries
+from watch_folder import WatchFolderDaemon
+from synthetic_corpus import SyntheticCorpusGenerator, write_jsonl, write_mbox, LABELS_SUFFIX
+from result_export import ResultWriter
+from profiling import ProfileSession
+from batch_jobs import run_batch_job, batch_client, iter_input_emails
+from work_queue import WorkQueue, ShardWorker, run_local_workers
+from streaming_pipeline import build_email_pipeline
+from segment_classification import classify_segmented
+from shadow_mode import ShadowClassifier, candidate_client
+from request_coalescing import CoalescingClassifier
+from hedging import HedgedClassifier
+from adaptive_concurrency import AdaptiveClient, AdaptiveConcurrencyLimiter
+from model_routing import ModelRouter
+from client_pool import Endpoint, load_endpoints
+from token_accounting import (
+    COMPACTION_REPORT, estimate_tokens, check_token_budget, forecast_throughput
+)
 
 # Optional imports if these utility modules exist
 try:
-    from classify_sample_email import process_email_batch
+    from classify_sample_email import process_email_batch, sample_emails
 except ImportError:
     process_email_batch = None
+    sample_emails = []
 
 try:
     from test import run_tests, test_multi_line_handling
@@ -23,37 +48,310 @@ except ImportError:
     evaluate = None
 
 
-def interactive_mode():
+def interactive_mode(segmented: bool = False, route: bool = False):
     """Run interactive CLI for single email classification"""
     print("Real Estate Email Intent Classification System")
     print("-----------------------------------------------")
+    # Simple emails go to the small model, complex ones (and low-confidence answers) to the large one
+    router = ModelRouter() if route else None
 
     while True:
         email_text = input("\nEnter the email text to classify (or 'quit' to exit):\n")
         if email_text.strip().lower() == 'quit':
+            if router:
+                router.print_report()
             print("Exiting interactive mode.")
             break
 
         try:
-            processed = preprocess_email(email_text)
+            ctx = preprocess_stage(PipelineContext(raw_text=email_text))
+            processed = ctx.processed
             print("\n--- Email Preprocessing Results ---")
             print(f"Subject: {processed.subject}")
             print(f"Metadata: {json.dumps(processed.metadata, indent=2)}")
 
-            result = classify_email(email_text)
-            display_classification(result)
+            if segmented:
+                # Multi-item emails: classify the list items concurrently and merge
+                ctx.result = classify_segmented(processed)
+            elif router:
+                classify_stage(ctx, classify_fn=router.classify)
+            else:
+                classify_stage(ctx)
+            display_classification(ctx.result)
 
         except Exception as e:
             print(f"Error: {e}")
 
 
+def triage_mode():
+    """Fast first-pass triage; the full classification is only requested when needed"""
+    print("Email Triage (intents, priority and confidence)")
+    print("-----------------------------------------------")
+
+    while True:
+        email_text = read_multiline()
+        if not email_text.strip() or email_text.strip().lower() == 'quit':
+            print("Exiting triage mode.")
+            break
+
+        try:
+            ctx = preprocess_stage(PipelineContext(raw_text=email_text))
+            triage = triage_email(ctx.processed)
+            print("\n--- Triage Results ---")
+            print(f"Primary Intent: {triage.primary_intent}")
+            sec = ', '.join(str(i) for i in triage.secondary_intents) or "None"
+            print(f"Secondary Intents: {sec}")
+            print(f"Priority: {triage.priority}")
+            print(f"Overall Confidence: {triage.overall_confidence:.2f}")
+
+            if needs_full_classification(triage):
+                print("\nRequesting full classification...")
+                display_classification(complete_classification(ctx.processed, triage))
+
+        except Exception as e:
+            print(f"Error: {e}")
+
+
+def thread_mode():
+    """Classify a sequence of replies, sending only the new content of each message"""
+    print("Thread-aware Email Classification")
+    print("---------------------------------")
+    print("Paste each message of a thread (end each with __END__). Enter 'quit' to exit.")
+
+    tracker = ThreadTracker()
+    while True:
+        email_text = read_multiline()
+        if not email_text.strip() or email_text.strip().lower() == 'quit':
+            print("Exiting thread mode.")
+            break
+
+        try:
+            thread_result = tracker.process_message(email_text)
+            print(f"\nThread: {thread_result.thread_id} (message {thread_result.message_index})")
+            if thread_result.reused_previous:
+                print("No new content found; showing the thread's previous classification.")
+            else:
+                print(f"New content classified:\n{thread_result.delta_text}")
+            display_classification(thread_result.classification)
+
+        except Exception as e:
+            print(f"Error: {e}")
+
+
+def corpus_mode(args):
+    """Index a memory-mapped mbox archive and preprocess (or classify) a shard or sample of it"""
+    with MailCorpus(args.path) as corpus:
+        corpus.open_index()
+        print(f"Indexed {len(corpus)} messages ({corpus.index_path})")
+
+        if args.sample:
+            entries = corpus.sample(args.sample, seed=args.seed)
+        elif args.shard:
+            shard_index, shard_count = (int(part) for part in args.shard.split('/'))
+            entries = corpus.shard(shard_index, shard_count)
+        else:
+            entries = corpus.entries
+
+        fn = classify_email if args.classify or args.export else None
+        results = process_entries(args.path, entries, workers=args.workers, fn=fn)
+        if args.export:
+            with ResultWriter(args.export) as writer:
+                writer.write_many(results)
+            print(f"Exported {writer.count} classifications to {args.export}")
+            return
+
+        for message_id, result in results:
+            if args.classify:
+                print(f"{message_id}: {result.primary_intent} (priority: {result.priority})")
+            else:
+                print(f"{message_id}: {result.subject} ({result.paragraph_count} paragraphs)")
+
+
+def tokens_mode(args):
+    """Report prompt token costs, compaction savings and throughput forecast"""
+    report = COMPACTION_REPORT
+    print("\n--- Token Accounting ---")
+    print(f"System prompt: ~{report.original_tokens} tokens, ~{report.compacted_tokens} after compaction "
+          f"(~{report.tokens_saved} saved per request with --compact-prompt)")
+    system_prompt, _ = classification_prompt(args.compact_prompt)
+
+    if args.file:
+        with open(args.file, encoding='utf-8') as f:
+            emails = [f.read()]
+    else:
+        emails = sample_emails
+
+    per_request = []
+    for email_text in emails:
+        clean_text = preprocess_stage(PipelineContext(raw_text=email_text)).processed.clean_text
+        budget = check_token_budget(system_prompt, clean_text, MAX_COMPLETION_TOKENS, args.model, trim=False)
+        per_request.append(budget.total_tokens)
+        print(f"  email ~{estimate_tokens(clean_text)} tokens, request ~{budget.total_tokens} of "
+              f"{budget.context_window}: {clean_text[:60]!r}")
+
+    if per_request:
+        average = sum(per_request) / len(per_request)
+        rpm = forecast_throughput(average, args.tpm, args.rpm)
+        print(f"\nAverage request: ~{average:.0f} tokens (prompt + max completion)")
+        print(f"Forecast at {args.tpm} TPM" + (f" / {args.rpm} RPM" if args.rpm else "") + f": ~{rpm:.1f} emails per minute")
+
+
+def daemon_mode(args):
+    """Continuously classify email files dropped into a directory"""
+    daemon = WatchFolderDaemon(
+        args.drop_dir,
+        results_dir=args.results_dir,
+        workers=args.workers,
+        poll_interval=args.poll_interval
+    )
+    daemon.run()
+
+
+def generate_mode(args):
+    """Write a reproducible synthetic labelled corpus as JSON lines or mbox"""
+    generator = SyntheticCorpusGenerator(
+        seed=args.seed,
+        max_filler_paragraphs=args.max_filler,
+        html_rate=args.html_rate,
+        forward_rate=args.forward_rate,
+        noise=args.noise
+    )
+    writer = write_mbox if args.format == 'mbox' else write_jsonl
+    written = writer(args.output, generator.generate(args.count))
+    print(f"Wrote {written} labelled emails to {args.output} (seed {args.seed})")
+    if args.format == 'mbox':
+        print(f"Labels: {args.output}{LABELS_SUFFIX}")
+
+
+def batch_mode(args):
+    """Classify a corpus offline through the batch API and merge the results"""
+    client = batch_client(args.base_url, args.api_key) if args.base_url else batch_client()
+    report = run_batch_job(
+        iter_input_emails(args.input),
+        args.requests or args.input + '.batch.jsonl',
+        args.output,
+        client=client,
+        model=args.model,
+        poll_interval=args.poll_interval,
+        timeout=args.timeout
+    )
+    for custom_id, error in list(report.failed.items())[:10]:
+        print(f"  {custom_id}: {error}")
+
+
+def stream_mode(args):
+    """Classify a corpus through the bounded streaming pipeline, writing results as they finish"""
+    failed = []
+    classify_fn = functools.partial(classify_email, compact_prompt=args.compact_prompt)
+    adaptive = None
+    if args.adaptive:
+        # --classify-workers becomes the ceiling; the in-flight limit follows the provider's capacity
+        adaptive = AdaptiveClient(limiter=AdaptiveConcurrencyLimiter(max_limit=args.classify_workers))
+        classify_fn = functools.partial(classify_fn, llm_client=adaptive)
+    router = None
+    if args.route:
+        # Simple emails go to the small model, complex ones (and low-confidence answers) to the large one
+        router = ModelRouter(classify_fn=classify_fn)
+        classify_fn = router.classify
+    hedger = None
+    if args.hedge:
+        # Duplicate requests that outlast the p95 latency, for at most --hedge-rate of the calls
+        hedger = HedgedClassifier(classify_fn=classify_fn, max_hedge_rate=args.hedge_rate,
+                                  max_workers=2 * args.classify_workers)
+        classify_fn = hedger.classify
+    coalescer = None
+    if args.coalesce:
+        # Duplicates classified concurrently (all missing the cache) share one LLM request
+        coalescer = CoalescingClassifier(classify_fn=classify_fn,
+                                         prompt=classification_prompt(args.compact_prompt)[0])
+        classify_fn = coalescer.classify
+    shadow = None
+    if args.shadow_model:
+        # Mirror a sample of the calls to the candidate model, off the critical path and
+        # through a client of its own, so the candidate never takes production capacity
+        if args.shadow_endpoints:
+            shadow_endpoints = load_endpoints(args.shadow_endpoints)
+        elif args.shadow_base_url:
+            shadow_endpoints = [Endpoint(name="shadow", api_key=args.shadow_api_key, base_url=args.shadow_base_url)]
+        else:
+            shadow_endpoints = None
+        shadow = ShadowClassifier(candidate_fn=functools.partial(classify_email, model=args.shadow_model,
+                                                                 compact_prompt=args.compact_prompt,
+                                                                 llm_client=candidate_client(shadow_endpoints)),
+                                  primary_fn=classify_fn, sample_rate=args.shadow_rate, log_path=args.shadow_log)
+        classify_fn = shadow.classify
+
+    with ResultWriter(args.output) as writer:
+        def sink(ctx):
+            if ctx.error is None:
+                writer.write(ctx.email_id, ctx.result)
+            else:
+                failed.append(ctx.email_id)
+
+        pipeline = build_email_pipeline(
+            sink=sink,
+            preprocess_workers=args.preprocess_workers,
+            preprocess_mode=args.preprocess_mode,
+            classify_workers=args.classify_workers,
+            queue_size=args.queue_size,
+            report_interval=args.report_interval,
+            classify_fn=classify_fn
+        )
+        pipeline.run_to_completion(iter_input_emails(args.input))
+
+    print(f"Wrote {writer.count} classifications to {args.output}, {len(failed)} failed; "
+          f"cache hits: {pipeline.cache.hits}")
+    if adaptive:
+        adaptive.print_report()
+    if router:
+        router.print_report()
+    if hedger:
+        hedger.shutdown()
+        hedger.print_report()
+    if coalescer:
+        coalescer.print_report()
+    if shadow:
+        shadow.shutdown()
+        shadow.print_report()
+
+
+def queue_mode(args):
+    """Coordinate sharded classification of a corpus through a SQLite work queue"""
+    if args.action == 'init':
+        if not args.corpus:
+            print("queue init needs --corpus")
+            return
+        # Index once here so workers only load the index
+        with MailCorpus(args.corpus) as corpus:
+            corpus.open_index()
+        with WorkQueue(args.db) as queue:
+            queue.create_job(args.corpus, args.shards)
+            print(f"Queued {args.shards} shards of {args.corpus}: {queue.progress()}")
+    elif args.action == 'work':
+        if args.workers > 1:
+            run_local_workers(args.db, workers=args.workers, threads=args.threads, lease_seconds=args.lease)
+        else:
+            worker = ShardWorker(args.db, threads=args.threads, lease_seconds=args.lease)
+            worker.run()
+            print(f"Worker {worker.worker_id}: {worker.processed_count} classified, {worker.failed_count} failed")
+    elif args.action == 'status':
+        with WorkQueue(args.db) as queue:
+            print(queue.progress())
+    elif args.action == 'export':
+        if not args.output:
+            print("queue export needs --output")
+            return
+        with WorkQueue(args.db) as queue:
+            print(f"Exported {queue.export(args.output)} classifications to {args.output}")
+
+
 def sample_mode():
     """Process a batch of sample emails if available"""
     if process_email_batch is None:
         print("Sample batch processor not found. Ensure 'classify_sample_email.py' is available.")
         return
-    samples = process_email_batch
     # process_email_batch itself prints results
+    process_email_batch(sample_emails)
 
 
 def test_mode():
@@ -110,14 +408,121 @@ def display_classification(result):
     print(result.model_dump_json(indent=2))
 
 
-def main():
+def build_parser() -> argparse.ArgumentParser:
+    """Argument parser of the CLI (global options and one subparser per mode)"""
     parser = argparse.ArgumentParser(
         description="Real Estate Email Intent Classification CLI"
     )
+    parser.add_argument('--profile', action='store_true',
+                        help='Profile the subcommand (cProfile, tracemalloc, sampled stacks)')
+    parser.add_argument('--profile-prefix', default='profile', metavar='PREFIX',
+                        help='Profile output files: PREFIX.pstats, PREFIX.collapsed and PREFIX.alloc.txt')
+    parser.add_argument('--profile-top', type=int, default=20, help='Entries in the profile reports')
     subparsers = parser.add_subparsers(dest='command')
 
     # Interactive
     parser_inter = subparsers.add_parser('interactive', help='Interactive single email classification')
+    inter_mode = parser_inter.add_mutually_exclusive_group()
+    inter_mode.add_argument('--segmented', action='store_true',
+                            help='Classify the items of multi-item emails concurrently and merge the results')
+    inter_mode.add_argument('--route', action='store_true',
+                            help='Route simple emails to the small model and complex ones to the large model')
+
+    # Triage
+    subparsers.add_parser('triage', help='Fast triage (intents, priority, confidence), full detail only when needed')
+
+    # Thread-aware classification
+    subparsers.add_parser('thread', help='Classify replies in a thread incrementally (new content only)')
+
+    # Memory-mapped corpus
+    parser_corpus = subparsers.add_parser('corpus', help='Index an mbox archive and process a shard or sample of it')
+    parser_corpus.add_argument('path', help='Path of the mbox archive')
+    parser_corpus.add_argument('--shard', help="Shard to process, as 'index/count' (e.g. 0/8)")
+    parser_corpus.add_argument('--sample', type=int, help='Process a random sample of this many messages')
+    parser_corpus.add_argument('--seed', type=int, default=0, help='Seed for --sample')
+    parser_corpus.add_argument('--workers', type=int, default=4, help='Number of worker processes')
+    parser_corpus.add_argument('--classify', action='store_true', help='Classify messages, not only preprocess them')
+    parser_corpus.add_argument('--export', help='Classify and write results as JSON lines to this path (.gz/.zst compressed)')
+
+    # Token accounting
+    parser_tokens = subparsers.add_parser('tokens', help='Estimate token costs and forecast throughput against TPM limits')
+    parser_tokens.add_argument('--file', help='Email file to estimate (default: the sample emails)')
+    parser_tokens.add_argument('--model', default=DEFAULT_MODEL, help='Model whose context window is checked')
+    parser_tokens.add_argument('--tpm', type=int, default=6000, help='Tokens-per-minute limit of the account')
+    parser_tokens.add_argument('--rpm', type=int, help='Requests-per-minute limit of the account')
+    parser_tokens.add_argument('--compact-prompt', action='store_true',
+                               help='Estimate with the compacted system prompt (minified JSON examples)')
+
+    # Watch-folder daemon
+    parser_daemon = subparsers.add_parser('daemon', help='Watch a directory and classify new .eml/.txt files')
+    parser_daemon.add_argument('drop_dir', help='Directory new email files are dropped into')
+    parser_daemon.add_argument('--results-dir', help="Where result JSON files are written (default: '<drop_dir>/results')")
+    parser_daemon.add_argument('--workers', type=int, default=4, help='Number of classification workers')
+    parser_daemon.add_argument('--poll-interval', type=float, default=0.5, help='Seconds between directory scans')
+
+    # Synthetic corpus
+    parser_generate = subparsers.add_parser('generate', help='Generate a synthetic labelled email corpus')
+    parser_generate.add_argument('output', help='Output file')
+    parser_generate.add_argument('--count', type=int, default=1000, help='Number of emails to generate')
+    parser_generate.add_argument('--seed', type=int, default=0, help='Seed of the corpus')
+    parser_generate.add_argument('--format', choices=['jsonl', 'mbox'], default='jsonl', help='Output format')
+    parser_generate.add_argument('--max-filler', type=int, default=2, help='Maximum extra context paragraphs per email')
+    parser_generate.add_argument('--html-rate', type=float, default=0.1, help='Fraction of HTML emails')
+    parser_generate.add_argument('--forward-rate', type=float, default=0.15, help='Fraction of forwarded emails')
+    parser_generate.add_argument('--noise', type=float, default=0.0, help='Per-word typo probability')
+
+    # Offline batch job
+    parser_batch = subparsers.add_parser('batch', help='Classify a corpus offline through the batch API')
+    parser_batch.add_argument('input', help='mbox archive or JSON lines file (email_id, content)')
+    parser_batch.add_argument('output', help='Where merged results are written (.gz/.zst compressed)')
+    parser_batch.add_argument('--requests', help="Batch request file (default: '<input>.batch.jsonl')")
+    parser_batch.add_argument('--model', default=DEFAULT_MODEL, help='Model used for classification')
+    parser_batch.add_argument('--poll-interval', type=float, default=30.0, help='Seconds between status polls')
+    parser_batch.add_argument('--timeout', type=float, help='Stop waiting after this many seconds')
+    parser_batch.add_argument('--base-url', help='Batch API base URL (e.g. a local mock server)')
+    parser_batch.add_argument('--api-key', default='test', help='API key used with --base-url')
+
+    # Streaming pipeline
+    parser_stream = subparsers.add_parser('stream', help='Classify a corpus through a streaming pipeline with bounded queues')
+    parser_stream.add_argument('input', help='mbox archive or JSON lines file (email_id, content)')
+    parser_stream.add_argument('output', help='Where results are written (.gz/.zst compressed)')
+    parser_stream.add_argument('--preprocess-workers', type=int, default=2, help='Preprocessing parallelism')
+    parser_stream.add_argument('--preprocess-mode', choices=['thread', 'process'], default='thread',
+                               help='Run preprocessing in threads or processes')
+    parser_stream.add_argument('--classify-workers', type=int, default=8, help='Concurrent classification requests')
+    parser_stream.add_argument('--queue-size', type=int, default=64, help='Capacity of each stage queue')
+    parser_stream.add_argument('--report-interval', type=float, default=5.0, help='Seconds between progress lines')
+    parser_stream.add_argument('--compact-prompt', action='store_true',
+                               help='Send the compacted system prompt (minified JSON examples)')
+    parser_stream.add_argument('--route', action='store_true',
+                               help='Route simple emails to the small model and complex ones to the large model')
+    parser_stream.add_argument('--adaptive', action='store_true',
+                               help='Adapt the number of in-flight LLM requests (AIMD, up to --classify-workers)')
+    parser_stream.add_argument('--hedge', action='store_true',
+                               help='Send a duplicate request when a classification outlasts the p95 latency')
+    parser_stream.add_argument('--hedge-rate', type=float, default=0.1, help='Most calls that may send a hedge')
+    parser_stream.add_argument('--coalesce', action='store_true',
+                               help='Share one LLM request between identical emails classified concurrently')
+    parser_stream.add_argument('--shadow-model', help='Mirror a sample of calls to this candidate model (shadow mode)')
+    parser_stream.add_argument('--shadow-rate', type=float, default=0.1, help='Fraction of calls mirrored')
+    parser_stream.add_argument('--shadow-log', help='JSON lines file of primary/candidate result pairs')
+    parser_stream.add_argument('--shadow-endpoints',
+                               help='JSON endpoints file of the candidate (see LLM_ENDPOINTS_FILE)')
+    parser_stream.add_argument('--shadow-base-url', help='Base URL of the candidate endpoint')
+    parser_stream.add_argument('--shadow-api-key', default='test', help='API key used with --shadow-base-url')
+
+    # Sharded work queue
+    parser_queue = subparsers.add_parser('queue', help='Sharded classification of a corpus by workers on any node')
+    parser_queue.add_argument('action', choices=['init', 'work', 'status', 'export'],
+                              help='init: queue the shards of a corpus; work: lease and process shards; '
+                                   'status: shard progress; export: write merged results')
+    parser_queue.add_argument('db', help='Path of the SQLite queue database')
+    parser_queue.add_argument('--corpus', help='mbox archive to shard (init)')
+    parser_queue.add_argument('--shards', type=int, default=64, help='Number of shards (init)')
+    parser_queue.add_argument('--workers', type=int, default=1, help='Worker processes on this node (work)')
+    parser_queue.add_argument('--threads', type=int, default=4, help='Concurrent classifications per worker (work)')
+    parser_queue.add_argument('--lease', type=float, default=300.0, help='Lease length in seconds (work)')
+    parser_queue.add_argument('--output', help='Export path, .gz/.zst compressed (export)')
 
     # Sample batch
     subparsers.add_parser('sample', help='Run sample email batch classification')
@@ -127,11 +532,46 @@ def main():
 
     # Multi-line test
     subparsers.add_parser('multiline', help='Test multi-line handling specifically')
+    return parser
 
+
+def main():
+    parser = build_parser()
     args = parser.parse_args()
 
+    if args.profile and args.command:
+        with ProfileSession(args.profile_prefix, top_n=args.profile_top):
+            handled = run_command(args)
+    else:
+        handled = run_command(args)
+
+    if not handled:
+        parser.print_help()
+        sys.exit(1)
+
+
+def run_command(args) -> bool:
+    """Run the selected subcommand; returns False if no subcommand was given"""
     if args.command == 'interactive':
-        interactive_mode()
+        interactive_mode(args.segmented, args.route)
+    elif args.command == 'triage':
+        triage_mode()
+    elif args.command == 'thread':
+        thread_mode()
+    elif args.command == 'corpus':
+        corpus_mode(args)
+    elif args.command == 'tokens':
+        tokens_mode(args)
+    elif args.command == 'daemon':
+        daemon_mode(args)
+    elif args.command == 'generate':
+        generate_mode(args)
+    elif args.command == 'batch':
+        batch_mode(args)
+    elif args.command == 'stream':
+        stream_mode(args)
+    elif args.command == 'queue':
+        queue_mode(args)
     elif args.command == 'sample':
         sample_mode()
     elif args.command == 'test':
@@ -139,8 +579,8 @@ def main():
     elif args.command == 'multiline':
         multiline_mode()
     else:
-        parser.print_help()
-        sys.exit(1)
+        return False
+    return True
 
 
 if __name__ == '__main__':
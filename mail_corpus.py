@@ -0,0 +1,271 @@
+import os
+import re
+import mmap
+import email
+import random
+from email import policy
+from dataclasses import dataclass
+from multiprocessing import Pool
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+from email_preprocessing import preprocess_email, ProcessedEmail
+
+# Index files start with this header so stale or foreign files are detected
+INDEX_HEADER = b"#mail-corpus-index v1"
+INDEX_SUFFIX = ".idx"
+
+# mbox messages start with a "From " envelope line at the beginning of a line
+MBOX_SEPARATOR = b"\nFrom "
+MESSAGE_ID_PATTERN = re.compile(rb"(?im)^Message-ID:[ \t]*(<[^>\r\n]+>|[^\s]+)")
+
+# Only the first few KB of a message are scanned for its Message-ID
+HEADER_SCAN_BYTES = 8192
+
+
+def message_text(raw) -> str:
+    """
+    Subject and text body of a raw RFC822 message, in the form preprocess_email expects.
+
+    The header block is dropped except for the Subject, and the body is decoded
+    (transfer encoding and charset); text/plain is preferred over text/html.
+
+    Args:
+        raw: Message bytes (or a memoryview slice of the corpus mapping)
+
+    Returns:
+        "Subject: ...\n\n<body>", or just the body if the message has no subject
+    """
+    message = email.message_from_bytes(bytes(raw), policy=policy.default)
+    body_part = message.get_body(preferencelist=("plain", "html"))
+    body = ""
+    if body_part is not None:
+        try:
+            body = body_part.get_content()
+        except LookupError:
+            # Unknown charset: decode the raw payload as UTF-8 instead
+            body = (body_part.get_payload(decode=True) or b"").decode("utf-8", errors="replace")
+    subject = message.get("Subject", "")
+    return f"Subject: {subject}\n\n{body}" if subject else body
+
+
+@dataclass(frozen=True)
+class CorpusEntry:
+    """Location of one message inside the corpus file"""
+    message_id: str
+    start: int   # Byte offset of the first byte after the "From " envelope line
+    end: int     # Byte offset one past the last byte of the message
+
+
+class MailCorpus:
+    """
+    Memory-mapped mbox archive with a persistent offset index (message id -> byte range).
+
+    The archive is mapped read-only, so every process that opens the same file shares
+    the OS page cache. Messages are returned as memoryview slices of the mapping and
+    are only parsed (message_text) when they are preprocessed.
+    """
+
+    def __init__(self, path: str, index_path: Optional[str] = None):
+        """
+        Args:
+            path: Path of the mbox archive
+            index_path: Path of the offset index (default: '<path>.idx')
+        """
+        self.path = path
+        self.index_path = index_path or path + INDEX_SUFFIX
+        self._file = open(path, "rb")
+        size = os.fstat(self._file.fileno()).st_size
+        self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if size else None
+        self._view = memoryview(self._mmap) if self._mmap is not None else memoryview(b"")
+        self.entries: List[CorpusEntry] = []
+        self._by_id: Dict[str, CorpusEntry] = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def close(self):
+        """Release the mapping and the underlying file"""
+        try:
+            self._view.release()
+            if self._mmap is not None:
+                self._mmap.close()
+        except BufferError:
+            # Slices handed out are still alive; the mapping goes away once they are released
+            pass
+        self._file.close()
+
+    def _source_signature(self) -> bytes:
+        """Size and mtime of the archive, stored in the index to detect stale indexes"""
+        stat = os.stat(self.path)
+        return f"size={stat.st_size} mtime_ns={stat.st_mtime_ns}".encode("ascii")
+
+    def _set_entries(self, entries: List[CorpusEntry]):
+        self.entries = entries
+        self._by_id = {entry.message_id: entry for entry in entries}
+
+    def build_index(self) -> List[CorpusEntry]:
+        """Scan the mapping for message boundaries without parsing message bodies"""
+        entries = []
+        seen_ids: Dict[str, int] = {}
+        if self._mmap is None:
+            self._set_entries(entries)
+            return entries
+
+        mm = self._mmap
+        size = len(mm)
+        position = 0 if mm[:5] == b"From " else mm.find(MBOX_SEPARATOR)
+        if position > 0:
+            position += 1
+
+        while 0 <= position < size:
+            next_separator = mm.find(MBOX_SEPARATOR, position)
+            end = next_separator + 1 if next_separator != -1 else size
+
+            # Skip the "From " envelope line itself
+            line_end = mm.find(b"\n", position, end)
+            start = line_end + 1 if line_end != -1 else end
+
+            header = mm[start:min(end, start + HEADER_SCAN_BYTES)]
+            match = MESSAGE_ID_PATTERN.search(header)
+            message_id = match.group(1).decode("utf-8", "replace") if match else f"offset:{start}"
+
+            # Keep ids unique even if the archive contains duplicates
+            if message_id in seen_ids:
+                seen_ids[message_id] += 1
+                message_id = f"{message_id}#{seen_ids[message_id]}"
+            else:
+                seen_ids[message_id] = 1
+
+            entries.append(CorpusEntry(message_id, start, end))
+            position = end if next_separator != -1 else size
+
+        self._set_entries(entries)
+        return entries
+
+    def save_index(self):
+        """Write the offset index next to the archive (atomically)"""
+        tmp_path = self.index_path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(INDEX_HEADER + b" " + self._source_signature() + b"\n")
+            for entry in self.entries:
+                f.write(f"{entry.start}\t{entry.end}\t{entry.message_id}\n".encode("utf-8"))
+        os.replace(tmp_path, self.index_path)
+
+    def load_index(self) -> bool:
+        """Load the offset index if it exists and matches the archive; returns True on success"""
+        if not os.path.exists(self.index_path):
+            return False
+
+        with open(self.index_path, "rb") as f:
+            header = f.readline().rstrip(b"\n")
+            if header != INDEX_HEADER + b" " + self._source_signature():
+                return False
+            entries = []
+            for line in f:
+                start, end, message_id = line.rstrip(b"\n").split(b"\t", 2)
+                entries.append(CorpusEntry(message_id.decode("utf-8"), int(start), int(end)))
+
+        self._set_entries(entries)
+        return True
+
+    def open_index(self) -> List[CorpusEntry]:
+        """Load the persistent index, rebuilding and saving it if missing or stale"""
+        if not self.load_index():
+            self.build_index()
+            self.save_index()
+        return self.entries
+
+    def get_bytes(self, message_id: str) -> memoryview:
+        """Zero-copy view of a message's raw bytes"""
+        entry = self._by_id[message_id]
+        return self._view[entry.start:entry.end]
+
+    def slice(self, entry: CorpusEntry) -> memoryview:
+        """Zero-copy view of the bytes of an index entry"""
+        return self._view[entry.start:entry.end]
+
+    def preprocess(self, message_id: str) -> ProcessedEmail:
+        """Preprocess one message straight from the mapping"""
+        return preprocess_email(message_text(self.get_bytes(message_id)))
+
+    def shard(self, shard_index: int, shard_count: int) -> List[CorpusEntry]:
+        """
+        Entries of one shard. Shards are contiguous byte ranges of the archive, so a
+        worker reads its shard sequentially.
+        """
+        if not 0 <= shard_index < shard_count:
+            raise ValueError(f"shard_index must be in [0, {shard_count}), got {shard_index}")
+        total = len(self.entries)
+        return self.entries[total * shard_index // shard_count:total * (shard_index + 1) // shard_count]
+
+    def sample(self, count: int, seed: int = 0) -> List[CorpusEntry]:
+        """Reproducible random sample of entries"""
+        return random.Random(seed).sample(self.entries, min(count, len(self.entries)))
+
+    def iter_processed(self, entries: Optional[List[CorpusEntry]] = None) -> Iterator[Tuple[str, ProcessedEmail]]:
+        """Preprocess entries (default: all) one at a time"""
+        for entry in entries if entries is not None else self.entries:
+            yield entry.message_id, preprocess_email(message_text(self.slice(entry)))
+
+
+# Each worker process opens its own mapping of the archive once
+_worker_corpus: Optional[MailCorpus] = None
+_worker_fn: Optional[Callable[[ProcessedEmail], object]] = None
+
+
+def _init_worker(path: str, index_path: Optional[str], fn: Optional[Callable[[ProcessedEmail], object]]):
+    global _worker_corpus, _worker_fn
+    _worker_corpus = MailCorpus(path, index_path)
+    _worker_fn = fn
+
+
+def _process_range(task: Tuple[str, int, int]):
+    message_id, start, end = task
+    processed = preprocess_email(message_text(_worker_corpus.slice(CorpusEntry(message_id, start, end))))
+    return message_id, (_worker_fn(processed) if _worker_fn is not None else processed)
+
+
+def process_entries(path: str, entries: List[CorpusEntry], workers: int = 4,
+                    fn: Optional[Callable[[ProcessedEmail], object]] = None,
+                    index_path: Optional[str] = None) -> Iterator[Tuple[str, object]]:
+    """
+    Preprocess (and optionally further process) corpus entries with a worker pool.
+
+    Workers map the archive themselves and receive only byte ranges, so no message
+    content is pickled to them and the page cache is shared across processes.
+
+    Args:
+        path: Path of the mbox archive
+        entries: Entries to process (e.g. from MailCorpus.shard or MailCorpus.sample)
+        workers: Number of worker processes
+        fn: Optional picklable function applied to each ProcessedEmail in the worker
+            (e.g. intent_classification.classify_email); its return value is yielded
+        index_path: Optional path of the offset index
+
+    Yields:
+        (message_id, result) tuples in input order
+    """
+    tasks = [(entry.message_id, entry.start, entry.end) for entry in entries]
+    with Pool(processes=workers, initializer=_init_worker, initargs=(path, index_path, fn)) as pool:
+        yield from pool.imap(_process_range, tasks, chunksize=64)
+
+
+# Test function
+if __name__ == "__main__":
+    import sys
+
+    if len(sys.argv) < 2:
+        print("Usage: python mail_corpus.py <archive.mbox>")
+        sys.exit(1)
+
+    with MailCorpus(sys.argv[1]) as corpus:
+        corpus.open_index()
+        print(f"Indexed {len(corpus)} messages ({corpus.index_path})")
+        for message_id, processed in corpus.iter_processed(corpus.sample(3)):
+            print(f"{message_id}: {processed.subject} ({processed.paragraph_count} paragraphs)")
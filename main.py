@@ -1,7 +1,8 @@
 import json 
-from intent_classification import classify_email 
-from email_preprocessing import preprocess_email
+import argparse
+from pipeline import PipelineContext, preprocess_stage, classify_stage
 from helper import read_multiline, display_classification
+from profiling import ProfileSession
 
 def main():
     print("Real Estate Email Intent Classification System")
@@ -19,16 +20,18 @@ def main():
             break
 
         try:
-            # Preprocess
-            processed_email = preprocess_email(email_text)
+            # Preprocess once; the same ProcessedEmail is reused for classification
+            ctx = preprocess_stage(PipelineContext(raw_text=email_text))
+            processed_email = ctx.processed
             print("\n--- Email Preprocessing Results ---")
             print(f"Subject: {processed_email.subject}")
             print(f"Metadata: {json.dumps(processed_email.metadata, indent=2)}")
             print(f"Paragraph Count: {len(processed_email.paragraphs)}")
 
             # Classify
-            result = classify_email(email_text)
-            display_classification(result)
+            classify_stage(ctx)
+            display_classification(ctx.result)
+            print(f"\nStage Timings: {', '.join(f'{stage}={secs:.3f}s' for stage, secs in ctx.timings.items())}")
 
         except Exception as e:
             print(f"Error during processing: {e}")
@@ -37,4 +40,16 @@ def main():
 
 
 if __name__ == '__main__':
-    main()
+    parser = argparse.ArgumentParser(description="Real Estate Email Intent Classification System")
+    parser.add_argument('--profile', action='store_true',
+                        help='Profile the session (cProfile, tracemalloc, sampled stacks)')
+    parser.add_argument('--profile-prefix', default='profile', metavar='PREFIX',
+                        help='Profile output files: PREFIX.pstats, PREFIX.collapsed and PREFIX.alloc.txt')
+    parser.add_argument('--profile-top', type=int, default=20, help='Entries in the profile reports')
+    args = parser.parse_args()
+
+    if args.profile:
+        with ProfileSession(args.profile_prefix, top_n=args.profile_top):
+            main()
+    else:
+        main()
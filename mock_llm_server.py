@@ -0,0 +1,324 @@
+import json
+import time
+import random
+import argparse
+import threading
+from collections import deque
+from email.parser import BytesParser
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, Optional
+
+
+def example_from_schema(schema: Dict[str, Any], defs: Optional[Dict[str, Any]] = None) -> Any:
+    """
+    Build a minimal valid instance of a JSON schema (as produced by pydantic), so the
+    mock can answer any structured-output request instructor sends.
+    """
+    defs = defs if defs is not None else schema.get("$defs", {})
+    if "$ref" in schema:
+        return example_from_schema(defs[schema["$ref"].split("/")[-1]], defs)
+    if "anyOf" in schema:
+        return example_from_schema(schema["anyOf"][0], defs)
+    if "allOf" in schema:
+        return example_from_schema(schema["allOf"][0], defs)
+    if "enum" in schema:
+        return schema["enum"][0]
+    if "default" in schema:
+        return schema["default"]
+
+    kind = schema.get("type")
+    if kind == "object":
+        properties = schema.get("properties", {})
+        return {name: example_from_schema(prop, defs) for name, prop in properties.items()}
+    if kind == "array":
+        return [example_from_schema(schema.get("items", {}), defs)]
+    if kind == "string":
+        return "mock"
+    if kind == "number":
+        return min(max(0.9, schema.get("minimum", 0.9)), schema.get("maximum", 0.9))
+    if kind == "integer":
+        return schema.get("minimum", 1)
+    if kind == "boolean":
+        return False
+    return None
+
+
+class MockLLMState:
+    """Behaviour and counters of one mock endpoint"""
+
+    def __init__(self,
+                 latency: float = 0.02,
+                 rate_limit: Optional[int] = None,
+                 rate_window: float = 60.0,
+                 capacity: Optional[int] = None,
+                 error_rate: float = 0.0,
+                 seed: int = 0,
+                 batch_delay: float = 1.0):
+        """
+        Args:
+            latency: Seconds each completion takes
+            rate_limit: Requests allowed per rate_window; more get HTTP 429 (None: unlimited)
+            rate_window: Length of the rate-limit window in seconds
+            capacity: Concurrent requests served; more get HTTP 429 (None: unlimited)
+            error_rate: Fraction of requests answered with HTTP 500
+            seed: Seed for injected errors
+            batch_delay: Seconds a batch stays in progress before its results are ready
+        """
+        self.latency = latency
+        self.rate_limit = rate_limit
+        self.rate_window = rate_window
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._recent = deque()
+        self.in_flight = 0
+        self.served = 0
+        self.rate_limited = 0
+        self.errors = 0
+        self.batch_delay = batch_delay
+        self.files: Dict[str, Dict[str, Any]] = {}     # file id -> {"filename", "content", ...}
+        self.batches: Dict[str, Dict[str, Any]] = {}   # batch id -> batch object
+        self._next_id = 0
+        self._batch_lock = threading.Lock()
+
+    def new_id(self, prefix: str) -> str:
+        with self._lock:
+            self._next_id += 1
+            return f"{prefix}_mock{self._next_id:06d}"
+
+    def add_file(self, filename: str, content: bytes, purpose: str) -> Dict[str, Any]:
+        file_id = self.new_id("file")
+        self.files[file_id] = {"id": file_id, "object": "file", "bytes": len(content), "created_at": int(time.time()),
+                               "filename": filename, "purpose": purpose, "content": content}
+        return {key: value for key, value in self.files[file_id].items() if key != "content"}
+
+    def create_batch(self, input_file_id: str, endpoint: str, completion_window: str) -> Dict[str, Any]:
+        batch_id = self.new_id("batch")
+        lines = [line for line in self.files[input_file_id]["content"].splitlines() if line.strip()]
+        self.batches[batch_id] = {
+            "id": batch_id, "object": "batch", "endpoint": endpoint, "input_file_id": input_file_id,
+            "completion_window": completion_window, "status": "in_progress", "created_at": int(time.time()),
+            "output_file_id": None, "error_file_id": None,
+            "request_counts": {"total": len(lines), "completed": 0, "failed": 0},
+            "_ready_at": time.monotonic() + self.batch_delay
+        }
+        return self.public_batch(batch_id)
+
+    def public_batch(self, batch_id: str) -> Dict[str, Any]:
+        """The batch object, running it first once its delay has passed"""
+        batch = self.batches[batch_id]
+        with self._batch_lock:
+            if batch["status"] == "in_progress" and time.monotonic() >= batch["_ready_at"]:
+                self._run_batch(batch)
+            return {key: value for key, value in batch.items() if not key.startswith("_")}
+
+    def _run_batch(self, batch: Dict[str, Any]):
+        """Answer every request line; error_rate of them fail and go to the error file"""
+        output, errors = [], []
+        for line in self.files[batch["input_file_id"]]["content"].splitlines():
+            if not line.strip():
+                continue
+            request = json.loads(line)
+            if self._rng.random() < self.error_rate:
+                errors.append({"id": self.new_id("batch_req"), "custom_id": request["custom_id"], "response": None,
+                               "error": {"code": "server_error", "message": "Internal error"}})
+            else:
+                output.append({"id": self.new_id("batch_req"), "custom_id": request["custom_id"], "error": None,
+                               "response": {"status_code": 200, "body": _completion(request["body"])}})
+
+        for key, records in (("output_file_id", output), ("error_file_id", errors)):
+            if records:
+                content = b"".join(json.dumps(record).encode("utf-8") + b"\n" for record in records)
+                batch[key] = self.add_file(f"{batch['id']}_{key[:-8]}.jsonl", content, "batch_output")["id"]
+        batch["request_counts"].update(completed=len(output), failed=len(errors))
+        batch["status"] = "completed"
+        batch["completed_at"] = int(time.time())
+
+    def admit(self) -> Optional[tuple]:
+        """Admit a request; returns (status, retry_after) if it must be rejected"""
+        with self._lock:
+            now = time.monotonic()
+            while self._recent and now - self._recent[0] >= self.rate_window:
+                self._recent.popleft()
+
+            if self.rate_limit is not None and len(self._recent) >= self.rate_limit:
+                self.rate_limited += 1
+                return 429, max(0.0, self.rate_window - (now - self._recent[0]))
+            if self.capacity is not None and self.in_flight >= self.capacity:
+                self.rate_limited += 1
+                return 429, self.latency
+            if self._rng.random() < self.error_rate:
+                self.errors += 1
+                return 500, None
+
+            self._recent.append(now)
+            self.in_flight += 1
+            return None
+
+    def release(self):
+        with self._lock:
+            self.in_flight -= 1
+            self.served += 1
+
+
+def _completion(request: Dict[str, Any]) -> Dict[str, Any]:
+    """An OpenAI-style chat completion answering the request"""
+    prompt_chars = sum(len(str(message.get("content", ""))) for message in request.get("messages", []))
+    message: Dict[str, Any] = {"role": "assistant", "content": "OK"}
+
+    tools = request.get("tools") or []
+    if tools:
+        function = tools[0]["function"]
+        arguments = json.dumps(example_from_schema(function.get("parameters", {})))
+        message = {
+            "role": "assistant",
+            "content": None,
+            "tool_calls": [{
+                "id": "call_mock",
+                "type": "function",
+                "function": {"name": function["name"], "arguments": arguments}
+            }]
+        }
+        completion_chars = len(arguments)
+    else:
+        completion_chars = 2
+
+    return {
+        "id": "chatcmpl-mock",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": request.get("model", "mock"),
+        "choices": [{"index": 0, "message": message, "finish_reason": "tool_calls" if tools else "stop"}],
+        "usage": {
+            "prompt_tokens": prompt_chars // 4,
+            "completion_tokens": completion_chars // 4,
+            "total_tokens": (prompt_chars + completion_chars) // 4
+        }
+    }
+
+
+class MockLLMHandler(BaseHTTPRequestHandler):
+    """
+    Serves POST .../chat/completions and a minimal files / batches API
+    (POST .../files, POST .../batches, GET .../batches/{id}, GET .../files/{id}/content),
+    Groq and OpenAI paths alike
+    """
+
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status: int, body: Dict[str, Any], headers: Optional[Dict[str, str]] = None):
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _upload(self, body: bytes):
+        """POST .../files: a multipart form with 'file' and 'purpose' fields"""
+        header = f"Content-Type: {self.headers.get('Content-Type')}\r\n\r\n".encode("utf-8")
+        form = BytesParser().parsebytes(header + body)
+        fields = {part.get_param("name", header="content-disposition"): part for part in form.get_payload()}
+        if "file" not in fields:
+            self._send(400, {"error": {"message": "Missing file"}})
+            return
+        purpose = fields["purpose"].get_payload(decode=True).decode("utf-8") if "purpose" in fields else "batch"
+        self._send(200, self.server.state.add_file(fields["file"].get_filename() or "upload.jsonl",
+                                                   fields["file"].get_payload(decode=True), purpose))
+
+    def do_GET(self):
+        state: MockLLMState = self.server.state
+        parts = self.path.rstrip("/").split("/")
+        if len(parts) >= 2 and parts[-2] == "batches" and parts[-1] in state.batches:
+            self._send(200, state.public_batch(parts[-1]))
+        elif len(parts) >= 3 and parts[-3] == "files" and parts[-1] == "content" and parts[-2] in state.files:
+            content = state.files[parts[-2]]["content"]
+            self.send_response(200)
+            self.send_header("Content-Type", "application/octet-stream")
+            self.send_header("Content-Length", str(len(content)))
+            self.end_headers()
+            self.wfile.write(content)
+        else:
+            self._send(404, {"error": {"message": f"Unknown path {self.path}"}})
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        path = self.path.rstrip("/")
+        state: MockLLMState = self.server.state
+        if path.endswith("/files"):
+            self._upload(body)
+            return
+        request = json.loads(body or b"{}")
+        if path.endswith("/batches"):
+            if request.get("input_file_id") not in state.files:
+                self._send(404, {"error": {"message": f"Unknown file {request.get('input_file_id')}"}})
+                return
+            self._send(200, state.create_batch(request["input_file_id"], request.get("endpoint", "/v1/chat/completions"),
+                                               request.get("completion_window", "24h")))
+            return
+        if not path.endswith("/chat/completions"):
+            self._send(404, {"error": {"message": f"Unknown path {self.path}"}})
+            return
+
+        rejection = state.admit()
+        if rejection is not None:
+            status, retry_after = rejection
+            headers = {"retry-after": f"{retry_after:.3f}"} if retry_after is not None else None
+            self._send(status, {"error": {"message": "Rate limit reached" if status == 429 else "Internal error"}},
+                       headers)
+            return
+
+        try:
+            time.sleep(state.latency)
+            self._send(200, _completion(request))
+        finally:
+            state.release()
+
+
+def start_mock_server(port: int = 0, **state_kwargs) -> ThreadingHTTPServer:
+    """
+    Start a mock OpenAI-compatible endpoint in a background thread.
+
+    Args:
+        port: Port to listen on (0 picks a free port)
+        **state_kwargs: Behaviour passed to MockLLMState (latency, rate_limit, ...)
+
+    Returns:
+        The running server; its base URL is f"http://127.0.0.1:{server.server_port}" and
+        its counters are on server.state. Call server.shutdown() to stop it.
+    """
+    server = ThreadingHTTPServer(("127.0.0.1", port), MockLLMHandler)
+    server.daemon_threads = True
+    server.state = MockLLMState(**state_kwargs)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Mock OpenAI-compatible chat completion endpoints for local testing")
+    parser.add_argument("--ports", type=int, nargs="+", default=[8001], help="Ports to serve (one endpoint each)")
+    parser.add_argument("--latency", type=float, default=0.02, help="Seconds per completion")
+    parser.add_argument("--rate-limit", type=int, help="Requests per window before HTTP 429")
+    parser.add_argument("--rate-window", type=float, default=60.0, help="Rate-limit window in seconds")
+    parser.add_argument("--capacity", type=int, help="Concurrent requests before HTTP 429")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of HTTP 500 responses")
+    parser.add_argument("--batch-delay", type=float, default=1.0, help="Seconds before a submitted batch completes")
+    args = parser.parse_args()
+
+    servers = [start_mock_server(port, latency=args.latency, rate_limit=args.rate_limit, rate_window=args.rate_window,
+                                 capacity=args.capacity, error_rate=args.error_rate, batch_delay=args.batch_delay)
+               for port in args.ports]
+    print(f"Mock endpoints: {', '.join(f'http://127.0.0.1:{s.server_port}' for s in servers)}")
+    try:
+        while True:
+            time.sleep(5)
+            for s in servers:
+                print(f"[Mock] :{s.server_port} served={s.state.served} 429={s.state.rate_limited} 500={s.state.errors}")
+    except KeyboardInterrupt:
+        pass
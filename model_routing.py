@@ -0,0 +1,173 @@
+import time
+import threading
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Optional, Union
+
+from email_preprocessing import preprocess_email, ProcessedEmail
+from intent_classification import (
+    classify_email, completion_usage, EmailClassification, DEFAULT_MODEL, SMALL_MODEL
+)
+
+# Approximate prices in USD per million tokens (input, output); adjust to your plan
+MODEL_PRICES = {
+    SMALL_MODEL: (0.05, 0.08),
+    DEFAULT_MODEL: (0.59, 0.79),
+}
+
+
+@dataclass
+class RouteStats:
+    """Latency, token and cost totals for one route (updated from concurrent workers)"""
+    calls: int = 0
+    total_latency: float = 0.0
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    cost: float = 0.0
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False, compare=False)
+
+    def record(self, latency: float, usage: Dict[str, int], prices: tuple):
+        with self._lock:
+            self.calls += 1
+            self.total_latency += latency
+            self.prompt_tokens += usage["prompt_tokens"]
+            self.completion_tokens += usage["completion_tokens"]
+            self.cost += (usage["prompt_tokens"] * prices[0] + usage["completion_tokens"] * prices[1]) / 1_000_000
+
+    def snapshot(self) -> Dict[str, float]:
+        """Consistent copy of the totals"""
+        with self._lock:
+            return {
+                "calls": self.calls,
+                "avg_latency": self.total_latency / self.calls if self.calls else 0.0,
+                "total_latency": self.total_latency,
+                "prompt_tokens": self.prompt_tokens,
+                "completion_tokens": self.completion_tokens,
+                "cost": self.cost,
+            }
+
+    @property
+    def avg_latency(self) -> float:
+        return self.total_latency / self.calls if self.calls else 0.0
+
+
+class ModelRouter:
+    """
+    Routes simple emails to a fast small model and complex ones to the large model.
+
+    Complexity is scored from ProcessedEmail metadata (numbered items, bullet lists,
+    paragraphs, lines, length), optionally blended with a local score. Answers from
+    the small model below the confidence threshold are escalated to the large model.
+    """
+
+    def __init__(self,
+                 small_model: str = SMALL_MODEL,
+                 large_model: str = DEFAULT_MODEL,
+                 complexity_threshold: float = 0.2,
+                 escalation_confidence: float = 0.75,
+                 local_scorer: Optional[Callable[[ProcessedEmail], float]] = None,
+                 prices: Optional[Dict[str, tuple]] = None,
+                 classify_fn: Callable[..., EmailClassification] = classify_email):
+        """
+        Args:
+            small_model: Model used for simple emails
+            large_model: Model used for complex emails and escalations
+            complexity_threshold: Emails scoring at or above this go to the large model
+            escalation_confidence: Small-model answers below this confidence are escalated
+            local_scorer: Optional function returning a complexity score in [0, 1]
+                (e.g. a local classifier); averaged with the metadata score
+            prices: Per-model (input, output) USD prices per million tokens
+            classify_fn: Function classifying on a route, called with model=... (default: classify_email)
+        """
+        self.small_model = small_model
+        self.large_model = large_model
+        self.complexity_threshold = complexity_threshold
+        self.escalation_confidence = escalation_confidence
+        self.local_scorer = local_scorer
+        self.prices = prices or MODEL_PRICES
+        self.classify_fn = classify_fn
+        self.stats: Dict[str, RouteStats] = {
+            "small": RouteStats(),
+            "large": RouteStats(),
+            "escalated": RouteStats(),   # Large-model calls made after a low-confidence small answer
+        }
+
+    def complexity_score(self, processed: ProcessedEmail) -> float:
+        """Complexity of an email in [0, 1], from preprocessing metadata"""
+        items = processed.numbered_items_count
+
+        score = (
+            0.35 * min(items / 3, 1.0)
+            + 0.10 * (1.0 if processed.has_numbered_list else 0.0)
+            + 0.10 * (1.0 if processed.has_bullet_list else 0.0)
+            + 0.20 * min(processed.paragraph_count / 6, 1.0)
+            + 0.10 * min(processed.line_count / 30, 1.0)
+            + 0.15 * min(len(processed.clean_text) / 1500, 1.0)
+        )
+
+        if self.local_scorer is not None:
+            score = (score + self.local_scorer(processed)) / 2
+
+        return score
+
+    def choose_model(self, processed: ProcessedEmail) -> str:
+        """Pick the model for an email based on its complexity score"""
+        if self.complexity_score(processed) >= self.complexity_threshold:
+            return self.large_model
+        return self.small_model
+
+    def _timed_classify(self, processed: ProcessedEmail, model: str, route: str, **classify_kwargs) -> EmailClassification:
+        start_time = time.perf_counter()
+        result = self.classify_fn(processed, model=model, **classify_kwargs)
+        latency = time.perf_counter() - start_time
+        self.stats[route].record(latency, completion_usage(result), self.prices.get(model, (0.0, 0.0)))
+        return result
+
+    def classify(self, email: Union[str, ProcessedEmail], **classify_kwargs) -> EmailClassification:
+        """
+        Classify an email on the route chosen for it, escalating low-confidence small-model answers.
+
+        Args:
+            email: Raw email text or an already preprocessed email
+            **classify_kwargs: Extra keyword arguments for classify_email (e.g. context); a model
+                argument (as passed by wrappers such as CoalescingClassifier) is ignored
+
+        Returns:
+            EmailClassification from the model that handled the email
+        """
+        classify_kwargs.pop("model", None)   # The route picks the model
+        processed = email if isinstance(email, ProcessedEmail) else preprocess_email(email)
+        model = self.choose_model(processed)
+
+        if model == self.large_model:
+            return self._timed_classify(processed, model, "large", **classify_kwargs)
+
+        result = self._timed_classify(processed, model, "small", **classify_kwargs)
+        if result.overall_confidence < self.escalation_confidence:
+            print(f"[Debug] Small model confidence {result.overall_confidence:.2f} below "
+                  f"{self.escalation_confidence:.2f}, escalating to {self.large_model}.")
+            result = self._timed_classify(processed, self.large_model, "escalated", **classify_kwargs)
+        return result
+
+    def report(self) -> Dict[str, Dict[str, float]]:
+        """Latency, token and cost split by route"""
+        return {route: stats.snapshot() for route, stats in self.stats.items()}
+
+    def print_report(self):
+        """Print the per-route latency and cost split"""
+        print("\n--- Model Routing Report ---")
+        for route, stats in self.report().items():
+            print(f"{route:>9}: {stats['calls']} calls, avg latency {stats['avg_latency']:.2f}s, "
+                  f"{stats['prompt_tokens']}+{stats['completion_tokens']} tokens, ${stats['cost']:.4f}")
+
+
+# Test function
+if __name__ == "__main__":
+    from classify_sample_email import sample_emails
+
+    router = ModelRouter()
+    for email in sample_emails:
+        processed = preprocess_email(email)
+        print(f"Score {router.complexity_score(processed):.2f} -> {router.choose_model(processed)}: {email[:60]}...")
+        result = router.classify(processed)
+        print(f"Primary Intent: {result.primary_intent}\n")
+    router.print_report()
@@ -0,0 +1,86 @@
+import time
+import hashlib
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Optional
+
+from email_preprocessing import preprocess_email, ProcessedEmail
+from intent_classification import classify_email, EmailClassification
+
+
+@dataclass
+class PipelineContext:
+    """
+    Carries one email through the pipeline so each artifact is computed once
+    and shared by classification, caching, routing and display.
+    """
+    raw_text: str
+    processed: Optional[ProcessedEmail] = None
+    fingerprint: Optional[str] = None   # Stable hash of the clean text, usable as a cache key
+    result: Optional[EmailClassification] = None
+    timings: Dict[str, float] = field(default_factory=dict)  # Seconds spent in each stage
+    email_id: Optional[str] = None      # Identifies the email in streamed runs
+    error: Optional[str] = None         # Set by streaming stages when the email failed
+
+
+@contextmanager
+def time_stage(ctx: PipelineContext, stage: str):
+    """Record the wall-clock time of a pipeline stage in ctx.timings"""
+    start_time = time.perf_counter()
+    try:
+        yield
+    finally:
+        ctx.timings[stage] = ctx.timings.get(stage, 0.0) + (time.perf_counter() - start_time)
+
+
+def email_fingerprint(processed: ProcessedEmail) -> str:
+    """Fingerprint of the text sent to the model; identical emails share a fingerprint"""
+    return hashlib.sha256(processed.clean_text.encode("utf-8")).hexdigest()
+
+
+def preprocess_stage(ctx: PipelineContext) -> PipelineContext:
+    """Preprocess the raw email text (skipped if already done)"""
+    if ctx.processed is None:
+        with time_stage(ctx, "preprocess"):
+            ctx.processed = preprocess_email(ctx.raw_text)
+    return ctx
+
+
+def fingerprint_stage(ctx: PipelineContext) -> PipelineContext:
+    """Compute the email fingerprint from the preprocessed text (skipped if already done)"""
+    preprocess_stage(ctx)
+    if ctx.fingerprint is None:
+        with time_stage(ctx, "fingerprint"):
+            ctx.fingerprint = email_fingerprint(ctx.processed)
+    return ctx
+
+
+def classify_stage(ctx: PipelineContext, classify_fn: Callable[..., EmailClassification] = classify_email,
+                   **classify_kwargs) -> PipelineContext:
+    """
+    Classify the preprocessed email with classify_fn (default: classify_email, or a drop-in
+    such as ShadowClassifier.classify); extra keyword arguments are passed to it
+    """
+    preprocess_stage(ctx)
+    with time_stage(ctx, "classify"):
+        ctx.result = classify_fn(ctx.processed, **classify_kwargs)
+    return ctx
+
+
+def run_pipeline(email_text: str, **classify_kwargs) -> PipelineContext:
+    """
+    Run preprocessing, fingerprinting and classification on one email,
+    preprocessing it exactly once.
+
+    Args:
+        email_text: Raw email text
+        **classify_kwargs: Extra keyword arguments for classify_email (e.g. context)
+
+    Returns:
+        PipelineContext with the processed email, fingerprint, result and per-stage timings
+    """
+    ctx = PipelineContext(raw_text=email_text)
+    preprocess_stage(ctx)
+    fingerprint_stage(ctx)
+    classify_stage(ctx, **classify_kwargs)
+    return ctx
@@ -0,0 +1,249 @@
+import os
+import sys
+import time
+import pstats
+import cProfile
+import threading
+import tracemalloc
+from collections import Counter, defaultdict
+from typing import Dict, List, Tuple
+
+# Buckets the profile is split into, checked in order. Each rule matches a substring of the
+# function's file path (or, for C functions, of their name as shown by pstats).
+BUCKET_RULES: List[Tuple[str, Tuple[str, ...]]] = [
+    ("network / waiting on LLM", ("httpx", "httpcore", "h11", "anyio", "ssl.py", "socket.py", "selectors.py",
+                                  "_ssl.", "_socket.", "select.", "time.sleep", "getaddrinfo")),
+    ("idle workers (locks / queues)", ("_thread.lock", "_thread.RLock", "queue.py", "threading.py")),
+    ("schema generation", ("json_schema", "instructor/processing/schema", "instructor/v2/core/schema",
+                           "instructor/function_calls", "instructor/processing/function_calls",
+                           "instructor/v2/core/function_calls", "openai_schema")),
+    ("JSON parsing / encoding", ("json/decoder", "json/encoder", "json/__init__", "_json.")),
+    ("pydantic validation", ("pydantic", "pydantic_core")),
+    ("instructor retry / patching", ("instructor", "tenacity")),
+    ("SDK request building", ("groq/", "openai/", "httpx/_models", "distro")),
+    ("preprocessing / regex", ("email_preprocessing", "html_to_text", "thread_processing", "token_accounting",
+                               "re/__init__", "re/_", "re.Pattern", "html/parser", "_markupbase")),
+    ("module imports", ("importlib", "marshal.", "_imp.", "<module>")),
+]
+OTHER_BUCKET = "other"
+NETWORK_BUCKET = BUCKET_RULES[0][0]
+CLIENT_OVERHEAD_BUCKETS = ("schema generation", "JSON parsing / encoding", "pydantic validation",
+                           "instructor retry / patching", "SDK request building")
+
+# Since Python 3.12 cProfile runs on sys.monitoring: a profiler sees every thread and only one
+# can be enabled per process, so threads only get profilers of their own on older versions
+PER_THREAD_PROFILERS = sys.version_info < (3, 12)
+
+
+def classify_function(filename: str, funcname: str) -> str:
+    """Bucket of a profiled function, from its file path (or its name for C functions)"""
+    location = (filename + " " + funcname).replace(os.sep, "/")
+    for bucket, patterns in BUCKET_RULES:
+        if any(pattern in location for pattern in patterns):
+            return bucket
+    return OTHER_BUCKET
+
+
+def bucket_times(stats: pstats.Stats) -> Dict[str, float]:
+    """
+    Own time (tottime) of every profiled function, summed per bucket. Generic C functions
+    (isinstance, getattr, dict methods, ...) are charged to the buckets of their callers.
+    """
+    totals: Dict[str, float] = defaultdict(float)
+    for (filename, _, funcname), (_, _, tottime, _, callers) in stats.stats.items():
+        bucket = classify_function(filename, funcname)
+        if bucket == OTHER_BUCKET and filename == "~" and callers:
+            for (caller_file, _, caller_func), caller_stats in callers.items():
+                totals[classify_function(caller_file, caller_func)] += caller_stats[2]
+        else:
+            totals[bucket] += tottime
+    return dict(totals)
+
+
+class StackSampler:
+    """
+    Samples the Python stacks of all threads at a fixed interval and counts them as
+    collapsed stacks ('thread;outer;...;inner count'), the input format of flamegraph.pl
+    and speedscope. Samples are wall-clock, so time blocked on the network shows up too.
+    """
+
+    def __init__(self, interval: float = 0.005):
+        self.interval = interval
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        own_id = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                # Count raw code objects; they are only formatted when the file is written
+                codes = []
+                while frame is not None:
+                    codes.append(frame.f_code)
+                    frame = frame.f_back
+                self.stacks[(names.get(thread_id, str(thread_id)),) + tuple(reversed(codes))] += 1
+            self.samples += 1
+
+    def write_collapsed(self, path: str):
+        labels = {}
+        with open(path, "w", encoding="utf-8") as f:
+            for (thread_name, *codes), count in self.stacks.most_common():
+                frames = [thread_name]
+                for code in codes:
+                    if code not in labels:
+                        labels[code] = f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+                    frames.append(labels[code])
+                f.write(f"{';'.join(frames)} {count}\n")
+
+
+class ProfileSession:
+    """
+    Runs a block of code under cProfile, tracemalloc and a stack sampler, then writes:
+
+        <prefix>.pstats     cProfile data (pstats / snakeviz)
+        <prefix>.collapsed  sampled collapsed stacks of all threads (flamegraph.pl, speedscope)
+        <prefix>.alloc.txt  top-N allocation sites still alive at the end
+
+    and prints where the time went: waiting on the LLM vs client-side overhead (schema
+    generation, JSON, validation, instructor) vs preprocessing. cProfile and the time
+    split cover the thread that opened the session and every thread started while it is
+    open (worker pools of stream, daemon and queue modes), summed in thread-seconds;
+    threads started before the session are only in the sampled stacks. On Python 3.12+
+    a single process-wide profiler covers every thread, including those started before.
+
+    Usage:
+        with ProfileSession("profile"):
+            run_something()
+    """
+
+    def __init__(self, prefix: str = "profile", top_n: int = 20, sample_interval: float = 0.005,
+                 trace_frames: int = 1):
+        """
+        Args:
+            prefix: Path prefix of the output files
+            top_n: Number of functions / allocation sites in the reports
+            sample_interval: Seconds between stack samples
+            trace_frames: Frames stored per allocation by tracemalloc (1 is enough for per-line sites)
+        """
+        self.prefix = prefix
+        self.top_n = top_n
+        self.trace_frames = trace_frames
+        self.profiler = cProfile.Profile()
+        self.thread_profilers: List[cProfile.Profile] = []
+        self._profilers_lock = threading.Lock()
+        self.sampler = StackSampler(sample_interval)
+        self.elapsed = 0.0
+        self.allocation_sites = []
+        self.peak_memory = 0
+        self._start_time = 0.0
+        self._was_tracing = False
+
+    def __enter__(self):
+        self._was_tracing = tracemalloc.is_tracing()
+        if not self._was_tracing:
+            tracemalloc.start(self.trace_frames)
+        self.sampler.start()
+        self._start_time = time.perf_counter()
+        if PER_THREAD_PROFILERS:
+            threading.setprofile(self._profile_new_thread)
+        self.profiler.enable()
+        return self
+
+    def _profile_new_thread(self, frame, event, arg):
+        """First profile event of a thread started during the session: give it its own profiler"""
+        profiler = cProfile.Profile()
+        with self._profilers_lock:
+            self.thread_profilers.append(profiler)
+        profiler.enable()   # Replaces this hook for the rest of the thread
+
+    def __exit__(self, *exc):
+        self.profiler.disable()
+        if PER_THREAD_PROFILERS:
+            threading.setprofile(None)
+        self.elapsed = time.perf_counter() - self._start_time
+        self.sampler.stop()
+        snapshot = tracemalloc.take_snapshot()
+        self.peak_memory = tracemalloc.get_traced_memory()[1]
+        if not self._was_tracing:
+            tracemalloc.stop()
+
+        self.stats().dump_stats(self.prefix + ".pstats")
+        self.sampler.write_collapsed(self.prefix + ".collapsed")
+        self._write_allocations(snapshot, self.prefix + ".alloc.txt")
+        self.print_report()
+        return False
+
+    def _write_allocations(self, snapshot: tracemalloc.Snapshot, path: str):
+        snapshot = snapshot.filter_traces([
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+        ])
+        statistics = snapshot.statistics("lineno")
+        total = sum(stat.size for stat in statistics)
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(f"Peak traced memory: {self.peak_memory / 1024:.1f} KiB\n")
+            f.write(f"Allocated and still alive: {total / 1024:.1f} KiB in {len(statistics)} sites\n\n")
+            for stat in statistics[:self.top_n]:
+                frame = stat.traceback[0]
+                f.write(f"{stat.size / 1024:10.1f} KiB {stat.count:8d} blocks  {frame.filename}:{frame.lineno}\n")
+        self.allocation_sites = statistics[:self.top_n]
+
+    def stats(self) -> pstats.Stats:
+        """cProfile data of the session's thread and the threads it started, merged"""
+        stats = pstats.Stats(self.profiler)
+        with self._profilers_lock:
+            profilers = list(self.thread_profilers)
+        # Threads still running (e.g. daemon threads) are included up to this point
+        for profiler in profilers:
+            stats.add(profiler)
+        return stats
+
+    def print_report(self):
+        stats = self.stats()
+        buckets = bucket_times(stats)
+        profiled = sum(buckets.values()) or 1e-9
+
+        print("\n--- Profile ---")
+        threads = f"{1 + len(self.thread_profilers)} threads" if PER_THREAD_PROFILERS else "all threads"
+        print(f"Wall time: {self.elapsed:.3f}s, profiled: {profiled:.3f} thread-seconds over "
+              f"{threads}, {self.sampler.samples} stack samples")
+        for bucket, seconds in sorted(buckets.items(), key=lambda item: -item[1]):
+            print(f"  {bucket:<28} {seconds:8.3f}s  {seconds / profiled:6.1%}")
+
+        overhead = sum(buckets.get(bucket, 0.0) for bucket in CLIENT_OVERHEAD_BUCKETS)
+        print(f"Waiting on LLM: {buckets.get(NETWORK_BUCKET, 0.0):.3f}s; "
+              f"client-side overhead (schema, JSON, validation, instructor, SDK): {overhead:.3f}s")
+
+        print(f"\nTop {self.top_n} functions by own time:")
+        stats.sort_stats("tottime").print_stats(self.top_n)
+
+        print(f"Peak traced memory: {self.peak_memory / 1024:.1f} KiB; top allocation sites still alive:")
+        for stat in self.allocation_sites[:5]:
+            frame = stat.traceback[0]
+            print(f"  {stat.size / 1024:8.1f} KiB  {frame.filename}:{frame.lineno}")
+        print(f"Wrote {self.prefix}.pstats, {self.prefix}.collapsed (flamegraph) and {self.prefix}.alloc.txt")
+
+
+# Test function
+if __name__ == "__main__":
+    import tempfile
+    from email_preprocessing import preprocess_email
+    from test import test_emails
+
+    with ProfileSession(os.path.join(tempfile.mkdtemp(), "profile"), top_n=5):
+        for _ in range(200):
+            for email in test_emails:
+                preprocess_email(email["content"])
@@ -0,0 +1,244 @@
+import asyncio
+import hashlib
+import threading
+from concurrent.futures import Future
+from typing import Any, Awaitable, Callable, Dict, Optional, Union
+
+from email_preprocessing import preprocess_email, ProcessedEmail
+from intent_classification import classify_email, EmailClassification, DEFAULT_MODEL
+from system_prompt import ENHANCED_SYSTEM_PROMPT
+
+
+def coalescing_key(clean_text: str, prompt: str, model: str, context: Optional[str] = None) -> str:
+    """Key of a classification request: whitespace-normalized text, prompt, model and context"""
+    digest = hashlib.sha256()
+    for part in (" ".join(clean_text.split()), prompt, model, context or ""):
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+def _copy(result):
+    """Each waiter gets its own copy, so one caller modifying its result can't affect the others"""
+    return result.model_copy(deep=True) if hasattr(result, "model_copy") else result
+
+
+class _LeaderCancelled(Exception):
+    """Set on a shared call whose leader was cancelled or interrupted; its waiters retry the call"""
+
+
+class SingleFlight:
+    """
+    Runs at most one call per key at a time; concurrent callers with the same key wait
+    for that call and all receive its result or its exception.
+
+    Works across threads (do) and asyncio tasks on any event loop (do_async); both share
+    the same in-flight calls. Nothing is kept once a call finishes, so a later call with
+    the same key runs again (this is not a result cache).
+
+    Only results and ordinary exceptions are shared. A leader that is cancelled or
+    interrupted (CancelledError, KeyboardInterrupt, ...) hands the call off: an async
+    call keeps running and still resolves the waiters, and a call that did not finish
+    is retried by one of the waiters instead of failing them all.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._in_flight: Dict[str, Future] = {}
+        self._waiters: Dict[str, int] = {}
+        self.calls = 0
+        self.executed = 0
+        self.coalesced = 0
+        self.errors = 0
+        self.coalesced_errors = 0
+        self.handoffs = 0
+        self.max_waiters = 0
+
+    def _join(self, key: str, rejoin: bool = False):
+        """(future, is_leader) for a key, registering a new in-flight call if there is none"""
+        with self._lock:
+            if not rejoin:
+                self.calls += 1
+            future = self._in_flight.get(key)
+            if future is not None:
+                if not rejoin:
+                    self.coalesced += 1
+                self._waiters[key] += 1
+                self.max_waiters = max(self.max_waiters, self._waiters[key])
+                return future, False
+            if rejoin:
+                # A waiter taking over a handed-off call runs it after all
+                self.coalesced -= 1
+            future = Future()
+            self._in_flight[key] = future
+            self._waiters[key] = 1
+            self.executed += 1
+            return future, True
+
+    def _finish(self, key: str, future: Future, result: Any = None, error: Optional[BaseException] = None):
+        # Unregister before resolving, so callers arriving afterwards start a new call
+        with self._lock:
+            del self._in_flight[key]
+            waiters = self._waiters.pop(key)
+            if isinstance(error, _LeaderCancelled):
+                self.handoffs += 1
+            elif error is not None:
+                self.errors += 1
+                self.coalesced_errors += waiters - 1
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+
+    def _settle(self, key: str, future: Future, task: "asyncio.Future"):
+        """Resolve the shared future from the leader's task, whether or not the leader still awaits it"""
+        if task.cancelled():
+            self._finish(key, future, error=_LeaderCancelled())
+        elif task.exception() is None:
+            self._finish(key, future, task.result())
+        elif isinstance(task.exception(), Exception):
+            self._finish(key, future, error=task.exception())
+        else:
+            self._finish(key, future, error=_LeaderCancelled())
+
+    def do(self, key: str, fn: Callable[[], Any]) -> Any:
+        """Call fn, or wait for the in-flight call with the same key"""
+        future, leader = self._join(key)
+        while not leader:
+            try:
+                return _copy(future.result())
+            except _LeaderCancelled:
+                future, leader = self._join(key, rejoin=True)
+        try:
+            result = fn()
+        except Exception as e:
+            self._finish(key, future, error=e)
+            raise
+        except BaseException:
+            # Interrupted, not failed: let a waiter run the call instead
+            self._finish(key, future, error=_LeaderCancelled())
+            raise
+        self._finish(key, future, result)
+        return result
+
+    async def do_async(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """Await fn(), or the in-flight call with the same key (which may run in another thread or loop)"""
+        future, leader = self._join(key)
+        while not leader:
+            try:
+                # Shielded: a cancelled waiter would otherwise cancel the shared future for everyone
+                return _copy(await asyncio.shield(asyncio.wrap_future(future)))
+            except _LeaderCancelled:
+                future, leader = self._join(key, rejoin=True)
+        # The call runs in its own task, so cancelling the leader doesn't cancel the request
+        # (an asyncio.to_thread request keeps running anyway); the waiters still get its result
+        task = asyncio.ensure_future(fn())
+        task.add_done_callback(lambda done: self._settle(key, future, done))
+        return await asyncio.shield(task)
+
+    def report(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "calls": self.calls,
+                "executed": self.executed,
+                "coalesced": self.coalesced,
+                "coalesced_rate": self.coalesced / self.calls if self.calls else 0.0,
+                "errors": self.errors,
+                "coalesced_errors": self.coalesced_errors,
+                "handoffs": self.handoffs,
+                "max_waiters": self.max_waiters,
+                "in_flight": len(self._in_flight)
+            }
+
+
+class CoalescingClassifier:
+    """
+    Single-flight coalescing in front of classify_email.
+
+    Concurrent calls for the same normalized clean text, prompt and model share one
+    in-flight LLM request, e.g. when an email CC'd to several mailboxes reaches
+    several workers at once.
+
+    Usage:
+        coalescer = CoalescingClassifier()
+        result = coalescer.classify(email_text)              # threads
+        result = await coalescer.classify_async(email_text)  # asyncio tasks
+    """
+
+    def __init__(self,
+                 classify_fn: Callable[..., EmailClassification] = classify_email,
+                 prompt: str = ENHANCED_SYSTEM_PROMPT):
+        """
+        Args:
+            classify_fn: Function performing a classification (default: classify_email)
+            prompt: System prompt classify_fn sends; part of the coalescing key
+        """
+        self.classify_fn = classify_fn
+        self.prompt = prompt
+        self.flight = SingleFlight()
+
+    def _prepare(self, email: Union[str, ProcessedEmail], model: str, context: Optional[str]):
+        processed = email if isinstance(email, ProcessedEmail) else preprocess_email(email)
+        return processed, coalescing_key(processed.clean_text, self.prompt, model, context)
+
+    def classify(self, email: Union[str, ProcessedEmail], model: str = DEFAULT_MODEL,
+                 context: Optional[str] = None, **classify_kwargs) -> EmailClassification:
+        """
+        Classify an email, sharing the request of an identical in-flight classification.
+
+        Args:
+            email: Raw email text or an already preprocessed email
+            model: Model used for classification
+            context: Optional context passed to classify_email
+            **classify_kwargs: Extra keyword arguments for the classify function
+
+        Returns:
+            EmailClassification (or the exception of the shared request is raised)
+        """
+        processed, key = self._prepare(email, model, context)
+        return self.flight.do(key, lambda: self.classify_fn(processed, model=model, context=context,
+                                                            **classify_kwargs))
+
+    async def classify_async(self, email: Union[str, ProcessedEmail], model: str = DEFAULT_MODEL,
+                             context: Optional[str] = None, **classify_kwargs) -> EmailClassification:
+        """classify() for asyncio tasks; the request runs in a worker thread"""
+        processed, key = self._prepare(email, model, context)
+        return await self.flight.do_async(key, lambda: asyncio.to_thread(
+            self.classify_fn, processed, model=model, context=context, **classify_kwargs))
+
+    def report(self) -> Dict[str, Any]:
+        """Calls, LLM requests executed, coalesced calls and shared errors"""
+        return self.flight.report()
+
+    def print_report(self):
+        report = self.report()
+        print("\n--- Request Coalescing ---")
+        print(f"Calls: {report['calls']}, LLM requests: {report['executed']}, "
+              f"Coalesced: {report['coalesced']} ({report['coalesced_rate']:.1%}), "
+              f"Max waiters on one request: {report['max_waiters']}")
+        print(f"Failed requests: {report['errors']} (errors shared with {report['coalesced_errors']} coalesced calls), "
+              f"handed off after a cancelled caller: {report['handoffs']}")
+
+
+# Test function
+if __name__ == "__main__":
+    import time
+    from concurrent.futures import ThreadPoolExecutor
+    from benchmark import sample_classification
+
+    def slow_classify(processed, **kwargs):
+        time.sleep(0.1)
+        return sample_classification()
+
+    coalescer = CoalescingClassifier(classify_fn=slow_classify)
+    email = "Subject: Closing dates\nPlease send the escrow schedule for 125 King St."
+
+    # The same email arriving in ten mailboxes at once, from threads and from asyncio tasks
+    with ThreadPoolExecutor(max_workers=10) as executor:
+        list(executor.map(lambda _: coalescer.classify(email), range(10)))
+
+    async def main():
+        await asyncio.gather(*(coalescer.classify_async(email) for _ in range(10)))
+    asyncio.run(main())
+
+    coalescer.print_report()
@@ -0,0 +1,206 @@
+import io
+import gzip
+from typing import BinaryIO, Iterable, Iterator, Optional, Tuple, Union
+
+from pydantic import BaseModel, TypeAdapter
+
+from intent_classification import EmailClassification
+
+# zstd compresses faster and smaller than gzip; it is optional
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+DEFAULT_BUFFER_SIZE = 1 << 20   # Bytes collected before each write to the sink
+
+
+class ExportRecord(BaseModel):
+    """One exported line: the email id and its classification"""
+    id: str
+    classification: EmailClassification
+
+
+# Adapters are built once; building one per object would redo the schema work every time.
+# Writing goes straight to the pydantic-core serializers to skip the per-call wrapper.
+RECORD_ADAPTER = TypeAdapter(ExportRecord)
+_CLASSIFICATION_SERIALIZER = TypeAdapter(EmailClassification).serializer
+_ID_SERIALIZER = TypeAdapter(str).serializer
+
+
+def _compression_for(path: str) -> Optional[str]:
+    """Infer the compression from the file extension"""
+    if path.endswith(".gz"):
+        return "gzip"
+    if path.endswith(".zst"):
+        return "zstd"
+    return None
+
+
+def _require_zstd():
+    if zstandard is None:
+        raise RuntimeError("zstd compression requires the 'zstandard' package (pip install zstandard).")
+
+
+class ResultWriter:
+    """
+    Buffered bulk writer of classification results as JSON lines (JSONL / NDJSON).
+
+    Each result is serialized compactly by the cached pydantic-core serializer straight
+    to bytes (no intermediate dict, no indentation); lines are collected and written in
+    large blocks. '.gz' and '.zst' paths are compressed on the fly.
+
+    Usage:
+        with ResultWriter("results.jsonl.gz") as writer:
+            writer.write("msg-1", result)
+    """
+
+    def __init__(self,
+                 sink: Union[str, BinaryIO],
+                 compression: Optional[str] = None,
+                 buffer_size: int = DEFAULT_BUFFER_SIZE,
+                 compression_level: Optional[int] = None):
+        """
+        Args:
+            sink: Output path, or a binary file object (e.g. sys.stdout.buffer)
+            compression: None, 'gzip' or 'zstd' (default: inferred from the path extension)
+            buffer_size: Bytes buffered before writing to the sink
+            compression_level: Compression level (default: 1 for gzip, 3 for zstd; favours speed)
+        """
+        if isinstance(sink, str):
+            compression = compression or _compression_for(sink)
+            self._raw = open(sink, "wb")
+            self._owns_raw = True
+        else:
+            self._raw = sink
+            self._owns_raw = False
+
+        if compression == "gzip":
+            self._file = gzip.GzipFile(fileobj=self._raw, mode="wb",
+                                       compresslevel=compression_level if compression_level is not None else 1)
+        elif compression == "zstd":
+            _require_zstd()
+            compressor = zstandard.ZstdCompressor(level=compression_level if compression_level is not None else 3)
+            self._file = compressor.stream_writer(self._raw, closefd=False)
+        elif compression is None:
+            self._file = self._raw
+        else:
+            raise ValueError(f"Unknown compression: {compression}")
+
+        self.compression = compression
+        self.buffer_size = buffer_size
+        self._buffer = []
+        self._buffered_bytes = 0
+        self.count = 0
+
+    def write(self, email_id: str, result: EmailClassification):
+        """Queue one result for writing"""
+        line = b'{"id":%s,"classification":%s}\n' % (
+            _ID_SERIALIZER.to_json(email_id),
+            _CLASSIFICATION_SERIALIZER.to_json(result)
+        )
+        self._buffer.append(line)
+        self._buffered_bytes += len(line)
+        self.count += 1
+        if self._buffered_bytes >= self.buffer_size:
+            self.flush()
+
+    def write_json(self, email_id: str, classification_json: bytes):
+        """Queue one result that is already serialized (compact JSON of an EmailClassification)"""
+        line = b'{"id":%s,"classification":%s}\n' % (_ID_SERIALIZER.to_json(email_id), classification_json)
+        self._buffer.append(line)
+        self._buffered_bytes += len(line)
+        self.count += 1
+        if self._buffered_bytes >= self.buffer_size:
+            self.flush()
+
+    def write_many(self, results: Iterable[Tuple[str, EmailClassification]]) -> int:
+        """Write (id, result) pairs; returns the number written"""
+        written = 0
+        for email_id, result in results:
+            self.write(email_id, result)
+            written += 1
+        return written
+
+    def flush(self):
+        """Write buffered lines to the sink"""
+        if self._buffer:
+            self._file.write(b"".join(self._buffer))
+            self._buffer.clear()
+            self._buffered_bytes = 0
+
+    def close(self):
+        self.flush()
+        if self._file is not self._raw:
+            self._file.close()   # Writes the gzip trailer / final zstd frame
+        if self._owns_raw:
+            self._raw.close()
+        else:
+            self._raw.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def _open_for_reading(raw: BinaryIO, compression: Optional[str]) -> BinaryIO:
+    """Wrap a binary file for line-by-line reading of (possibly compressed) results"""
+    if compression == "gzip":
+        return gzip.GzipFile(fileobj=raw, mode="rb")
+    if compression == "zstd":
+        _require_zstd()
+        reader = zstandard.ZstdDecompressor().stream_reader(raw, closefd=False)
+        return io.BufferedReader(reader, DEFAULT_BUFFER_SIZE)
+    if compression is None:
+        return raw
+    raise ValueError(f"Unknown compression: {compression}")
+
+
+def read_results(source: Union[str, BinaryIO], compression: Optional[str] = None) -> Iterator[ExportRecord]:
+    """
+    Stream results back from a JSONL / NDJSON export.
+
+    Each line is validated directly from its bytes by the cached adapter, so no
+    intermediate dicts are built.
+
+    Args:
+        source: Input path, or a binary file object
+        compression: None, 'gzip' or 'zstd' (default: inferred from the path extension)
+
+    Yields:
+        ExportRecord for every line
+    """
+    if isinstance(source, str):
+        compression = compression or _compression_for(source)
+        raw = open(source, "rb")
+    else:
+        raw = source
+
+    f = _open_for_reading(raw, compression)
+    try:
+        for line in f:
+            if line.strip():
+                yield RECORD_ADAPTER.validate_json(line)
+    finally:
+        if f is not raw:
+            f.close()
+        if raw is not source:
+            raw.close()
+
+
+# Test function
+if __name__ == "__main__":
+    import os
+    import tempfile
+    from benchmark import sample_classification
+
+    result = sample_classification()
+    path = os.path.join(tempfile.mkdtemp(), "results.jsonl.gz")
+    with ResultWriter(path) as writer:
+        for i in range(3):
+            writer.write(f"msg-{i}", result)
+
+    for record in read_results(path):
+        print(record.id, record.classification.primary_intent)
@@ -0,0 +1,166 @@
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import List, Union
+
+from pydantic import BaseModel, Field
+
+from system_prompt import SEGMENT_SYSTEM_PROMPT
+from email_preprocessing import preprocess_email, ProcessedEmail
+from intent_classification import (
+    classify_email, _request_structured, apply_preprocessing_hints,
+    EmailClassification, EmailIntent, EmailPriority, IntentDetails, DEFAULT_MODEL
+)
+
+SEGMENT_MAX_COMPLETION_TOKENS = 256
+MIN_SEGMENTS = 2
+MIN_ITEM_WORDS = 6   # Shorter list items are sub-points of one request, not requests of their own
+
+PRIORITY_RANK = {EmailPriority.LOW: 0, EmailPriority.MEDIUM: 1, EmailPriority.HIGH: 2, EmailPriority.URGENT: 3}
+
+
+class SegmentClassification(BaseModel):
+    """Short classification of one request of a multi-item email"""
+    intent: EmailIntent
+    confidence: float = Field(ge=0, le=1, description="Confidence score for the intent")
+    priority: EmailPriority
+    actionable: bool = Field(description="Whether the segment asks for any work")
+    summary: str = Field(description="One-sentence summary of the request")
+    key_actions: List[str] = Field(description="At most 3 specific actions")
+    entities: List[str] = Field(description="Properties, companies, or people mentioned")
+    specialist: str = Field(description="Type of specialist best suited to the request")
+    estimated_hours: float = Field(ge=0, description="Estimated hours to complete the request")
+
+
+@dataclass
+class EmailSegments:
+    """A multi-item email split into shared context and one text per request"""
+    context: str            # Subject and introduction, sent with every segment
+    segments: List[str]     # List items, plus any trailing request text after the list
+
+
+def split_segments(processed: ProcessedEmail, min_item_words: int = MIN_ITEM_WORDS) -> EmailSegments:
+    """
+    Split an email into per-item segments using the numbered (or bullet) list found by
+    preprocessing. Each item runs to the start of the next one; text after the last item
+    (e.g. "Also, loop in research on ...") becomes one more segment. Lists with an item
+    shorter than min_item_words are not split (no segments are returned).
+    """
+    body = processed.body
+    spans = processed.list_item_spans()
+    if not spans:
+        return EmailSegments(context=processed.clean_text, segments=[])
+
+    intro = body[:spans[0][0]].strip()
+    context = "\n\n".join(part for part in (f"Subject: {processed.subject}" if processed.subject else "", intro) if part)
+
+    segments = []
+    for (start, end), next_span in zip(spans, spans[1:] + [None]):
+        segments.append(" ".join(body[start:next_span[0] if next_span else end].split()))
+    if min(len(segment.split()) for segment in segments) < min_item_words:
+        return EmailSegments(context=processed.clean_text, segments=[])
+    trailing = " ".join(body[spans[-1][1]:].split())
+    if trailing:
+        segments.append(trailing)
+    return EmailSegments(context=context, segments=segments)
+
+
+def merge_segments(results: List[SegmentClassification]) -> EmailClassification:
+    """
+    Merge per-segment results into one EmailClassification.
+
+    The primary intent is the one with the highest priority (then confidence, then the
+    earliest segment); the others are secondary intents in email order. Each intent gets
+    the key actions of all its segments.
+    """
+    actionable = [result for result in results if result.actionable] or results
+    by_intent = {}
+    for position, result in enumerate(actionable):
+        entry = by_intent.setdefault(result.intent, {"position": position, "priority": result.priority,
+                                                     "confidence": result.confidence, "actions": []})
+        if PRIORITY_RANK[result.priority] > PRIORITY_RANK[entry["priority"]]:
+            entry["priority"] = result.priority
+        entry["confidence"] = max(entry["confidence"], result.confidence)
+        entry["actions"].extend(action for action in result.key_actions if action not in entry["actions"])
+
+    ranked = sorted(by_intent.items(),
+                    key=lambda item: (-PRIORITY_RANK[item[1]["priority"]], -item[1]["confidence"], item[1]["position"]))
+    primary_intent = ranked[0][0]
+    secondary_intents = [intent for intent, _ in sorted(by_intent.items(), key=lambda item: item[1]["position"])
+                         if intent != primary_intent]
+
+    def unique(values):
+        return list(dict.fromkeys(value for value in values if value))
+
+    specialists = unique(result.specialist for result in actionable)
+    hours = max(result.estimated_hours for result in actionable)
+    return EmailClassification(
+        primary_intent=primary_intent,
+        secondary_intents=secondary_intents,
+        intent_details=[IntentDetails(intent=intent, confidence=entry["confidence"], key_actions=entry["actions"])
+                        for intent, entry in by_intent.items()],
+        priority=max((result.priority for result in actionable), key=PRIORITY_RANK.get),
+        overall_confidence=sum(result.confidence for result in actionable) / len(actionable),
+        key_information=[result.summary for result in actionable],
+        entities_mentioned=unique(entity for result in actionable for entity in result.entities),
+        suggested_action=f"Handle the {len(actionable)} requests in parallel: " + "; ".join(
+            f"{result.summary} ({result.specialist})" for result in actionable),
+        specialists_required=specialists,
+        estimated_completion_time=f"{hours:g} hours (requests handled in parallel)",
+        attachments_mentioned=False,
+        follow_up_required=len(actionable) > 1
+    )
+
+
+def classify_segmented(email_text: Union[str, ProcessedEmail],
+                       model: str = DEFAULT_MODEL,
+                       llm_client=None,
+                       max_workers: int = 8,
+                       min_segments: int = MIN_SEGMENTS) -> EmailClassification:
+    """
+    Classify a multi-item email by classifying its items concurrently and merging them.
+
+    Each segment is sent with the shared context and a short response schema, so the
+    requests run in parallel and each produces a small output; the wall-clock time is
+    that of the slowest segment instead of one long completion for the whole email.
+    Emails with fewer than min_segments items are classified normally.
+
+    Args:
+        email_text: Raw email text or an already preprocessed ProcessedEmail
+        model: Model used for each segment (default: DEFAULT_MODEL)
+        llm_client: Client (or ClientPool) to send the requests with (default: the shared client)
+        max_workers: Segments classified concurrently
+        min_segments: Fewest segments for which the email is split
+
+    Returns:
+        EmailClassification merged from the segment results
+    """
+    processed = email_text if isinstance(email_text, ProcessedEmail) else preprocess_email(email_text)
+    split = split_segments(processed)
+    if len(split.segments) < min_segments:
+        print(f"[Debug] {len(split.segments)} list items; classifying the whole email.")
+        return classify_email(processed, model=model, llm_client=llm_client)
+
+    print(f"[Debug] Classifying {len(split.segments)} segments concurrently.")
+    context = f"Shared context of the email:\n{split.context}" if split.context else None
+
+    def classify_segment(segment: str) -> SegmentClassification:
+        return _request_structured(SegmentClassification, SEGMENT_SYSTEM_PROMPT, segment, context, model,
+                                   SEGMENT_MAX_COMPLETION_TOKENS, llm_client=llm_client)
+
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(split.segments))) as executor:
+        results = list(executor.map(classify_segment, split.segments))
+
+    response = merge_segments(results)
+    apply_preprocessing_hints(response, processed.has_attachments, processed.urgent_indicators)
+    return response
+
+
+# Test function
+if __name__ == "__main__":
+    from test import test_emails
+
+    email = next(e for e in test_emails if e["name"] == "Complex multi-intent email with numbered items")
+    split = split_segments(preprocess_email(email["content"]))
+    print(f"Context:\n{split.context}\n")
+    for i, segment in enumerate(split.segments, 1):
+        print(f"Segment {i}: {segment}")
@@ -0,0 +1,263 @@
+import json
+import time
+import random
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, asdict
+from typing import Any, Callable, Dict, List, Optional, Union
+
+from client_pool import ClientPool, Endpoint, endpoints_from_env
+from email_preprocessing import preprocess_email, ProcessedEmail
+from intent_classification import (
+    classify_email, completion_usage, _request_structured, apply_preprocessing_hints,
+    EmailClassification, DEFAULT_MODEL, MAX_COMPLETION_TOKENS
+)
+from helper import percentile
+from token_accounting import TokenLedger, token_ledger
+
+
+@dataclass
+class ShadowRecord:
+    """Primary and candidate result of one mirrored call"""
+    primary_intent: str
+    primary_intents: list           # Primary followed by secondary intents
+    primary_priority: str
+    primary_latency: float
+    primary_tokens: Dict[str, int]
+    candidate_intent: Optional[str] = None
+    candidate_intents: Optional[list] = None
+    candidate_priority: Optional[str] = None
+    candidate_latency: Optional[float] = None
+    candidate_tokens: Optional[Dict[str, int]] = None
+    candidate_error: Optional[str] = None
+
+
+def _intents(result: EmailClassification) -> list:
+    return [result.primary_intent.value] + [intent.value for intent in result.secondary_intents]
+
+
+def candidate_client(endpoints: Optional[List[Endpoint]] = None) -> ClientPool:
+    """
+    Client of the candidate's own, so shadow calls never use the production client's
+    connections, quota tracking or endpoint ejections.
+
+    Args:
+        endpoints: Candidate endpoints (default: the production endpoints in a separate
+            pool, which still shares the provider's rate limits of those keys)
+
+    Returns:
+        ClientPool making one attempt per call; a failed shadow call is recorded, not retried
+    """
+    if not endpoints:
+        endpoints = [Endpoint(name=f"shadow-{endpoint.name}", api_key=endpoint.api_key, base_url=endpoint.base_url,
+                              kind=endpoint.kind, request_limit=endpoint.request_limit,
+                              token_limit=endpoint.token_limit) for endpoint in endpoints_from_env()]
+        if not endpoints:
+            raise RuntimeError("No candidate endpoints given and GROQ_API_KEY not found in environment")
+        print("[Shadow] No candidate endpoints given; using a separate pool over the production keys "
+              "(their provider rate limits are shared)")
+    return ClientPool(endpoints, max_attempts=1)
+
+
+def prompt_candidate(system_prompt: str, model: str = DEFAULT_MODEL, llm_client=None) -> Callable:
+    """
+    Candidate classify function using another system prompt (and optionally model or
+    client), with the same preprocessing adjustments as classify_email.
+    """
+    def classify(processed: ProcessedEmail, **kwargs) -> EmailClassification:
+        response = _request_structured(EmailClassification, system_prompt, processed.clean_text, kwargs.get("context"),
+                                       model, MAX_COMPLETION_TOKENS, llm_client=llm_client,
+                                       ledger=kwargs.get("ledger", token_ledger))
+        apply_preprocessing_hints(response, processed.has_attachments, processed.urgent_indicators)
+        return response
+    return classify
+
+
+class ShadowClassifier:
+    """
+    Mirrors a sample of classifications to a candidate model, prompt or backend.
+
+    classify() returns the primary result exactly as classify_email would; for sampled
+    calls the candidate is then run on a small background pool with the same preprocessed
+    email. Mirroring never waits: when max_pending shadow calls are already queued or
+    running, the sample is dropped. Both results are recorded with their latencies and
+    token counts, for a report of intent and priority agreement and latency deltas.
+
+    Candidate calls get ledger=self.ledger, so their token use stays out of the shared
+    token_ledger used for production forecasts; give the candidate its own client too
+    (see candidate_client), so it never competes with production requests.
+    """
+
+    def __init__(self,
+                 candidate_fn: Callable[..., EmailClassification],
+                 primary_fn: Callable[..., EmailClassification] = classify_email,
+                 sample_rate: float = 0.1,
+                 max_workers: int = 4,
+                 max_pending: int = 32,
+                 window: int = 10000,
+                 log_path: Optional[str] = None,
+                 seed: Optional[int] = None):
+        """
+        Args:
+            candidate_fn: Candidate classify function, called as candidate_fn(processed, ledger=..., **kwargs)
+                (e.g. functools.partial(classify_email, model=..., llm_client=candidate_client())
+                or prompt_candidate(...))
+            primary_fn: Classify function whose result is returned (default: classify_email)
+            sample_rate: Fraction of calls mirrored to the candidate
+            max_workers: Threads running candidate calls
+            max_pending: Most shadow calls queued or running; further samples are dropped
+            window: Number of recent records kept for the report
+            log_path: Optional JSON lines file every record is appended to
+            seed: Seed of the sampling (None: random)
+        """
+        self.candidate_fn = candidate_fn
+        self.primary_fn = primary_fn
+        self.sample_rate = sample_rate
+        self.log_path = log_path
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="shadow")
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._log_lock = threading.Lock()
+        self.records = deque(maxlen=window)
+        self.ledger = TokenLedger()     # Token use of the candidate calls
+        self.calls = 0
+        self.sampled = 0
+        self.dropped = 0
+
+    def _should_sample(self) -> bool:
+        with self._lock:
+            self.calls += 1
+            return self._rng.random() < self.sample_rate
+
+    def classify(self, email: Union[str, ProcessedEmail], **classify_kwargs) -> EmailClassification:
+        """
+        Classify with the primary function, mirroring the call to the candidate if sampled.
+
+        Args:
+            email: Raw email text or an already preprocessed email
+            **classify_kwargs: Extra keyword arguments for both classify functions
+
+        Returns:
+            The primary EmailClassification
+        """
+        processed = email if isinstance(email, ProcessedEmail) else preprocess_email(email)
+        start_time = time.perf_counter()
+        result = self.primary_fn(processed, **classify_kwargs)
+        latency = time.perf_counter() - start_time
+
+        if self._should_sample():
+            # Snapshot the primary result now; the caller may modify it later
+            record = ShadowRecord(
+                primary_intent=result.primary_intent.value,
+                primary_intents=_intents(result),
+                primary_priority=result.priority.value,
+                primary_latency=latency,
+                primary_tokens=completion_usage(result)
+            )
+            if self._slots.acquire(blocking=False):
+                with self._lock:
+                    self.sampled += 1
+                self._executor.submit(self._run_candidate, processed, classify_kwargs, record)
+            else:
+                with self._lock:
+                    self.dropped += 1
+        return result
+
+    def _run_candidate(self, processed: ProcessedEmail, classify_kwargs: dict, record: ShadowRecord):
+        try:
+            start_time = time.perf_counter()
+            try:
+                candidate = self.candidate_fn(processed, **{**classify_kwargs, "ledger": self.ledger})
+                record.candidate_latency = time.perf_counter() - start_time
+                record.candidate_intent = candidate.primary_intent.value
+                record.candidate_intents = _intents(candidate)
+                record.candidate_priority = candidate.priority.value
+                record.candidate_tokens = completion_usage(candidate)
+            except Exception as e:
+                record.candidate_error = f"{type(e).__name__}: {e}"
+            with self._lock:
+                self.records.append(record)
+            if self.log_path:
+                # Separate lock, so file writes never hold up the sampling on the primary path
+                with self._log_lock, open(self.log_path, "a", encoding="utf-8") as f:
+                    f.write(json.dumps(asdict(record)) + "\n")
+        finally:
+            self._slots.release()
+
+    def report(self) -> Dict[str, Any]:
+        """Agreement rates, latency percentiles and deltas (candidate - primary), and token averages"""
+        with self._lock:
+            records = list(self.records)
+            calls, sampled, dropped = self.calls, self.sampled, self.dropped
+        compared = [record for record in records if record.candidate_error is None]
+        count = len(compared) or 1
+        primary_latency = [record.primary_latency for record in compared]
+        candidate_latency = [record.candidate_latency for record in compared]
+        deltas = [record.candidate_latency - record.primary_latency for record in compared]
+        return {
+            "calls": calls,
+            "sampled": sampled,
+            "dropped": dropped,
+            "compared": len(compared),
+            "candidate_errors": len(records) - len(compared),
+            "intent_agreement": sum(r.primary_intent == r.candidate_intent for r in compared) / count,
+            "intent_set_agreement": sum(set(r.primary_intents) == set(r.candidate_intents) for r in compared) / count,
+            "priority_agreement": sum(r.primary_priority == r.candidate_priority for r in compared) / count,
+            "p50_primary": percentile(primary_latency, 50),
+            "p95_primary": percentile(primary_latency, 95),
+            "p50_candidate": percentile(candidate_latency, 50),
+            "p95_candidate": percentile(candidate_latency, 95),
+            "p50_delta": percentile(deltas, 50),
+            "p95_delta": percentile(deltas, 95),
+            "primary_completion_tokens": sum(r.primary_tokens["completion_tokens"] for r in compared) / count,
+            "candidate_completion_tokens": sum(r.candidate_tokens["completion_tokens"] for r in compared) / count,
+            "primary_prompt_tokens": sum(r.primary_tokens["prompt_tokens"] for r in compared) / count,
+            "candidate_prompt_tokens": sum(r.candidate_tokens["prompt_tokens"] for r in compared) / count,
+        }
+
+    def print_report(self):
+        """Print agreement and latency deltas of the mirrored calls"""
+        report = self.report()
+        print("\n--- Shadow Mode Report ---")
+        print(f"Calls: {report['calls']}, Mirrored: {report['sampled']} ({report['dropped']} dropped), "
+              f"Compared: {report['compared']}, Candidate errors: {report['candidate_errors']}")
+        print(f"Intent agreement: {report['intent_agreement']:.1%} (primary), "
+              f"{report['intent_set_agreement']:.1%} (all intents); "
+              f"Priority agreement: {report['priority_agreement']:.1%}")
+        print(f"p50 latency: {report['p50_primary']:.2f}s primary, {report['p50_candidate']:.2f}s candidate "
+              f"(delta {report['p50_delta']:+.2f}s)")
+        print(f"p95 latency: {report['p95_primary']:.2f}s primary, {report['p95_candidate']:.2f}s candidate "
+              f"(delta {report['p95_delta']:+.2f}s)")
+        print(f"Tokens per call: {report['primary_prompt_tokens']:.0f} + {report['primary_completion_tokens']:.0f} "
+              f"primary, {report['candidate_prompt_tokens']:.0f} + {report['candidate_completion_tokens']:.0f} candidate "
+              f"(prompt + completion)")
+        print(f"Candidate requests: {self.ledger.requests} ({self.ledger.actual_prompt_tokens} prompt + "
+              f"{self.ledger.actual_completion_tokens} completion tokens, not in the shared token ledger)")
+
+    def shutdown(self, wait: bool = True):
+        """Stop the shadow threads (by default after mirrored calls finish)"""
+        self._executor.shutdown(wait=wait, cancel_futures=not wait)
+
+
+# Test function
+if __name__ == "__main__":
+    from functools import partial
+    from mock_llm_server import start_mock_server
+    from test import test_emails
+
+    # The candidate endpoint is slower, to show up in the latency deltas
+    primary_server, candidate_server = start_mock_server(latency=0.05), start_mock_server(latency=0.12)
+    primary = ClientPool([Endpoint(name="primary", api_key="test", base_url=f"http://127.0.0.1:{primary_server.server_port}")])
+    candidate = candidate_client([Endpoint(name="candidate", api_key="test",
+                                           base_url=f"http://127.0.0.1:{candidate_server.server_port}")])
+
+    shadow = ShadowClassifier(candidate_fn=partial(classify_email, model="candidate-model", llm_client=candidate),
+                              primary_fn=partial(classify_email, llm_client=primary), sample_rate=0.5, seed=0)
+    for _ in range(5):
+        for email in test_emails:
+            shadow.classify(email["content"])
+    shadow.shutdown()
+    shadow.print_report()
+    print(f"Shared token ledger: {token_ledger.requests} requests (primary only)")
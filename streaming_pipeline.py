@@ -0,0 +1,430 @@
+import time
+import queue
+import asyncio
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from pipeline import PipelineContext, fingerprint_stage, classify_stage
+from intent_classification import classify_email
+
+# Marks the end of the stream in a stage queue
+_END = object()
+
+STAGE_MODES = ("thread", "process", "async")
+
+
+class StageStats:
+    """Counters of one stage, updated by its workers"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.processed = 0
+        self.errors = 0
+        self.busy = 0
+        self.max_depth = 0
+        self.busy_time = 0.0
+        self._lock = threading.Lock()
+
+    def begin(self):
+        with self._lock:
+            self.busy += 1
+
+    def end(self, seconds: float, error: bool = False):
+        with self._lock:
+            self.busy -= 1
+            self.processed += 1
+            self.busy_time += seconds
+            if error:
+                self.errors += 1
+
+
+class Stage:
+    """
+    One step of a StreamingPipeline: a function applied to every item, run by
+    `workers` threads, processes or asyncio tasks, fed from a bounded queue.
+
+    The function returns the item passed downstream, or None to drop it.
+    """
+
+    def __init__(self, name: str, fn: Callable, workers: int = 1, mode: str = "thread", queue_size: int = 64):
+        """
+        Args:
+            name: Name shown in reports
+            fn: Function applied to each item (a coroutine function in 'async' mode;
+                picklable, at module level, in 'process' mode)
+            workers: Parallelism of the stage
+            mode: 'thread', 'process' or 'async'
+            queue_size: Capacity of the queue feeding the stage; producers block when it is full
+        """
+        if mode not in STAGE_MODES:
+            raise ValueError(f"Unknown stage mode {mode!r}; expected one of {STAGE_MODES}")
+        if workers < 1 or queue_size < 1:
+            raise ValueError("workers and queue_size must be at least 1")
+        self.name = name
+        self.fn = fn
+        self.workers = workers
+        self.mode = mode
+        self.queue_size = queue_size
+
+
+class StreamingPipeline:
+    """
+    Runs items through stages connected by bounded queues.
+
+    A stage blocks when the queue of the next stage is full, so a fast stage slows to
+    the pace of the slowest one and at most the queued and in-flight items are held in
+    memory, however long the input is. Per-stage queue depth and throughput are
+    available from stats_snapshot() and can be printed live at an interval.
+
+    Usage:
+        pipeline = StreamingPipeline([Stage("double", lambda x: 2 * x, workers=4)])
+        for result in pipeline.run(range(1000)):
+            ...
+    """
+
+    def __init__(self, stages: List[Stage], output_queue_size: int = 64, report_interval: Optional[float] = None):
+        """
+        Args:
+            stages: Stages in order
+            output_queue_size: Capacity of the queue between the last stage and the consumer of run()
+            report_interval: Print a progress line every this many seconds (None: no live report)
+        """
+        if not stages:
+            raise ValueError("StreamingPipeline needs at least one stage")
+        self.stages = stages
+        self.output_queue_size = output_queue_size
+        self.report_interval = report_interval
+        self.stats = {}
+        self.ingested = 0
+        self._queues: List[queue.Queue] = []
+        self._start_time = 0.0
+        self._stop = threading.Event()
+
+    def _emit(self, q: queue.Queue, item):
+        """Blocking put that gives up if the pipeline is stopped"""
+        while not self._stop.is_set():
+            try:
+                q.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+
+    def _take(self, q: queue.Queue):
+        while not self._stop.is_set():
+            try:
+                return q.get(timeout=0.1)
+            except queue.Empty:
+                continue
+        return _END
+
+    def _ingest(self, items: Iterable):
+        try:
+            for item in items:
+                if self._stop.is_set():
+                    return
+                self._emit(self._queues[0], item)
+                self.ingested += 1
+        finally:
+            self._emit(self._queues[0], _END)
+
+    def _apply(self, stage: Stage, stats: StageStats, call: Callable, item):
+        stats.begin()
+        start_time = time.perf_counter()
+        error = False
+        try:
+            return call(item)
+        except Exception as e:
+            error = True
+            print(f"[Pipeline] {stage.name} failed on an item: {type(e).__name__}: {e}")
+            return None
+        finally:
+            stats.end(time.perf_counter() - start_time, error)
+
+    def _finish_worker(self, index: int, remaining: List[int], lock: threading.Lock):
+        """Called when a worker saw the end marker; the last worker of a stage forwards it"""
+        self._emit(self._queues[index], _END)   # Let sibling workers see the end too
+        with lock:
+            remaining[0] -= 1
+            last = remaining[0] == 0
+        if last:
+            self._emit(self._queues[index + 1], _END)
+
+    def _thread_worker(self, index: int, call: Callable, remaining: List[int], lock: threading.Lock):
+        stage, stats = self.stages[index], self.stats[self.stages[index].name]
+        in_queue, out_queue = self._queues[index], self._queues[index + 1]
+        while True:
+            item = self._take(in_queue)
+            if item is _END:
+                break
+            result = self._apply(stage, stats, call, item)
+            if result is not None:
+                self._emit(out_queue, result)
+        self._finish_worker(index, remaining, lock)
+
+    def _async_worker(self, index: int):
+        """One thread running an event loop with `workers` tasks of a coroutine stage"""
+        stage, stats = self.stages[index], self.stats[self.stages[index].name]
+        in_queue, out_queue = self._queues[index], self._queues[index + 1]
+        # Queue operations block, so they run on threads; each task can block on a get and a put
+        # at once, and sharing the loop's default executor could starve the puts
+        blocking = ThreadPoolExecutor(max_workers=2 * stage.workers, thread_name_prefix=f"pipeline-{stage.name}")
+
+        async def task():
+            loop = asyncio.get_running_loop()
+            while True:
+                item = await loop.run_in_executor(blocking, self._take, in_queue)
+                if item is _END:
+                    await loop.run_in_executor(blocking, self._emit, in_queue, _END)
+                    return
+                stats.begin()
+                start_time = time.perf_counter()
+                error = False
+                try:
+                    result = await stage.fn(item)
+                except Exception as e:
+                    error, result = True, None
+                    print(f"[Pipeline] {stage.name} failed on an item: {type(e).__name__}: {e}")
+                finally:
+                    stats.end(time.perf_counter() - start_time, error)
+                if result is not None:
+                    await loop.run_in_executor(blocking, self._emit, out_queue, result)
+
+        async def main():
+            await asyncio.gather(*(task() for _ in range(stage.workers)))
+
+        try:
+            asyncio.run(main())
+        finally:
+            blocking.shutdown()
+        self._emit(out_queue, _END)
+
+    def _sample_depths(self):
+        for stage, q in zip(self.stages, self._queues):
+            stats = self.stats[stage.name]
+            stats.max_depth = max(stats.max_depth, q.qsize())
+
+    def stats_snapshot(self) -> List[Dict[str, Any]]:
+        """Per-stage queue depth, items processed, errors, busy workers and throughput"""
+        elapsed = max(time.perf_counter() - self._start_time, 1e-9)
+        rows = []
+        for stage, q in zip(self.stages, self._queues):
+            stats = self.stats[stage.name]
+            rows.append({
+                "stage": stage.name,
+                "depth": q.qsize(),
+                "capacity": stage.queue_size,
+                "max_depth": stats.max_depth,
+                "processed": stats.processed,
+                "errors": stats.errors,
+                "busy": stats.busy,
+                "workers": stage.workers,
+                "throughput": stats.processed / elapsed
+            })
+        return rows
+
+    def format_report(self, previous: Optional[Dict[str, int]] = None, interval: Optional[float] = None) -> str:
+        """One-line report; with the counts of the previous report, throughput is over the last interval"""
+        parts = [f"in {self.ingested}"]
+        for row in self.stats_snapshot():
+            rate = row["throughput"]
+            if previous is not None and interval:
+                rate = (row["processed"] - previous.get(row["stage"], 0)) / interval
+            parts.append(f"{row['stage']} q={row['depth']}/{row['capacity']} busy={row['busy']}/{row['workers']} "
+                         f"{row['processed']} ({rate:.1f}/s)")
+        return "[Pipeline] " + " | ".join(parts)
+
+    def _report(self):
+        previous: Dict[str, int] = {}
+        last = time.perf_counter()
+        while not self._stop.wait(min(self.report_interval or 1.0, 0.05)):
+            self._sample_depths()
+            if self.report_interval is None or time.perf_counter() - last < self.report_interval:
+                continue
+            now = time.perf_counter()
+            print(self.format_report(previous, now - last))
+            previous = {name: stats.processed for name, stats in self.stats.items()}
+            last = now
+
+    def run(self, items: Iterable) -> Iterator:
+        """
+        Stream items through the stages.
+
+        Args:
+            items: Input items; consumed lazily, only as fast as the stages accept them
+
+        Yields:
+            Items leaving the last stage (not in input order when stages have several workers)
+        """
+        self._stop.clear()
+        self.stats = {stage.name: StageStats(stage.name) for stage in self.stages}
+        self._queues = [queue.Queue(stage.queue_size) for stage in self.stages] + [queue.Queue(self.output_queue_size)]
+        self._start_time = time.perf_counter()
+        self.ingested = 0
+
+        threads = [threading.Thread(target=self._ingest, args=(items,), name="pipeline-ingest", daemon=True),
+                   threading.Thread(target=self._report, name="pipeline-report", daemon=True)]
+        executors = []
+        for index, stage in enumerate(self.stages):
+            if stage.mode == "async":
+                threads.append(threading.Thread(target=self._async_worker, args=(index,),
+                                                name=f"pipeline-{stage.name}", daemon=True))
+                continue
+            remaining, lock = [stage.workers], threading.Lock()
+            if stage.mode == "process":
+                # Each worker thread keeps one item in flight in the process pool
+                executor = ProcessPoolExecutor(max_workers=stage.workers)
+                executors.append(executor)
+                call = (lambda fn, ex: lambda item: ex.submit(fn, item).result())(stage.fn, executor)
+            else:
+                call = stage.fn
+            for worker in range(stage.workers):
+                threads.append(threading.Thread(target=self._thread_worker, args=(index, call, remaining, lock),
+                                                name=f"pipeline-{stage.name}-{worker}", daemon=True))
+        for thread in threads:
+            thread.start()
+
+        try:
+            while True:
+                item = self._take(self._queues[-1])
+                if item is _END:
+                    break
+                yield item
+        finally:
+            self._stop.set()
+            for thread in threads:
+                thread.join()
+            for executor in executors:
+                executor.shutdown(cancel_futures=True)
+            if self.report_interval is not None:
+                print(self.format_report())
+
+    def run_to_completion(self, items: Iterable) -> int:
+        """Run the pipeline for its side effects (e.g. a sink stage); returns the number of outputs"""
+        return sum(1 for _ in self.run(items))
+
+
+class ClassificationCache:
+    """Thread-safe LRU cache of classifications keyed by email fingerprint"""
+
+    def __init__(self, max_entries: int = 10000):
+        self.max_entries = max_entries
+        self._entries: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, fingerprint: str):
+        with self._lock:
+            result = self._entries.get(fingerprint)
+            if result is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(fingerprint)
+            self.hits += 1
+            return result
+
+    def put(self, fingerprint: str, result):
+        with self._lock:
+            self._entries[fingerprint] = result
+            self._entries.move_to_end(fingerprint)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
+def _preprocess(item: Tuple[str, str]) -> PipelineContext:
+    """Ingested (id, raw text) pair -> preprocessed and fingerprinted context (module level for process mode)"""
+    email_id, text = item
+    ctx = PipelineContext(raw_text=text, email_id=email_id)
+    return fingerprint_stage(ctx)
+
+
+def build_email_pipeline(cache: Optional[ClassificationCache] = None,
+                         sink: Optional[Callable[[PipelineContext], None]] = None,
+                         preprocess_workers: int = 2,
+                         preprocess_mode: str = "thread",
+                         classify_workers: int = 8,
+                         queue_size: int = 64,
+                         report_interval: Optional[float] = None,
+                         classify_fn: Callable = classify_email,
+                         **classify_kwargs) -> StreamingPipeline:
+    """
+    ingest -> preprocess -> cache lookup -> classify -> sink, over (email_id, text) pairs.
+
+    Args:
+        cache: Cache of classifications by fingerprint (default: a new ClassificationCache)
+        sink: Called with every finished PipelineContext (e.g. to write results); runs in one thread
+        preprocess_workers: Parallelism of preprocessing
+        preprocess_mode: 'thread' or 'process' (processes sidestep the GIL for CPU-bound preprocessing)
+        classify_workers: Concurrent classification requests
+        queue_size: Capacity of every stage queue
+        report_interval: Seconds between live progress lines (None: no live report)
+        classify_fn: Classify function (default: classify_email; e.g. ShadowClassifier.classify)
+        **classify_kwargs: Extra keyword arguments for classify_email
+
+    Returns:
+        StreamingPipeline; its outputs are PipelineContext objects (ctx.error is set on failure)
+    """
+    cache = cache if cache is not None else ClassificationCache()
+
+    def lookup(ctx: PipelineContext) -> PipelineContext:
+        ctx.result = cache.get(ctx.fingerprint)
+        return ctx
+
+    def classify(ctx: PipelineContext) -> PipelineContext:
+        if ctx.result is not None:
+            return ctx   # Cache hit
+        try:
+            classify_stage(ctx, classify_fn, **classify_kwargs)
+            cache.put(ctx.fingerprint, ctx.result)
+        except Exception as e:
+            ctx.error = f"{type(e).__name__}: {e}"
+        return ctx
+
+    def write(ctx: PipelineContext) -> PipelineContext:
+        if sink is not None:
+            sink(ctx)
+        return ctx
+
+    stages = [
+        Stage("preprocess", _preprocess, workers=preprocess_workers, mode=preprocess_mode, queue_size=queue_size),
+        Stage("cache", lookup, workers=1, queue_size=queue_size),
+        Stage("classify", classify, workers=classify_workers, queue_size=queue_size),
+        Stage("sink", write, workers=1, queue_size=queue_size),
+    ]
+    pipeline = StreamingPipeline(stages, output_queue_size=queue_size, report_interval=report_interval)
+    pipeline.cache = cache
+    return pipeline
+
+
+# Test function
+if __name__ == "__main__":
+    import json
+    import os
+    import tempfile
+    import itertools
+    from mock_llm_server import start_mock_server
+    from client_pool import ClientPool, Endpoint
+    from synthetic_corpus import SyntheticCorpusGenerator
+
+    server = start_mock_server(latency=0.1)
+    pool = ClientPool([Endpoint(name="mock", api_key="test", base_url=f"http://127.0.0.1:{server.server_port}")])
+
+    # The corpus is streamed twice, so the second pass is answered from the cache
+    generator = SyntheticCorpusGenerator(seed=4)
+    emails = itertools.chain(((email.email_id, email.content) for email in generator.generate(300)),
+                             ((email.email_id + "-again", email.content) for email in generator.generate(300)))
+
+    path = os.path.join(tempfile.mkdtemp(), "results.jsonl")
+    with open(path, "w", encoding="utf-8") as f:
+        pipeline = build_email_pipeline(
+            sink=lambda ctx: f.write(json.dumps({"id": ctx.email_id, "intent": str(ctx.result.primary_intent)
+                                                 if ctx.result else None, "error": ctx.error}) + "\n"),
+            classify_workers=8, queue_size=16, report_interval=1.0, llm_client=pool
+        )
+        start = time.perf_counter()
+        count = pipeline.run_to_completion(emails)
+    elapsed = time.perf_counter() - start
+    print(f"{count} emails in {elapsed:.2f}s ({count / elapsed:.0f}/s); "
+          f"cache hits: {pipeline.cache.hits}, misses: {pipeline.cache.misses}")
@@ -0,0 +1,322 @@
+import json
+import random
+from dataclasses import dataclass, asdict
+from typing import Dict, Iterator, List
+
+from intent_classification import EmailIntent
+
+# Vocabularies used to fill the templates
+PROPERTY_PREFIXES = ["Riverfront", "Jackson Heights", "Westside", "Madison", "Lakefront", "Parkview", "Harbor Point",
+                     "Lincoln", "Henderson", "Westfield", "Summit", "Crescent", "Oak Ridge", "Union Square", "Bayshore",
+                     "Meridian", "Granite", "Cedar Grove", "Northgate", "Pioneer"]
+PROPERTY_SUFFIXES = ["Lofts", "Plaza", "Tower", "Corporate Center", "Tech Campus", "Building", "Retail Center",
+                     "Business Park", "Office Park", "Industrial Park", "Commons", "Square"]
+STREET_NAMES = ["King St", "Main Street", "5th Avenue", "3rd Avenue", "Market Street", "Commerce Blvd", "Elm Street",
+                "Harbor Drive", "Industrial Way", "Broadway"]
+COMPANY_NAMES = ["Evergreen", "Wilson", "Summit Ridge", "Blue Harbor", "Keystone", "Northstar", "Ironwood", "Granite Peak",
+                 "Silverline", "Redwood", "Atlas", "Beacon"]
+COMPANY_SUFFIXES = ["Property Holdings", "Properties LLC", "Real Estate Partners", "Capital Group", "Development Inc.",
+                    "Investments", "Management Co.", "Holdings Trust"]
+BROKERS = ["CBRE", "JLL", "Cushman & Wakefield", "Colliers", "Newmark", "Marcus & Millichap"]
+FIRST_NAMES = ["Morgan", "Sarah", "David", "Jessica", "Alex", "Jennifer", "Michael", "Priya", "Daniel", "Olivia", "Chen", "Maria"]
+LAST_NAMES = ["Johnson", "Williams", "Patel", "Garcia", "Nguyen", "Kim", "Brown", "Lopez", "Miller", "Davis"]
+TITLES = ["Senior Leasing Director", "Director of Corporate Services", "Asset Manager", "Transaction Manager",
+          "VP, Acquisitions", "Portfolio Analyst"]
+DEADLINES = ["by Friday", "by end of day", "by tomorrow morning", "before the board meeting", "by next Tuesday",
+             "within the week", "before closing"]
+URGENCY_WORDS = ["urgent", "ASAP", "time-sensitive", "critical"]
+
+# Request sentences per intent; each intent has several phrasings
+INTENT_TEMPLATES: Dict[EmailIntent, List[str]] = {
+    EmailIntent.LEASE_ABSTRACTION: [
+        "Please abstract the lease for {property} (attached). We need the base rent, commencement and expiry dates, renewal options and escalation schedule.",
+        "Can you pull the key terms out of the {property} lease: rent, term, landlord, tenant and any renewal rights?",
+        "I need a lease abstract for the {address} space {deadline}, covering rent, security deposit and options.",
+    ],
+    EmailIntent.COMPARISON_LOI_LEASE: [
+        "Please compare the signed LOI with the final lease for {property} and flag any deviations in rent, term or concessions.",
+        "The tenant says the {property} lease doesn't match the LOI. Can you line up the two documents and list the differences?",
+        "Can someone check the draft lease for {address} against the LOI we agreed with {company}?",
+    ],
+    EmailIntent.CLAUSE_PROTECT: [
+        "Someone from legal should review the draft lease for {property}. It's missing indemnity protections and the assignment clause seems overly broad.",
+        "Can you check the {address} lease for red flags, like missing subletting rights or an unfavourable break clause?",
+        "Please review the {property} lease for risky or missing clauses, especially around restoration and operating expense caps.",
+    ],
+    EmailIntent.COMPANY_RESEARCH: [
+        "Please run a background check on {company}. We need to understand their portfolio, principals and any litigation in the past five years.",
+        "Can research look into {company}'s financial position and whether they've been involved in lawsuits recently?",
+        "Before we sign, I'd like a credibility report on {company}, the proposed tenant at {property}.",
+    ],
+    EmailIntent.TRANSACTION_DATE_NAVIGATOR: [
+        "I need a complete schedule of critical dates for the {property} acquisition (inspection period, loan contingency and closing) {deadline}.",
+        "Can you pull together the escrow timeline for the {address} deal? We're concerned about the due diligence and closing dates.",
+        "The seller wants to move up the closing on {property}. Please verify the new closing date and update the transaction calendar.",
+    ],
+    EmailIntent.AMENDMENT_ABSTRACTION: [
+        "The lease amendment for {property} just came in (attached). Please abstract it and identify what changed from the original lease.",
+        "Can you analyze the second amendment to the {address} lease and summarize the new rent and term provisions?",
+        "Please highlight every change the {property} amendment makes to the original agreement, especially escalations.",
+    ],
+    EmailIntent.SALES_LISTINGS_COMPARISON: [
+        "I've attached sales listings from {broker} and {broker2} for properties near {property}. Please compare pricing, cap rates and square footage.",
+        "Can you compare the for-sale listings we received for {address} and the two comparable buildings across brokers?",
+        "Please build a side-by-side of the {broker} sales listings so we can see price per square foot and occupancy.",
+    ],
+    EmailIntent.LEASE_LISTINGS_COMPARISON: [
+        "We need a comparison of the lease listings from {broker} and {broker2} against our client's requirements (50,000 sq ft, Class A, parking 3:1000).",
+        "Can you rank the available lease listings near {property} by base rent, escalations and concessions?",
+        "Please compare the office lease options {broker} sent over and flag hidden costs like operating expense pass-throughs.",
+    ],
+}
+
+# Subject lines per intent
+INTENT_SUBJECTS: Dict[EmailIntent, List[str]] = {
+    EmailIntent.LEASE_ABSTRACTION: ["Lease abstract needed - {property}", "Key terms for {address} lease"],
+    EmailIntent.COMPARISON_LOI_LEASE: ["LOI vs lease - {property}", "Lease doesn't match LOI"],
+    EmailIntent.CLAUSE_PROTECT: ["Legal review: {property} lease", "Lease clause concerns"],
+    EmailIntent.COMPANY_RESEARCH: ["Background check on {company}", "Tenant research request"],
+    EmailIntent.TRANSACTION_DATE_NAVIGATOR: ["Critical dates for {property}", "Closing timeline - {address}"],
+    EmailIntent.AMENDMENT_ABSTRACTION: ["Lease amendment - {property}", "Amendment review needed"],
+    EmailIntent.SALES_LISTINGS_COMPARISON: ["Sales listings comparison", "Comps near {property}"],
+    EmailIntent.LEASE_LISTINGS_COMPARISON: ["Lease options for review", "Office space listings comparison"],
+}
+
+GREETINGS = ["Hi team,", "Hello Real Estate Team,", "Hey,", "Team,", "Hi there,", "Good morning,"]
+INTROS = ["We have a few items that need attention:", "Following up on yesterday's call.",
+          "I have a couple of requests on the current deals.", "Quick request below.",
+          "As discussed in the expansion committee meeting, here is what we need:"]
+FILLERS = [
+    "The client has been asking for an update, so anything you can share early would help.",
+    "For context, this is part of the portfolio review the executive team requested last month.",
+    "Let me know if you need access to the data room or the original documents.",
+    "We will coordinate a call later this week to review the findings.",
+    "The numbers in the broker packages are preliminary, so please note any assumptions.",
+    "Legal has already reviewed the earlier drafts, so focus on what is new.",
+]
+CLOSINGS = ["Thanks,", "Regards,", "Best regards,", "Thank you,", "Cheers,", "Best,"]
+
+# write_mbox keeps the labels next to the archive rather than in the messages
+LABELS_SUFFIX = ".labels.jsonl"
+
+
+@dataclass
+class SyntheticEmail:
+    """A generated email with its ground-truth intents"""
+    email_id: str
+    content: str
+    true_intents: List[str]   # EmailIntent values; the first is the primary intent
+    features: Dict[str, bool]
+
+
+class SyntheticCorpusGenerator:
+    """
+    Generates realistic commercial real estate emails with known intents.
+
+    Each email is derived from (seed, index) alone, so a corpus streams out in
+    constant memory, is identical on every run, and any slice can be regenerated
+    independently (e.g. by parallel workers).
+    """
+
+    def __init__(self,
+                 seed: int = 0,
+                 max_intents: int = 3,
+                 min_filler_paragraphs: int = 0,
+                 max_filler_paragraphs: int = 2,
+                 html_rate: float = 0.1,
+                 signature_rate: float = 0.5,
+                 forward_rate: float = 0.15,
+                 numbered_list_rate: float = 0.6,
+                 urgency_rate: float = 0.2,
+                 noise: float = 0.0):
+        """
+        Args:
+            seed: Seed of the corpus
+            max_intents: Maximum number of distinct intents per email
+            min_filler_paragraphs / max_filler_paragraphs: Range of extra context paragraphs (controls length)
+            html_rate: Fraction of emails rendered as HTML
+            signature_rate: Fraction of emails with a multi-line signature block
+            forward_rate: Fraction of emails wrapped in a forwarded-message header
+            numbered_list_rate: Fraction of multi-intent emails that list requests as "1. 2. 3."
+            urgency_rate: Fraction of emails with urgency wording
+            noise: Per-word probability of a typo or odd spacing (0 disables noise)
+        """
+        self.seed = seed
+        self.max_intents = max_intents
+        self.min_filler_paragraphs = min_filler_paragraphs
+        self.max_filler_paragraphs = max_filler_paragraphs
+        self.html_rate = html_rate
+        self.signature_rate = signature_rate
+        self.forward_rate = forward_rate
+        self.numbered_list_rate = numbered_list_rate
+        self.urgency_rate = urgency_rate
+        self.noise = noise
+
+    def _vocabulary(self, rng: random.Random) -> Dict[str, str]:
+        """Draw the names used to fill one request"""
+        brokers = rng.sample(BROKERS, 2)
+        return dict(
+            property=f"{rng.choice(PROPERTY_PREFIXES)} {rng.choice(PROPERTY_SUFFIXES)}",
+            address=f"{rng.randint(10, 990)} {rng.choice(STREET_NAMES)}",
+            company=f"{rng.choice(COMPANY_NAMES)} {rng.choice(COMPANY_SUFFIXES)}",
+            broker=brokers[0],
+            broker2=brokers[1],
+            deadline=rng.choice(DEADLINES)
+        )
+
+    def _add_noise(self, rng: random.Random, text: str) -> str:
+        words = text.split(" ")
+        for i, word in enumerate(words):
+            if len(word) > 3 and rng.random() < self.noise:
+                j = rng.randrange(len(word) - 1)
+                words[i] = rng.choice([
+                    word[:j] + word[j + 1] + word[j] + word[j + 2:],   # Swapped letters
+                    word[:j] + word[j + 1:],                            # Dropped letter
+                    word + " ",                                         # Double space
+                ])
+        return " ".join(words)
+
+    def generate_one(self, index: int) -> SyntheticEmail:
+        """Generate the email at position `index` of the corpus"""
+        rng = random.Random(f"{self.seed}:{index}")
+
+        intent_count = min(rng.choices([1, 2, 3, 4], weights=[50, 30, 15, 5])[0], self.max_intents)
+        intents = rng.sample(list(EmailIntent), intent_count)
+        values = [self._vocabulary(rng) for _ in intents]
+        requests = [rng.choice(INTENT_TEMPLATES[intent]).format(**v) for intent, v in zip(intents, values)]
+
+        urgent = rng.random() < self.urgency_rate
+        numbered = intent_count > 1 and rng.random() < self.numbered_list_rate
+        html = rng.random() < self.html_rate
+        signature = rng.random() < self.signature_rate
+        forwarded = rng.random() < self.forward_rate
+
+        sender = f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}"
+        topic = rng.choice(INTENT_SUBJECTS[intents[0]]).format(**values[0])
+        subject = f"{rng.choice(URGENCY_WORDS).upper()}: {topic}" if urgent else topic
+
+        paragraphs = [rng.choice(GREETINGS)]
+        if numbered or rng.random() < 0.4:
+            paragraphs.append(rng.choice(INTROS))
+        if numbered:
+            paragraphs.append("\n".join(f"{i}. {request}" for i, request in enumerate(requests, 1)))
+        else:
+            connectors = ["", "Also, ", "Separately, ", "In addition, "]
+            paragraphs.extend(
+                (connectors[min(i, 3)] + request[0].lower() + request[1:]) if i else request
+                for i, request in enumerate(requests)
+            )
+        fillers = rng.randint(self.min_filler_paragraphs, self.max_filler_paragraphs)
+        paragraphs.extend(rng.choice(FILLERS) for _ in range(fillers))
+        if urgent:
+            paragraphs.append(f"This is {rng.choice(URGENCY_WORDS).lower()}, please prioritize it {rng.choice(DEADLINES)}.")
+
+        if self.noise:
+            paragraphs = [self._add_noise(rng, paragraph) for paragraph in paragraphs]
+
+        closing = f"{rng.choice(CLOSINGS)}\n{sender.split()[0]}"
+        if signature:
+            closing = f"{rng.choice(CLOSINGS)}\n\n{sender}\n{rng.choice(TITLES)}\nOffice: (555) {rng.randint(100, 999)}-{rng.randint(1000, 9999)}"
+
+        if html:
+            body_parts = []
+            for paragraph in paragraphs:
+                lines = paragraph.split("\n")
+                if numbered and all(line[:1].isdigit() for line in lines) and len(lines) > 1:
+                    body_parts.append("<ol>" + "".join(f"<li>{line.split('. ', 1)[1]}</li>" for line in lines) + "</ol>")
+                else:
+                    body_parts.append(f"<p>{paragraph.replace('&', '&amp;')}</p>")
+            body = ('<div style="font-family: Arial, sans-serif;">\n' + "\n".join(body_parts) +
+                    f"\n<p>{closing.replace(chr(10), '<br>')}</p>\n</div>")
+        else:
+            body = "\n\n".join(paragraphs) + "\n\n" + closing
+
+        content = f"Subject: {subject}\n\n{body}"
+        if forwarded:
+            content = (f"FWD: {subject}\n---------- Forwarded message ----------\n"
+                       f"From: {sender.lower().replace(' ', '.')}@client-example.com\n"
+                       f"Sent: Monday, June {rng.randint(1, 28)}, 2025\nTo: team@ourcompany.com\n\n{body}")
+
+        return SyntheticEmail(
+            email_id=f"syn-{self.seed}-{index}",
+            content=content,
+            true_intents=[intent.value for intent in intents],
+            features={"html": html, "signature": signature, "forwarded": forwarded,
+                      "numbered_list": numbered, "urgent": urgent}
+        )
+
+    def generate(self, count: int, start: int = 0) -> Iterator[SyntheticEmail]:
+        """Stream `count` emails starting at index `start`"""
+        for index in range(start, start + count):
+            yield self.generate_one(index)
+
+
+def write_jsonl(path: str, emails: Iterator[SyntheticEmail]) -> int:
+    """Write emails as JSON lines; returns the number written"""
+    written = 0
+    with open(path, "w", encoding="utf-8", buffering=1 << 20) as f:
+        for email in emails:
+            f.write(json.dumps(asdict(email), ensure_ascii=False) + "\n")
+            written += 1
+    return written
+
+
+def write_mbox(path: str, emails: Iterator[SyntheticEmail]) -> int:
+    """
+    Write emails as an mbox archive (readable by mail_corpus.MailCorpus); returns the number written.
+
+    The labels are kept out of the messages, so they can't reach the classifier; they
+    go to a '<path>.labels.jsonl' sidecar with one {"email_id", "message_id",
+    "true_intents"} line per email.
+    """
+    written = 0
+    with open(path, "w", encoding="utf-8", buffering=1 << 20) as f, \
+            open(path + LABELS_SUFFIX, "w", encoding="utf-8") as labels:
+        for email in emails:
+            message_id = f"<{email.email_id}@synthetic.example.com>"
+            subtype = "html" if email.features.get("html") else "plain"
+            # The subject line becomes the Subject header; forwarded emails keep their whole content as the body
+            subject, separator, body = email.content.partition("\n\n")
+            if subject.startswith("Subject: ") and separator:
+                headers = subject
+            else:
+                headers, body = "", email.content
+            # mbox escapes body lines that look like message separators
+            body = body.replace("\nFrom ", "\n>From ")
+            f.write(f"From synthetic@example.com Mon Jun  2 09:00:00 2025\n"
+                    f"Message-ID: {message_id}\n"
+                    f"Content-Type: text/{subtype}; charset=utf-8\n"
+                    f"Content-Transfer-Encoding: 8bit\n"
+                    + (headers + "\n" if headers else "")
+                    + f"\n{body}\n\n")
+            labels.write(json.dumps({"email_id": email.email_id, "message_id": message_id,
+                                     "true_intents": email.true_intents}) + "\n")
+            written += 1
+    return written
+
+
+def read_jsonl(path: str) -> Iterator[SyntheticEmail]:
+    """Stream emails back from a JSON lines file"""
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                yield SyntheticEmail(**json.loads(line))
+
+
+def read_labels(path: str) -> Dict[str, List[str]]:
+    """True intents by email_id from the labels sidecar of an mbox written by write_mbox"""
+    labels = {}
+    with open(path + LABELS_SUFFIX, encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                record = json.loads(line)
+                labels[record["email_id"]] = record["true_intents"]
+    return labels
+
+
+# Test function
+if __name__ == "__main__":
+    generator = SyntheticCorpusGenerator(seed=42, html_rate=0.2, noise=0.02)
+    for email in generator.generate(3):
+        print(f"--- {email.email_id} {email.true_intents} {email.features}")
+        print(email.content + "\n")
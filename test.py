@@ -1,8 +1,7 @@
 import json 
-import time 
 
-from intent_classification import classify_email
 from email_preprocessing import preprocess_email
+from pipeline import PipelineContext, preprocess_stage, classify_stage
 
 # Collection of increasingly complex emails for testing
 test_emails = [
@@ -175,9 +174,9 @@ def run_tests():
         
         try:
             # Time the preprocessing
-            start_time = time.time()
-            processed = preprocess_email(test_case['content'])
-            preprocess_time = time.time() - start_time
+            ctx = preprocess_stage(PipelineContext(raw_text=test_case['content']))
+            processed = ctx.processed
+            preprocess_time = ctx.timings["preprocess"]
             
             print("Preprocessing Results:")
             print(f"Subject: {processed.subject}")
@@ -199,10 +198,10 @@ def run_tests():
             print(processed.clean_text[:300] + "...")
             print("\n")
 
-            # Time the classification
-            start_time = time.time()
-            result = classify_email(test_case['content'])
-            classification_time = time.time() - start_time
+            # Time the classification (reuses the preprocessed email)
+            classify_stage(ctx)
+            result = ctx.result
+            classification_time = ctx.timings["classify"]
             
             print("Classification Results:")
             print(f"Primary Intent: {result.primary_intent}")
@@ -0,0 +1,15 @@
+import os
+import sys
+
+import pytest
+
+# The modules live at the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmark import sample_classification  # noqa: E402
+
+
+@pytest.fixture
+def classification():
+    """A valid EmailClassification, as a stub classify function would return"""
+    return sample_classification()
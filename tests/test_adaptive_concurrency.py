@@ -0,0 +1,117 @@
+import pytest
+
+from adaptive_concurrency import AdaptiveClient, AdaptiveConcurrencyLimiter
+from client_pool import Endpoint
+from intent_classification import EmailClassification
+from mock_llm_server import start_mock_server
+
+
+def test_limit_grows_only_when_saturated():
+    limiter = AdaptiveConcurrencyLimiter(initial_limit=4, max_limit=6)
+    for _ in range(8):
+        limiter.acquire()
+        limiter.release(0.5, saturated=False, completion_tokens=100)
+    assert limiter.limit == 4
+
+    for _ in range(8):
+        limiter.acquire()
+        limiter.release(0.5, saturated=True, completion_tokens=100)
+    assert 5 < limiter.limit < 6
+    assert limiter.limit_history()[-1][2] == "increase"
+
+    for _ in range(100):
+        limiter.acquire()
+        limiter.release(0.5, saturated=True, completion_tokens=100)
+    assert limiter.limit == 6
+
+
+def test_congestion_halves_the_limit_once_per_latency_period():
+    limiter = AdaptiveConcurrencyLimiter(initial_limit=16, min_limit=2)
+    limiter.acquire()
+    limiter.release(5.0, completion_tokens=100)     # Smoothed latency: 5 s
+
+    for _ in range(3):
+        limiter.acquire()
+        limiter.release(congestion="429")
+    assert limiter.limit == 8
+    assert (limiter.rejections, limiter.decreases) == (3, 1)
+
+    limiter._last_decrease -= 5.0                   # The next latency period
+    limiter.acquire()
+    limiter.release(congestion="timeout")
+    assert limiter.limit == 4
+    assert limiter.timeouts == 1
+
+
+def test_limit_never_drops_below_the_minimum():
+    limiter = AdaptiveConcurrencyLimiter(initial_limit=2, min_limit=1)
+    for _ in range(5):
+        limiter.acquire()
+        limiter.release(congestion="503")   # No latency sample yet, so every cut counts
+    assert limiter.limit == 1
+    assert limiter.decreases == 5
+
+
+def test_latency_spikes_are_judged_per_completion_token():
+    limiter = AdaptiveConcurrencyLimiter(initial_limit=8, min_tokens=10)
+    limiter.acquire()
+    limiter.release(1.0, completion_tokens=100)     # 10 ms per token
+
+    # A long answer takes longer without being a spike
+    limiter.acquire()
+    limiter.release(5.0, completion_tokens=500)
+    assert (limiter.spikes, limiter.limit) == (0, 8)
+
+    # The same time for a short answer is
+    limiter.acquire()
+    limiter.release(5.0, completion_tokens=100)
+    assert (limiter.spikes, limiter.limit) == (1, 4)
+
+
+def test_small_jitter_is_not_a_spike():
+    limiter = AdaptiveConcurrencyLimiter(initial_limit=8, min_spike=0.1)
+    limiter.acquire()
+    limiter.release(0.01, completion_tokens=64)
+    limiter.acquire()
+    limiter.release(0.05, completion_tokens=64)     # 5x slower, but only by 40 ms
+    assert limiter.spikes == 0
+
+
+def test_other_errors_leave_the_limit_alone():
+    limiter = AdaptiveConcurrencyLimiter(initial_limit=4)
+    limiter.acquire()
+    limiter.release()
+    assert (limiter.errors, limiter.limit, limiter.in_flight) == (1, 4, 0)
+
+
+def test_acquire_waits_for_a_free_slot():
+    limiter = AdaptiveConcurrencyLimiter(initial_limit=1, max_wait=0.05)
+    assert limiter.acquire()
+    with pytest.raises(RuntimeError, match="No LLM request slot"):
+        limiter.acquire()
+    limiter.release(0.1)
+    assert limiter.acquire()
+
+
+def test_rate_limit_responses_reach_the_limiter():
+    server = start_mock_server(rate_limit=2, rate_window=60.0)
+    try:
+        endpoint = Endpoint(name="mock", api_key="test", base_url=f"http://127.0.0.1:{server.server_port}")
+        client = AdaptiveClient(limiter=AdaptiveConcurrencyLimiter(initial_limit=4), max_attempts=1,
+                                endpoints=[endpoint])
+        messages = [{"role": "user", "content": "Please abstract the lease."}]
+        for _ in range(2):
+            result = client.chat.completions.create(model="mock", response_model=EmailClassification,
+                                                    messages=messages)
+            assert isinstance(result, EmailClassification)
+        with pytest.raises(Exception):
+            client.chat.completions.create(model="mock", response_model=EmailClassification,
+                                           messages=messages)
+    finally:
+        server.shutdown()
+
+    # One 429 on the wire (no SDK retries), and the limiter saw it
+    assert server.state.rate_limited == 1
+    report = client.report()
+    assert (report["successes"], report["rejections"], report["decreases"]) == (2, 1, 1)
+    assert report["limit"] == 2
@@ -0,0 +1,50 @@
+import json
+
+from intent_classification import EmailPriority
+from batch_jobs import batch_request_line, build_batch_file, merge_results
+
+
+def output_line(custom_id, classification=None, status_code=200):
+    """One line of a batch output file, as the batch API writes it"""
+    body = {"error": {"message": "Internal error"}}
+    if classification is not None:
+        body = {"choices": [{"message": {"tool_calls": [{"function": {
+            "arguments": classification.model_dump_json()}}]}}]}
+    return json.dumps({"custom_id": custom_id, "response": {"status_code": status_code, "body": body}}) + "\n"
+
+
+def test_hints_survive_ids_with_tabs_and_newlines(tmp_path, classification):
+    requests_path = str(tmp_path / "requests.jsonl")
+    emails = [("plain", "Subject: Dates\n\nSend the escrow schedule."),
+              ("tab\there\nand newline", "Subject: URGENT\n\nSee the attached lease, needed ASAP."),
+              ("failed", "Subject: x\n\nAnything.")]
+    assert build_batch_file(emails, requests_path) == 3
+
+    with open(requests_path + ".hints", encoding="utf-8") as f:
+        hints = [json.loads(line) for line in f]
+    assert [hint["custom_id"] for hint in hints] == [custom_id for custom_id, _ in emails]
+    assert hints[1]["has_attachments"] and hints[1]["urgent_indicators"]
+
+    output_path = tmp_path / "output.jsonl"
+    classification.priority = EmailPriority.MEDIUM
+    output_path.write_text(output_line("plain", classification) + output_line("tab\there\nand newline", classification)
+                           + output_line("failed", status_code=500))
+    export_path = str(tmp_path / "results.jsonl")
+    report = merge_results(requests_path, [str(output_path)], export_path)
+
+    assert report.succeeded == 2
+    assert list(report.failed) == ["failed"]
+    with open(export_path, encoding="utf-8") as f:
+        results = [json.loads(line) for line in f]
+    assert [result["id"] for result in results] == ["plain", "tab\there\nand newline"]
+    # The preprocessing hints were applied to the second email only
+    assert results[0]["classification"]["priority"] == "medium"
+    assert results[1]["classification"]["priority"] == "high"
+    assert results[1]["classification"]["attachments_mentioned"]
+
+
+def test_request_line_is_trimmed_to_the_context_window():
+    line = batch_request_line("long", "word " * 100000, model="llama3-70b-8192")
+    text = line["body"]["messages"][1]["content"]
+    assert len(text) < 100000
+    assert "word word" in text
@@ -0,0 +1,63 @@
+import pickle
+import sys
+import threading
+
+from email_preprocessing import EmailFlags, preprocess_email
+
+
+EMAIL = "Subject: Lease   abstract\n\nPlease abstract the lease for 12 Oak Ave.\n\n\n\nIt is attached.\tThanks"
+
+
+def test_clean_text_is_built_once():
+    processed = preprocess_email(EMAIL)
+    clean_text = processed.clean_text
+    assert clean_text == ("Subject: Lease abstract\n\nPlease abstract the lease for 12 Oak Ave.\n\n"
+                          "It is attached. Thanks")
+    assert processed.clean_text is clean_text
+
+
+def test_processed_email_pickles_with_its_clean_text():
+    processed = preprocess_email(EMAIL)
+    restored = pickle.loads(pickle.dumps(processed))
+    assert restored.clean_text == processed.clean_text
+
+    processed.clean_text
+    assert pickle.loads(pickle.dumps(processed)).clean_text == processed.clean_text
+
+
+def test_metadata_is_built_once():
+    processed = preprocess_email(EMAIL)
+    metadata = processed.metadata
+    assert metadata["has_attachments"] and metadata["paragraph_count"] == 2
+    assert processed.metadata is metadata
+
+
+def test_detectors_run_on_first_access():
+    processed = preprocess_email("Subject: URGENT\n\nSee attached.\n\n1. First item\n2. Second item")
+    assert processed.has_attachments and processed.urgent_indicators
+    assert processed.numbered_items_count == 2
+    assert processed.metadata["paragraph_count"] == 2
+
+
+def test_detectors_running_concurrently_keep_every_flag():
+    text = "Subject: URGENT\n\nSee attached.\n\n1. First item\n2. Second item\n\n- A bullet"
+    detectors = ("has_attachments", "urgent_indicators", "has_numbered_list", "has_bullet_list")
+    interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)
+    try:
+        for _ in range(200):
+            processed = preprocess_email(text)
+            barrier = threading.Barrier(len(detectors))
+
+            def read(name):
+                barrier.wait()
+                getattr(processed, name)
+
+            threads = [threading.Thread(target=read, args=(name,)) for name in detectors]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            assert processed._flags == EmailFlags(15)
+    finally:
+        sys.setswitchinterval(interval)
@@ -0,0 +1,24 @@
+from html_to_text import HtmlTextExtractor, html_to_text
+
+
+def test_quoted_angle_brackets_comments_and_scripts_are_not_text():
+    assert html_to_text('<p>Hi <a title="a>b" href=x>link</a> there</p>') == "Hi link there"
+    assert html_to_text("<p>Before<!-- <p>hidden</p> a > b --> after</p>") == "Before after"
+    assert html_to_text("<p>Rent</p><script>if (a < b && c > d) { x = '</p>'; }</script><p>due</p>") == "Rent\n\ndue"
+
+
+def test_unclosed_head_does_not_drop_the_document():
+    assert html_to_text("<html><head><title>Listings</title><p>Please compare the leases.</p>") == \
+        "Please compare the leases."
+    assert html_to_text("<head><meta charset=utf-8>Send the escrow schedule.") == "Send the escrow schedule."
+    assert html_to_text("<head><style>p {}</style></head><body><p>Dates</p></body>") == "Dates"
+
+
+def test_chunked_feed_matches_whole_document():
+    document = "<head><title>x</title></head><ol><li>Base rent &mdash; $32</li><li>CAM &amp; caps</li></ol>" * 50
+    extractor = HtmlTextExtractor()
+    for offset in range(0, len(document), 7):
+        extractor.feed(document[offset:offset + 7])
+    extractor.close()
+    assert extractor.get_text() == html_to_text(document)
+    assert html_to_text(document).startswith("1. Base rent — $32\n2. CAM & caps")
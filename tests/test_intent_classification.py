@@ -0,0 +1,69 @@
+from types import SimpleNamespace
+
+import pytest
+
+from intent_classification import (EmailIntent, EmailPriority, EmailTriage, classification_prompt, classify_email,
+                                   complete_classification)
+from system_prompt import ENHANCED_SYSTEM_PROMPT
+from token_accounting import COMPACT_SYSTEM_PROMPT, TokenLedger, token_ledger
+
+EMAIL = "Subject: Escrow dates\n\nPlease send the escrow schedule for 125 King St."
+
+
+class StubClient:
+    """Instructor-style client returning a fixed classification and recording the requests"""
+
+    def __init__(self, result):
+        self.result = result
+        self.requests = []
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    def create(self, **kwargs):
+        self.requests.append(kwargs)
+        return self.result.model_copy(deep=True)
+
+
+@pytest.fixture
+def client(classification):
+    return StubClient(classification)
+
+
+def test_full_prompt_is_the_default(client):
+    classify_email(EMAIL, llm_client=client)
+    classify_email(EMAIL, llm_client=client, compact_prompt=True)
+
+    assert client.requests[0]["messages"][0]["content"] == ENHANCED_SYSTEM_PROMPT
+    assert client.requests[1]["messages"][0]["content"] == COMPACT_SYSTEM_PROMPT
+    assert classification_prompt() == (ENHANCED_SYSTEM_PROMPT, 0)
+    assert classification_prompt(True)[1] > 0
+
+
+def test_usage_is_recorded_in_the_given_ledger(client):
+    before = token_ledger.requests
+    ledger = TokenLedger()
+    classify_email(EMAIL, llm_client=client, ledger=ledger)
+    classify_email(EMAIL, llm_client=client, ledger=None)
+    assert ledger.requests == 1
+    assert token_ledger.requests == before
+
+    classify_email(EMAIL, llm_client=client)
+    assert token_ledger.requests == before + 1
+
+
+def test_preprocessing_hints_are_applied(client):
+    client.result.priority = EmailPriority.MEDIUM
+    result = classify_email("Subject: URGENT\n\nSee the attached lease, needed ASAP.", llm_client=client)
+    assert result.priority == EmailPriority.HIGH
+    assert result.attachments_mentioned
+
+
+def test_complete_classification_passes_client_prompt_and_ledger(client):
+    triage = EmailTriage(primary_intent=EmailIntent.TRANSACTION_DATE_NAVIGATOR, priority=EmailPriority.MEDIUM,
+                         overall_confidence=0.6)
+    ledger = TokenLedger()
+    complete_classification(EMAIL, triage, llm_client=client, compact_prompt=True, ledger=ledger)
+
+    assert len(client.requests) == 1
+    assert client.requests[0]["messages"][0]["content"] == COMPACT_SYSTEM_PROMPT
+    assert "primary_intent=intent_transaction_date_navigator" in client.requests[0]["messages"][1]["content"]
+    assert ledger.requests == 1
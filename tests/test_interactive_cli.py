@@ -0,0 +1,64 @@
+import argparse
+
+import pytest
+
+import interactive_cli
+from interactive_cli import build_parser, run_command
+
+
+@pytest.fixture
+def parser():
+    return build_parser()
+
+
+def test_profile_is_a_flag_before_the_mode(parser):
+    args = parser.parse_args(["--profile", "stream", "in.jsonl", "out.jsonl"])
+    assert args.profile is True
+    assert args.profile_prefix == "profile"
+    assert (args.command, args.input, args.output) == ("stream", "in.jsonl", "out.jsonl")
+
+    args = parser.parse_args(["--profile", "--profile-prefix", "run1", "sample"])
+    assert (args.profile, args.profile_prefix, args.command) == (True, "run1", "sample")
+
+    args = parser.parse_args(["tokens"])
+    assert args.profile is False
+
+
+def test_stream_options(parser):
+    args = parser.parse_args(["stream", "in.jsonl", "out.jsonl", "--route", "--adaptive", "--hedge",
+                              "--hedge-rate", "0.2", "--coalesce", "--compact-prompt",
+                              "--shadow-model", "candidate", "--shadow-base-url", "http://127.0.0.1:8001"])
+    assert args.route and args.adaptive and args.hedge and args.coalesce and args.compact_prompt
+    assert args.hedge_rate == 0.2
+    assert (args.shadow_model, args.shadow_base_url, args.shadow_api_key) == ("candidate", "http://127.0.0.1:8001",
+                                                                             "test")
+
+    args = parser.parse_args(["stream", "in.jsonl", "out.jsonl"])
+    assert not (args.route or args.adaptive or args.hedge or args.coalesce or args.compact_prompt)
+    assert args.shadow_model is None
+
+
+def test_interactive_route_excludes_segmented(parser):
+    assert parser.parse_args(["interactive", "--route"]).route
+    with pytest.raises(SystemExit):
+        parser.parse_args(["interactive", "--route", "--segmented"])
+
+
+def test_every_mode_is_dispatched(parser, monkeypatch):
+    modes = {
+        "interactive": "interactive_mode", "triage": "triage_mode", "thread": "thread_mode",
+        "corpus": "corpus_mode", "tokens": "tokens_mode", "daemon": "daemon_mode",
+        "generate": "generate_mode", "batch": "batch_mode", "stream": "stream_mode",
+        "queue": "queue_mode", "sample": "sample_mode", "test": "test_mode", "multiline": "multiline_mode",
+    }
+    subparsers = next(action for action in parser._actions if action.dest == "command")
+    assert set(subparsers.choices) == set(modes)
+
+    called = []
+    for function in modes.values():
+        monkeypatch.setattr(interactive_cli, function, lambda *args, name=function: called.append(name))
+    for command in modes:
+        assert run_command(argparse.Namespace(command=command, segmented=False, route=False))
+    assert called == list(modes.values())
+
+    assert not run_command(parser.parse_args([]))
@@ -0,0 +1,34 @@
+from email.message import EmailMessage
+
+from mail_corpus import MailCorpus, message_text
+
+
+def multipart_message(message_id, subject, text):
+    message = EmailMessage()
+    message["Message-ID"] = message_id
+    message["From"] = "broker@client-example.com"
+    message["Subject"] = subject
+    message.set_content(text, cte="base64")
+    message.add_alternative(f"<p>{text}</p>", subtype="html", cte="base64")
+    return message.as_bytes()
+
+
+def test_messages_are_parsed_before_preprocessing(tmp_path):
+    path = tmp_path / "archive.mbox"
+    path.write_bytes(b"From a@example.com Mon Jun  2 09:00:00 2025\n"
+                     + multipart_message("<m1@example.com>", "Lease abstract", "Please abstract the lease.") + b"\n"
+                     + b"From b@example.com Mon Jun  2 09:00:00 2025\n"
+                     + multipart_message("<m2@example.com>", "Escrow dates", "Send the escrow schedule.") + b"\n")
+
+    with MailCorpus(str(path)) as corpus:
+        corpus.open_index()
+        assert [entry.message_id for entry in corpus.entries] == ["<m1@example.com>", "<m2@example.com>"]
+        processed = corpus.preprocess("<m2@example.com>")
+        assert processed.subject == "Escrow dates"
+        assert processed.clean_text == "Subject: Escrow dates\n\nSend the escrow schedule."
+        assert [p.subject for _, p in corpus.iter_processed()] == ["Lease abstract", "Escrow dates"]
+
+
+def test_html_body_is_used_when_there_is_no_plain_part():
+    raw = (b"Subject: Dates\nContent-Type: text/html; charset=utf-8\n\n<p>Send the schedule.</p>\n")
+    assert message_text(raw) == "Subject: Dates\n\n<p>Send the schedule.</p>\n"
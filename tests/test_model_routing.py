@@ -0,0 +1,48 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from email_preprocessing import preprocess_email
+from intent_classification import DEFAULT_MODEL, SMALL_MODEL
+from model_routing import ModelRouter
+
+SIMPLE = "Subject: Dates\n\nPlease send the escrow schedule."
+COMPLEX = ("Subject: Several requests\n\nHi team,\n\n"
+           "1. Please abstract the lease for the ground floor tenant\n"
+           "2. Pull comparable sales for the block from last year\n"
+           "3. Research the landlord's parent company and its holdings\n\n"
+           "Thanks.")
+
+
+def stub_classify(result, models, confidence=0.95):
+    def classify(processed, model, **kwargs):
+        models.append(model)
+        return result.model_copy(update={"overall_confidence": confidence})
+    return classify
+
+
+def test_emails_are_routed_by_complexity(classification):
+    models = []
+    router = ModelRouter(classify_fn=stub_classify(classification, models))
+    assert router.choose_model(preprocess_email(SIMPLE)) == SMALL_MODEL
+    assert router.choose_model(preprocess_email(COMPLEX)) == DEFAULT_MODEL
+
+    router.classify(SIMPLE)
+    # A model passed by a wrapper (e.g. CoalescingClassifier) doesn't override the route
+    router.classify(COMPLEX, model=SMALL_MODEL)
+    assert models == [SMALL_MODEL, DEFAULT_MODEL]
+
+
+def test_low_confidence_answers_are_escalated(classification):
+    models = []
+    router = ModelRouter(classify_fn=stub_classify(classification, models, confidence=0.5))
+    router.classify(SIMPLE)
+    assert models == [SMALL_MODEL, DEFAULT_MODEL]
+    report = router.report()
+    assert (report["small"]["calls"], report["escalated"]["calls"], report["large"]["calls"]) == (1, 1, 0)
+
+
+def test_route_stats_are_exact_under_concurrency(classification):
+    router = ModelRouter(classify_fn=stub_classify(classification, []))
+    processed = preprocess_email(SIMPLE)
+    with ThreadPoolExecutor(max_workers=16) as executor:
+        list(executor.map(lambda _: router.classify(processed), range(2000)))
+    assert router.report()["small"]["calls"] == 2000
@@ -0,0 +1,25 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from profiling import ProfileSession
+
+
+def square_sum(n):
+    return sum(i * i for i in range(n))
+
+
+def test_threaded_run_is_profiled(tmp_path, capsys):
+    results = []
+    with ProfileSession(str(tmp_path / "profile"), top_n=3, sample_interval=0.001) as session:
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            results = list(executor.map(square_sum, range(1000, 1020)))
+        thread = threading.Thread(target=square_sum, args=(50000,))
+        thread.start()
+        thread.join()
+
+    assert results == [square_sum(n) for n in range(1000, 1020)]
+    calls = {name: stat[1] for (_, _, name), stat in session.stats().stats.items()}
+    # All 20 worker calls plus the one in the plain thread were profiled
+    assert calls["square_sum"] == 21
+    assert (tmp_path / "profile.pstats").exists() and (tmp_path / "profile.collapsed").exists()
+    assert "Waiting on LLM" in capsys.readouterr().out
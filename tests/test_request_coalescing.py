@@ -0,0 +1,177 @@
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from request_coalescing import CoalescingClassifier, SingleFlight, coalescing_key
+
+
+def _start_leader(flight, key, fn):
+    """Run flight.do(key, fn) in a thread; returns the thread and a list receiving its outcome"""
+    outcome = []
+
+    def run():
+        try:
+            outcome.append(flight.do(key, fn))
+        except BaseException as e:   # KeyboardInterrupt in the leader tests
+            outcome.append(e)
+
+    thread = threading.Thread(target=run)
+    thread.start()
+    return thread, outcome
+
+
+def _wait_for_waiters(flight, key, count):
+    """Block until `count` callers (leader included) are registered on key"""
+    while flight._waiters.get(key, 0) < count:
+        threading.Event().wait(0.001)
+
+
+def test_coalescing_key_ignores_whitespace_only():
+    key = coalescing_key("Please  send\nthe schedule", "prompt", "model")
+    assert key == coalescing_key("Please send the schedule", "prompt", "model")
+    assert key != coalescing_key("Please send the schedule", "prompt", "other-model")
+    assert key != coalescing_key("Please send the schedule", "prompt", "model", context="reply #2")
+
+
+def test_concurrent_callers_share_one_call(classification):
+    flight, release, calls = SingleFlight(), threading.Event(), []
+
+    def slow():
+        calls.append(1)
+        release.wait(5)
+        return classification
+
+    leader, outcome = _start_leader(flight, "k", slow)
+    _wait_for_waiters(flight, "k", 1)
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        waiters = [executor.submit(flight.do, "k", slow) for _ in range(4)]
+        _wait_for_waiters(flight, "k", 5)
+        release.set()
+        results = [future.result(5) for future in waiters]
+    leader.join(5)
+
+    assert len(calls) == 1
+    assert outcome == [classification]
+    # Each waiter gets its own copy
+    assert all(result == classification and result is not classification for result in results)
+    assert len({id(result) for result in results}) == 4
+    report = flight.report()
+    assert (report["calls"], report["executed"], report["coalesced"], report["in_flight"]) == (5, 1, 4, 0)
+
+
+def test_errors_are_shared_with_waiters():
+    flight, release = SingleFlight(), threading.Event()
+
+    def failing():
+        release.wait(5)
+        raise ValueError("provider error")
+
+    leader, outcome = _start_leader(flight, "k", failing)
+    _wait_for_waiters(flight, "k", 1)
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        waiters = [executor.submit(flight.do, "k", failing) for _ in range(2)]
+        _wait_for_waiters(flight, "k", 3)
+        release.set()
+        for future in waiters:
+            with pytest.raises(ValueError, match="provider error"):
+                future.result(5)
+    leader.join(5)
+
+    assert isinstance(outcome[0], ValueError)
+    report = flight.report()
+    assert (report["errors"], report["coalesced_errors"], report["handoffs"]) == (1, 2, 0)
+
+
+def test_later_calls_run_again():
+    flight, calls = SingleFlight(), []
+    for _ in range(3):
+        flight.do("k", lambda: calls.append(1))
+    assert len(calls) == 3
+
+
+def test_interrupted_leader_hands_the_call_to_a_waiter():
+    flight, release = SingleFlight(), threading.Event()
+
+    def interrupted():
+        release.wait(5)
+        raise KeyboardInterrupt
+
+    leader, outcome = _start_leader(flight, "k", interrupted)
+    _wait_for_waiters(flight, "k", 1)
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        waiter = executor.submit(flight.do, "k", lambda: "waiter ran")
+        _wait_for_waiters(flight, "k", 2)
+        release.set()
+        assert waiter.result(5) == "waiter ran"
+    leader.join(5)
+
+    assert isinstance(outcome[0], KeyboardInterrupt)
+    report = flight.report()
+    assert (report["executed"], report["coalesced"], report["errors"], report["handoffs"]) == (2, 0, 0, 1)
+
+
+def test_cancelled_async_leader_still_resolves_waiters():
+    flight, calls = SingleFlight(), []
+
+    async def main():
+        release = asyncio.Event()
+
+        async def slow():
+            calls.append(1)
+            await release.wait()
+            return "result"
+
+        leader = asyncio.create_task(flight.do_async("k", slow))
+        await asyncio.sleep(0)
+        waiters = [asyncio.create_task(flight.do_async("k", slow)) for _ in range(3)]
+        await asyncio.sleep(0)
+        leader.cancel()
+        waiters[0].cancel()    # A cancelled waiter must not cancel the call for the others
+        await asyncio.sleep(0)
+        release.set()
+        return await asyncio.gather(leader, *waiters, return_exceptions=True)
+
+    leader, cancelled_waiter, *results = asyncio.run(main())
+    assert isinstance(leader, asyncio.CancelledError)
+    assert isinstance(cancelled_waiter, asyncio.CancelledError)
+    assert results == ["result", "result"]
+    assert len(calls) == 1
+    assert flight.report()["handoffs"] == 0
+
+
+def test_cancelled_async_call_is_retried_by_a_waiter():
+    flight, calls = SingleFlight(), []
+
+    async def main():
+        async def cancelled_once():
+            calls.append(1)
+            await asyncio.sleep(0.01)
+            if len(calls) == 1:
+                raise asyncio.CancelledError
+            return "retried"
+
+        leader = asyncio.create_task(flight.do_async("k", cancelled_once))
+        await asyncio.sleep(0)
+        waiter = asyncio.create_task(flight.do_async("k", cancelled_once))
+        return await asyncio.gather(leader, waiter, return_exceptions=True)
+
+    leader, waiter = asyncio.run(main())
+    assert isinstance(leader, asyncio.CancelledError)
+    assert waiter == "retried"
+    assert len(calls) == 2
+    assert flight.report()["handoffs"] == 1
+
+
+def test_coalescing_classifier_passes_arguments(classification):
+    seen = []
+
+    def classify_fn(processed, **kwargs):
+        seen.append((processed.clean_text, kwargs))
+        return classification
+
+    coalescer = CoalescingClassifier(classify_fn=classify_fn, prompt="prompt")
+    result = coalescer.classify("Subject: Dates\nSend the escrow schedule.", model="m", context="c")
+    assert result == classification
+    assert seen == [("Subject: Dates\n\nSend the escrow schedule.", {"model": "m", "context": "c"})]
@@ -0,0 +1,79 @@
+from email_preprocessing import preprocess_email
+from intent_classification import EmailIntent, EmailPriority
+from segment_classification import SegmentClassification, merge_segments, split_segments
+
+
+def segment(intent, priority="medium", confidence=0.8, actionable=True, actions=("Do it",), **fields):
+    values = dict(intent=intent, confidence=confidence, priority=priority, actionable=actionable,
+                  summary=f"{intent} request", key_actions=list(actions), entities=["12 Oak Ave"],
+                  specialist="Analyst", estimated_hours=2)
+    values.update(fields)
+    return SegmentClassification(**values)
+
+
+def test_primary_intent_has_the_highest_priority():
+    merged = merge_segments([
+        segment("intent_lease_abstraction", priority="medium", confidence=0.9),
+        segment("intent_comparison_loi_lease", priority="urgent", confidence=0.6),
+        segment("intent_clause_protect", priority="high", confidence=0.95),
+    ])
+    assert merged.primary_intent == EmailIntent.COMPARISON_LOI_LEASE
+    # Secondary intents keep the order of the email
+    assert merged.secondary_intents == [EmailIntent.LEASE_ABSTRACTION, EmailIntent.CLAUSE_PROTECT]
+    assert merged.priority == EmailPriority.URGENT
+
+
+def test_priority_ties_go_to_confidence_then_position():
+    merged = merge_segments([
+        segment("intent_lease_abstraction", confidence=0.7),
+        segment("intent_comparison_loi_lease", confidence=0.9),
+        segment("intent_clause_protect", confidence=0.9),
+    ])
+    assert merged.primary_intent == EmailIntent.COMPARISON_LOI_LEASE
+
+
+def test_segments_of_one_intent_are_combined():
+    merged = merge_segments([
+        segment("intent_lease_abstraction", priority="low", confidence=0.6, actions=["Abstract lease A"]),
+        segment("intent_lease_abstraction", priority="high", confidence=0.8,
+                actions=["Abstract lease B", "Abstract lease A"], estimated_hours=5),
+    ])
+    assert merged.secondary_intents == []
+    [details] = merged.intent_details
+    assert details.confidence == 0.8
+    assert details.key_actions == ["Abstract lease A", "Abstract lease B"]
+    assert merged.priority == EmailPriority.HIGH
+    assert merged.entities_mentioned == ["12 Oak Ave"]
+    assert merged.estimated_completion_time.startswith("5 hours")
+    assert merged.follow_up_required
+
+
+def test_non_actionable_segments_are_ignored_unless_all_are():
+    merged = merge_segments([
+        segment("intent_lease_abstraction"),
+        segment("intent_comparison_loi_lease", priority="urgent", actionable=False),
+    ])
+    assert merged.primary_intent == EmailIntent.LEASE_ABSTRACTION
+    assert merged.secondary_intents == []
+
+    merged = merge_segments([segment("intent_comparison_loi_lease", actionable=False)])
+    assert merged.primary_intent == EmailIntent.COMPARISON_LOI_LEASE
+    assert not merged.follow_up_required
+
+
+def test_split_segments_uses_list_items_and_trailing_text():
+    processed = preprocess_email(
+        "Subject: Three requests\n\nHi team, a few things for 12 Oak Ave:\n\n"
+        "1. Please abstract the lease for the ground floor tenant\n"
+        "2. Pull comparable sales for the block from last year\n\n"
+        "Also, loop in research on the zoning change for the site.")
+    split = split_segments(processed)
+    assert split.context.startswith("Subject: Three requests")
+    assert len(split.segments) == 3
+    assert split.segments[0].startswith("1. Please abstract")
+    assert split.segments[2].startswith("Also, loop in research")
+
+
+def test_short_list_items_are_not_split():
+    processed = preprocess_email("Subject: Docs\n\nPlease send:\n1. Lease\n2. Rent roll\n")
+    assert split_segments(processed).segments == []
@@ -0,0 +1,35 @@
+from intent_classification import EmailPriority
+from shadow_mode import ShadowClassifier
+from token_accounting import token_ledger
+
+
+def test_candidate_calls_use_the_shadow_ledger(classification):
+    ledgers = []
+
+    def candidate(processed, **kwargs):
+        ledgers.append(kwargs.get("ledger"))
+        return classification.model_copy(update={"priority": EmailPriority.LOW})
+
+    before = token_ledger.requests
+    shadow = ShadowClassifier(candidate_fn=candidate, primary_fn=lambda processed, **kwargs: classification,
+                              sample_rate=1.0, seed=0)
+    for _ in range(3):
+        assert shadow.classify("Subject: Dates\n\nSend the escrow schedule.") is classification
+    shadow.shutdown()
+
+    assert ledgers == [shadow.ledger] * 3
+    assert token_ledger.requests == before
+    report = shadow.report()
+    assert (report["sampled"], report["compared"]) == (3, 3)
+    assert (report["intent_agreement"], report["priority_agreement"]) == (1.0, 0.0)
+
+
+def test_samples_are_dropped_rather_than_queued(classification):
+    shadow = ShadowClassifier(candidate_fn=lambda processed, **kwargs: classification,
+                              primary_fn=lambda processed, **kwargs: classification,
+                              sample_rate=1.0, max_pending=1, max_workers=1, seed=0)
+    shadow._slots.acquire()     # The only slot is busy
+    shadow.classify("Subject: Dates\n\nSend the escrow schedule.")
+    shadow._slots.release()
+    shadow.shutdown()
+    assert (shadow.report()["sampled"], shadow.report()["dropped"]) == (0, 1)
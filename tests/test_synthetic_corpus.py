@@ -0,0 +1,20 @@
+from email_preprocessing import preprocess_email
+from mail_corpus import MailCorpus
+from synthetic_corpus import SyntheticCorpusGenerator, read_labels, write_mbox
+
+
+def test_mbox_labels_stay_out_of_the_messages(tmp_path):
+    path = str(tmp_path / "corpus.mbox")
+    emails = list(SyntheticCorpusGenerator(seed=5, html_rate=0.3, forward_rate=0.3).generate(40))
+    assert write_mbox(path, iter(emails)) == 40
+    assert read_labels(path) == {email.email_id: email.true_intents for email in emails}
+
+    with MailCorpus(path) as corpus:
+        corpus.open_index()
+        processed = dict(corpus.iter_processed())
+    assert list(processed) == [f"<{email.email_id}@synthetic.example.com>" for email in emails]
+    for email in emails:
+        clean_text = processed[f"<{email.email_id}@synthetic.example.com>"].clean_text
+        assert "intent_" not in clean_text and "synthetic.example.com" not in clean_text
+        # Parsing the archive gives back what was generated
+        assert clean_text == preprocess_email(email.content).clean_text
@@ -0,0 +1,109 @@
+import pytest
+
+import thread_processing
+from thread_processing import ThreadTracker, normalize_subject
+
+FIRST = """Message-ID: <m1@example.com>
+Subject: Lease abstract for 12 Oak Ave
+
+Please abstract the lease for 12 Oak Ave.
+
+The tenant is Acme Corp."""
+
+REPLY = """Message-ID: <m2@example.com>
+In-Reply-To: <m1@example.com>
+Subject: RE: Lease abstract for 12 Oak Ave
+
+Also pull the comparable sales for the block.
+
+On Mon, Jan 6, 2025 at 9:00 AM Jane wrote:
+> Please abstract the lease for 12 Oak Ave.
+>
+> The tenant is Acme Corp."""
+
+FORWARD = """Message-ID: <m3@example.com>
+References: <m1@example.com> <m2@example.com>
+Subject: Fwd: Lease abstract for 12 Oak Ave
+
+> Also pull the comparable sales for the block.
+
+> Please abstract the lease for 12 Oak Ave."""
+
+
+@pytest.fixture
+def calls(monkeypatch, classification):
+    """classify_email replaced by a stub recording the (text, context) of each call"""
+    recorded = []
+
+    def stub_classify(text, context=None, **kwargs):
+        recorded.append((text, context))
+        return classification
+
+    monkeypatch.setattr(thread_processing, "classify_email", stub_classify)
+    return recorded
+
+
+def test_normalize_subject_drops_reply_prefixes():
+    assert normalize_subject("Re: FWD: RE[2]:  Lease  Abstract") == "lease abstract"
+
+
+def test_reply_classifies_only_new_content(calls):
+    tracker = ThreadTracker()
+    first = tracker.process_message(FIRST)
+    reply = tracker.process_message(REPLY)
+
+    assert reply.thread_id == first.thread_id
+    assert reply.message_index == 2
+    assert "comparable sales" in reply.delta_text
+    assert "abstract the lease" not in reply.delta_text
+    assert "Acme" not in reply.delta_text
+
+    # The first message has no context; the reply gets the prior classification
+    assert calls[0][1] is None
+    assert "reply #" in calls[1][1] and "intent_transaction_date_navigator" in calls[1][1]
+
+
+def test_message_without_new_content_reuses_classification(calls, classification):
+    tracker = ThreadTracker()
+    tracker.process_message(FIRST)
+    tracker.process_message(REPLY)
+    forward = tracker.process_message(FORWARD)
+
+    assert forward.reused_previous
+    assert forward.delta_text == ""
+    assert forward.classification is classification
+    assert len(calls) == 2
+
+
+def test_threads_are_matched_by_subject_without_headers(calls):
+    tracker = ThreadTracker()
+    first = tracker.process_message("Subject: Escrow dates\n\nSend the escrow schedule.")
+    reply = tracker.process_message("Subject: Re: Escrow dates\n\nAnd the closing date, please.")
+
+    assert reply.thread_id == first.thread_id
+    assert "closing date" in reply.delta_text
+    assert "escrow schedule" not in reply.delta_text
+
+
+def test_new_message_with_the_same_subject_starts_a_new_thread(calls):
+    tracker = ThreadTracker()
+    first = tracker.process_message(FIRST)
+    unrelated = tracker.process_message("Message-ID: <m9@example.com>\nSubject: Lease abstract for 12 Oak Ave\n\n"
+                                        "Please abstract the renewed lease, a different tenant.")
+    reply = tracker.process_message("Message-ID: <m10@example.com>\nSubject: Re: Lease abstract for 12 Oak Ave\n\n"
+                                    "Any update?")
+
+    assert unrelated.thread_id != first.thread_id
+    assert unrelated.message_index == 1
+    # A reply without In-Reply-To/References still follows its subject (to the latest such thread)
+    assert reply.thread_id == unrelated.thread_id
+
+
+def test_evicted_threads_are_forgotten(calls):
+    tracker = ThreadTracker(max_threads=1)
+    tracker.process_message(FIRST)
+    tracker.process_message("Message-ID: <x@example.com>\nSubject: Other\n\nUnrelated request.")
+
+    reply = tracker.process_message(REPLY)
+    assert reply.message_index == 1
+    assert "abstract the lease" not in reply.delta_text  # Quoted history is still stripped
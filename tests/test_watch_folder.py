@@ -0,0 +1,88 @@
+import json
+import os
+
+import pytest
+
+from watch_folder import WatchFolderDaemon, _move_aside
+
+
+@pytest.fixture
+def daemon(tmp_path, classification):
+    classified = []
+
+    def stub_classify_stage(ctx, **kwargs):
+        classified.append(ctx.processed.clean_text)
+        ctx.result = classification
+        return ctx
+
+    daemon = WatchFolderDaemon(str(tmp_path / "drop"), settle_time=0, classify_stage_fn=stub_classify_stage)
+    daemon.classified = classified
+    return daemon
+
+
+def drop(daemon, name, content):
+    path = os.path.join(daemon.drop_dir, name)
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(content)
+    return path
+
+
+def test_result_is_written_and_input_moved(daemon):
+    path = drop(daemon, "a.eml", "Subject: Dates\n\nSend the escrow schedule.")
+    result_path = daemon.result_path(path)
+    daemon.process_file(path)
+
+    with open(result_path, encoding="utf-8") as f:
+        result = json.load(f)
+    assert result["source"] == "a.eml"
+    assert result["classification"]["primary_intent"] == "intent_transaction_date_navigator"
+    assert not os.path.exists(path)
+    assert os.listdir(daemon.processed_dir) == ["a.eml"]
+    assert daemon.processed_count == 1
+
+
+def test_reused_name_with_new_content_gets_its_own_result(daemon):
+    daemon.process_file(drop(daemon, "a.eml", "Subject: First\n\nFirst request."))
+    daemon.process_file(drop(daemon, "a.eml", "Subject: Second\n\nSecond request."))
+
+    assert len(daemon.classified) == 2
+    results = sorted(os.listdir(daemon.results_dir))
+    assert len(results) == 2 and all(name.startswith("a.eml.") for name in results)
+    # Neither input overwrote the other
+    assert len(os.listdir(daemon.processed_dir)) == 2
+
+
+def test_same_file_again_is_only_moved(daemon):
+    content = "Subject: Dates\n\nSend the escrow schedule."
+    daemon.process_file(drop(daemon, "a.eml", content))
+    daemon.process_file(drop(daemon, "a.eml", content))
+
+    assert len(daemon.classified) == 1
+    assert len(os.listdir(daemon.results_dir)) == 1
+    assert len(os.listdir(daemon.processed_dir)) == 2
+
+
+def test_move_aside_never_overwrites(tmp_path):
+    target = tmp_path / "processed"
+    target.mkdir()
+    moved = []
+    for i in range(5):
+        source = tmp_path / "a.eml"
+        source.write_text(str(i))
+        moved.append(_move_aside(str(source), str(target)))
+
+    assert len(set(moved)) == 5
+    assert sorted(open(path).read() for path in moved) == ["0", "1", "2", "3", "4"]
+
+
+def test_failed_file_is_moved_with_its_error(tmp_path):
+    def failing_stage(ctx, **kwargs):
+        raise RuntimeError("provider down")
+
+    daemon = WatchFolderDaemon(str(tmp_path / "drop"), settle_time=0, classify_stage_fn=failing_stage)
+    daemon.process_file(drop(daemon, "a.eml", "Subject: x\n\nbody"))
+
+    assert sorted(os.listdir(daemon.failed_dir)) == ["a.eml", "a.eml.error.txt"]
+    assert "provider down" in (tmp_path / "drop" / "failed" / "a.eml.error.txt").read_text()
+    assert daemon.failed_count == 1
+    assert os.listdir(daemon.results_dir) == []
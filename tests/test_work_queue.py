@@ -0,0 +1,110 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+from work_queue import WorkQueue, stable_shard
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.fixture
+def queue(tmp_path):
+    with WorkQueue(str(tmp_path / "queue.db"), lease_seconds=60.0, max_attempts=2) as queue:
+        queue.create_job("corpus.mbox", 2)
+        yield queue
+
+
+def _status(queue, shard):
+    return queue._db.execute("SELECT status, attempts, error FROM shards WHERE shard = ?", (shard,)).fetchone()
+
+
+def test_stable_shard_is_in_range_and_spreads():
+    shards = [stable_shard(f"<msg-{i}@example.com>", 8) for i in range(1000)]
+    assert set(shards) == set(range(8))
+    assert min(shards.count(shard) for shard in range(8)) > 60
+
+
+def test_stable_shard_is_the_same_in_every_process():
+    ids = [f"<msg-{i}@example.com>" for i in range(20)]
+    code = ("import sys; from work_queue import stable_shard; "
+            f"print([stable_shard(i, 16) for i in {ids!r}])")
+    outputs = {
+        subprocess.run([sys.executable, "-c", code], cwd=ROOT, capture_output=True, text=True, check=True,
+                       env={**os.environ, "PYTHONHASHSEED": seed}).stdout
+        for seed in ("1", "2")
+    }
+    assert outputs == {f"{[stable_shard(i, 16) for i in ids]}\n"}
+
+
+def test_create_job_is_idempotent_and_rejects_other_jobs(queue):
+    queue.create_job("corpus.mbox", 2)
+    with pytest.raises(ValueError):
+        queue.create_job("other.mbox", 4)
+
+
+def test_each_shard_is_leased_once(queue):
+    leases = [queue.lease("a"), queue.lease("b")]
+    assert sorted(lease.shard for lease in leases) == [0, 1]
+    assert queue.lease("c") is None
+    assert queue.progress()["leased"] == 2
+
+
+def test_expired_lease_is_requeued_and_lost(queue):
+    lease = queue.lease("a")
+    assert queue.requeue_expired(now=lease.lease_until + 1) == 1
+    assert _status(queue, lease.shard)[0] == "pending"
+    assert queue.renew(lease) is None
+
+    # Shards with the fewest attempts go first
+    assert queue.lease("b").shard != lease.shard
+    # The first worker's results still merge, but its lease no longer completes the shard
+    assert not queue.complete(lease, [("<m1>", "{}")])
+    assert queue.completed_ids(lease.shard) == {"<m1>"}
+
+
+def test_renewed_lease_is_not_requeued(queue):
+    lease = queue.lease("a")
+    renewed = queue.renew(lease)
+    assert renewed.lease_until >= lease.lease_until
+    assert queue.requeue_expired(now=lease.lease_until - 1) == 0
+    assert queue.complete(renewed, [("<m1>", "{}")])
+    assert _status(queue, lease.shard)[0] == "done"
+
+
+def test_shard_fails_when_leases_keep_expiring(queue):
+    first = queue.lease("a")
+    queue.lease("other")            # Keep the other shard out of the way
+    queue.requeue_expired(now=first.lease_until + 1)
+    second = queue.lease("b")
+    assert (second.shard, second.attempt) == (first.shard, 2)
+
+    queue.requeue_expired(now=second.lease_until + 1)
+    status, attempts, error = _status(queue, first.shard)
+    assert (status, attempts) == ("failed", 2)
+    assert "lease expired" in error
+
+
+def test_pending_shard_out_of_attempts_fails_on_lease(tmp_path):
+    path = str(tmp_path / "queue.db")
+    with WorkQueue(path, max_attempts=3) as queue:
+        queue.create_job("corpus.mbox", 1)
+        queue.release(queue.lease("a"), "worker crashed")
+    with WorkQueue(path, max_attempts=1) as queue:
+        assert queue.lease("b") is None
+        assert _status(queue, 0)[:2] == ("failed", 1)
+
+
+def test_results_merge_by_message_id(queue):
+    lease = queue.lease("a")
+    queue.complete(lease, [("<m1>", '{"v": 1}'), ("<m2>", '{"v": 1}')], errors={"<m3>": "boom"})
+    assert _status(queue, lease.shard)[0] == "pending"
+
+    queue.lease("other")            # The untouched shard goes first
+    retry = queue.lease("b")
+    assert (retry.shard, retry.attempt) == (lease.shard, 2)
+    queue.complete(retry, [("<m1>", '{"v": 2}')])
+    rows = dict(queue._db.execute("SELECT message_id, classification FROM results"))
+    assert rows == {"<m1>": '{"v": 2}', "<m2>": '{"v": 1}'}
+    assert _status(queue, lease.shard)[0] == "done"
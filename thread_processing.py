@@ -0,0 +1,289 @@
+import re
+import hashlib
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Set
+
+from intent_classification import classify_email, EmailClassification
+
+# Headers used to link a reply to the conversation it belongs to
+THREAD_HEADER_PATTERN = re.compile(r"^(Message-ID|In-Reply-To|References):[ \t]*(.*)$", re.IGNORECASE | re.MULTILINE)
+MESSAGE_ID_PATTERN = re.compile(r"<[^<>\s]+>")
+SUBJECT_PATTERN = re.compile(r"(?:^|\n)Subject:[ \t]*(.*?)(?:\n|$)", re.IGNORECASE)
+
+# Reply/forward prefixes stripped when normalising subjects ("Re: Fwd: RE[2]: ...")
+SUBJECT_PREFIX_PATTERN = re.compile(r"^\s*(?:(?:re|fw|fwd|aw|sv)(?:\[\d+\])?\s*:\s*)+", re.IGNORECASE)
+
+# Markers that start the quoted history of a reply; everything after them was already seen
+QUOTED_HISTORY_PATTERNS = [
+    re.compile(r"^\s*-+\s*Original Message\s*-+\s*$", re.IGNORECASE | re.MULTILINE),
+    re.compile(r"^\s*-+\s*Forwarded message\s*-+\s*$", re.IGNORECASE | re.MULTILINE),
+    re.compile(r"^On .{0,200}?wrote:\s*$", re.IGNORECASE | re.MULTILINE),
+    re.compile(r"^From:.*\n(?:Sent|Date):.*$", re.IGNORECASE | re.MULTILINE),
+]
+
+
+@dataclass
+class ThreadState:
+    """State kept for one conversation thread"""
+    thread_id: str
+    subject_key: str
+    message_count: int = 0
+    message_ids: List[str] = field(default_factory=list)
+    seen_paragraphs: Set[bytes] = field(default_factory=set)  # Digests of paragraphs already classified
+    last_classification: Optional[EmailClassification] = None
+
+
+@dataclass
+class ThreadMessageResult:
+    """Result of processing a single message within a thread"""
+    thread_id: str
+    message_index: int
+    delta_text: str   # Only the content that was new in this message
+    classification: Optional[EmailClassification]
+    reused_previous: bool  # True when nothing new was found and the prior classification was reused
+
+
+def normalize_subject(subject: str) -> str:
+    """Normalise a subject for thread matching by dropping reply/forward prefixes and case"""
+    subject = SUBJECT_PREFIX_PATTERN.sub("", subject or "")
+    return re.sub(r"\s+", " ", subject).strip().lower()
+
+
+def _paragraph_digest(paragraph: str) -> bytes:
+    """Stable digest of a paragraph, insensitive to quoting and whitespace"""
+    text = re.sub(r"(?m)^\s*>+\s?", "", paragraph)
+    text = re.sub(r"\s+", " ", text).strip().lower()
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=8).digest()
+
+
+def parse_thread_headers(email_text: str) -> Dict[str, object]:
+    """
+    Extract the threading headers (Message-ID, In-Reply-To, References) and subject.
+
+    Args:
+        email_text: Raw email text
+
+    Returns:
+        Dictionary with 'message_id', 'in_reply_to' (list), 'references' (list) and 'subject'
+    """
+    headers = {"message_id": None, "in_reply_to": [], "references": [], "subject": ""}
+
+    for name, value in THREAD_HEADER_PATTERN.findall(email_text):
+        ids = MESSAGE_ID_PATTERN.findall(value) or ([value.strip()] if value.strip() else [])
+        name = name.lower()
+        if name == "message-id" and ids:
+            headers["message_id"] = ids[0]
+        elif name == "in-reply-to":
+            headers["in_reply_to"].extend(ids)
+        elif name == "references":
+            headers["references"].extend(ids)
+
+    subject_match = SUBJECT_PATTERN.search(email_text)
+    if subject_match:
+        headers["subject"] = subject_match.group(1).strip()
+
+    return headers
+
+
+def strip_quoted_history(email_text: str) -> str:
+    """
+    Remove the quoted part of a reply: '>' quoted lines and everything after
+    an 'Original Message' / 'On ... wrote:' / 'From: ... Sent:' marker.
+    """
+    email_text = email_text.replace('\r\n', '\n').replace('\r', '\n')
+
+    # Drop threading headers so they never reach the classifier
+    email_text = THREAD_HEADER_PATTERN.sub("", email_text)
+
+    # Cut at the earliest quoted-history marker
+    cut = len(email_text)
+    for pattern in QUOTED_HISTORY_PATTERNS:
+        match = pattern.search(email_text)
+        if match and match.start() < cut:
+            cut = match.start()
+    email_text = email_text[:cut]
+
+    # Remove inline '>' quoted lines
+    lines = [line for line in email_text.split('\n') if not line.lstrip().startswith('>')]
+    return "\n".join(lines).strip()
+
+
+class ThreadTracker:
+    """
+    Tracks email conversations and classifies only the new content of each reply.
+
+    Messages are linked by In-Reply-To/References to earlier Message-IDs, falling
+    back to the normalised subject for replies/forwards (Re:, Fwd: ...) and for
+    messages without threading headers. Quoted history and any paragraph already seen
+    in the thread are removed, and the delta is classified with the thread's prior
+    classification as compact context. The work per message depends only on the
+    size of the new message, not on the length of the thread.
+    """
+
+    def __init__(self, max_threads: int = 10000):
+        """
+        Args:
+            max_threads: Maximum number of threads kept in memory (least recently used are evicted)
+        """
+        self.max_threads = max_threads
+        self.threads: "OrderedDict[str, ThreadState]" = OrderedDict()
+        self._message_to_thread: Dict[str, str] = {}
+        self._subject_to_thread: Dict[str, str] = {}
+        self._thread_counter = 0
+
+    def _find_thread(self, headers: Dict[str, object], subject_key: str) -> Optional[ThreadState]:
+        """Find the thread a message belongs to, if it is already being tracked"""
+        for message_id in list(headers["in_reply_to"]) + list(reversed(headers["references"])):
+            thread_id = self._message_to_thread.get(message_id)
+            if thread_id in self.threads:
+                return self.threads[thread_id]
+
+        # A message with its own threading headers and a plain subject starts a new
+        # conversation, even if an earlier thread had the same subject
+        has_headers = headers["message_id"] or headers["in_reply_to"] or headers["references"]
+        is_reply = SUBJECT_PREFIX_PATTERN.match(headers["subject"] or "") is not None
+        if subject_key and (is_reply or not has_headers):
+            thread_id = self._subject_to_thread.get(subject_key)
+            if thread_id in self.threads:
+                return self.threads[thread_id]
+
+        return None
+
+    def _new_thread(self, headers: Dict[str, object], subject_key: str) -> ThreadState:
+        """Create and register a new thread, evicting the oldest if over capacity"""
+        self._thread_counter += 1
+        thread_id = headers["message_id"] or subject_key or f"thread-{self._thread_counter}"
+        thread = ThreadState(thread_id=thread_id, subject_key=subject_key)
+        self.threads[thread_id] = thread
+
+        while len(self.threads) > self.max_threads:
+            _, evicted = self.threads.popitem(last=False)
+            if self._subject_to_thread.get(evicted.subject_key) == evicted.thread_id:
+                del self._subject_to_thread[evicted.subject_key]
+            for message_id in evicted.message_ids:
+                self._message_to_thread.pop(message_id, None)
+
+        return thread
+
+    def extract_delta(self, thread: ThreadState, email_text: str) -> List[str]:
+        """Return the paragraphs of a message that have not been seen earlier in the thread"""
+        new_content = strip_quoted_history(email_text)
+
+        # Subject lines are carried separately, so drop them from the delta
+        new_content = SUBJECT_PATTERN.sub("\n", new_content)
+
+        delta = []
+        for paragraph in re.split(r'\n\s*\n', new_content):
+            paragraph = paragraph.strip()
+            if not paragraph:
+                continue
+            digest = _paragraph_digest(paragraph)
+            if digest in thread.seen_paragraphs:
+                continue
+            delta.append(paragraph)
+
+        return delta
+
+    def process_message(self, email_text: str) -> ThreadMessageResult:
+        """
+        Classify a message in the context of its thread.
+
+        Args:
+            email_text: Raw email text, optionally with Message-ID/In-Reply-To/References headers
+
+        Returns:
+            ThreadMessageResult with the delta that was classified and its classification
+        """
+        headers = parse_thread_headers(email_text)
+        subject_key = normalize_subject(headers["subject"])
+
+        thread = self._find_thread(headers, subject_key)
+        if thread is None:
+            thread = self._new_thread(headers, subject_key)
+        else:
+            self.threads.move_to_end(thread.thread_id)
+
+        if headers["message_id"]:
+            self._message_to_thread[headers["message_id"]] = thread.thread_id
+            thread.message_ids.append(headers["message_id"])
+        if subject_key:
+            self._subject_to_thread[subject_key] = thread.thread_id
+
+        delta = self.extract_delta(thread, email_text)
+        thread.message_count += 1
+
+        if not delta and thread.last_classification is not None:
+            # Nothing new was said (e.g. a bare forward), keep the prior classification
+            print(f"[Debug] Thread {thread.thread_id}: no new content, reusing prior classification.")
+            return ThreadMessageResult(
+                thread_id=thread.thread_id,
+                message_index=thread.message_count,
+                delta_text="",
+                classification=thread.last_classification,
+                reused_previous=True
+            )
+
+        subject = headers["subject"]
+        delta_body = "\n\n".join(delta)
+        delta_text = f"Subject: {subject}\n\n{delta_body}" if subject else delta_body
+
+        classification = classify_email(delta_text, context=self.thread_context(thread))
+
+        for paragraph in delta:
+            thread.seen_paragraphs.add(_paragraph_digest(paragraph))
+        thread.last_classification = classification
+
+        return ThreadMessageResult(
+            thread_id=thread.thread_id,
+            message_index=thread.message_count,
+            delta_text=delta_text,
+            classification=classification,
+            reused_previous=False
+        )
+
+    @staticmethod
+    def thread_context(thread: ThreadState) -> Optional[str]:
+        """Build the compact context string describing the thread's prior classification"""
+        previous = thread.last_classification
+        if previous is None:
+            return None
+
+        secondary = ", ".join(str(i.value) for i in previous.secondary_intents) or "none"
+        return (
+            f"This email is reply #{thread.message_count} in an ongoing thread. "
+            f"Only the new content of the reply is shown. Earlier messages were classified as: "
+            f"primary_intent={previous.primary_intent.value}; secondary_intents={secondary}; "
+            f"priority={previous.priority.value}. Classify the new content, carrying over "
+            f"earlier intents only if the reply still refers to them."
+        )
+
+
+# Test function
+if __name__ == "__main__":
+    tracker = ThreadTracker()
+
+    first = """Message-ID: <a1@example.com>
+Subject: Riverfront Lofts closing schedule
+Hi team,
+
+Can you put together the critical dates for the Riverfront Lofts acquisition (inspection, loan contingency and closing)?
+
+Thanks,
+Morgan"""
+
+    reply = """Message-ID: <a2@example.com>
+In-Reply-To: <a1@example.com>
+Subject: RE: Riverfront Lofts closing schedule
+Also, please run a background check on Evergreen Property Holdings before we commit.
+
+On Mon, Jun 2, 2025 at 9:14 AM Morgan wrote:
+> Hi team,
+>
+> Can you put together the critical dates for the Riverfront Lofts acquisition (inspection, loan contingency and closing)?"""
+
+    for message in (first, reply):
+        result = tracker.process_message(message)
+        print(f"Thread: {result.thread_id} (message {result.message_index})")
+        print(f"Delta classified:\n{result.delta_text}")
+        print(f"Primary Intent: {result.classification.primary_intent}\n")
@@ -0,0 +1,228 @@
+import re
+import json
+import threading
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+from system_prompt import ENHANCED_SYSTEM_PROMPT
+
+# Use a real BPE tokenizer if available; otherwise fall back to a heuristic estimate
+try:
+    import tiktoken
+    _encoding = tiktoken.get_encoding("cl100k_base")
+except Exception:
+    _encoding = None
+
+# Heuristic token pieces: short word chunks, digit groups, single punctuation marks,
+# newline + indentation runs and runs of spaces (single spaces merge into the next word)
+_TOKEN_PIECE_PATTERN = re.compile(r"[A-Za-z]{1,6}|\d{1,3}|[^\sA-Za-z\d]|\n[ \t]*| {2,}|\t+")
+
+# Per-message overhead of the chat format (role markers, separators)
+MESSAGE_OVERHEAD_TOKENS = 4
+
+# Context window (in tokens) of the models we use
+MODEL_CONTEXT_WINDOWS = {
+    "llama3-70b-8192": 8192,
+    "llama-3.1-8b-instant": 131072,
+    "llama-3.3-70b-versatile": 131072,
+}
+DEFAULT_CONTEXT_WINDOW = 8192
+
+
+def estimate_tokens(text: str) -> int:
+    """Estimate the number of tokens in a text"""
+    if not text:
+        return 0
+    if _encoding is not None:
+        return len(_encoding.encode(text))
+    return len(_TOKEN_PIECE_PATTERN.findall(text))
+
+
+def estimate_messages_tokens(messages: List[Dict[str, str]]) -> int:
+    """Estimate the prompt tokens of a list of chat messages"""
+    return sum(estimate_tokens(message["content"]) + MESSAGE_OVERHEAD_TOKENS for message in messages)
+
+
+@dataclass
+class CompactionReport:
+    """Token counts before and after prompt compaction"""
+    original_tokens: int
+    compacted_tokens: int
+    json_blocks_minified: int
+
+    @property
+    def tokens_saved(self) -> int:
+        return self.original_tokens - self.compacted_tokens
+
+
+def _minify_json_blocks(prompt: str) -> Tuple[str, int]:
+    """Replace pretty-printed JSON objects that start a line with their minified form"""
+    decoder = json.JSONDecoder()
+    parts = []
+    position = 0
+    minified = 0
+
+    for match in re.finditer(r"(?m)^\{", prompt):
+        if match.start() < position:
+            continue
+        try:
+            obj, end = decoder.raw_decode(prompt, match.start())
+        except ValueError:
+            continue
+        parts.append(prompt[position:match.start()])
+        parts.append(json.dumps(obj, separators=(",", ":"), ensure_ascii=False))
+        position = end
+        minified += 1
+
+    parts.append(prompt[position:])
+    return "".join(parts), minified
+
+
+def compact_prompt(prompt: str) -> Tuple[str, CompactionReport]:
+    """
+    Compact a system prompt without changing its content: minify the few-shot
+    JSON examples and squeeze whitespace.
+
+    Args:
+        prompt: The prompt to compact
+
+    Returns:
+        Tuple of (compacted prompt, CompactionReport)
+    """
+    compacted, minified = _minify_json_blocks(prompt)
+    compacted = re.sub(r"[ \t]+\n", "\n", compacted)   # Trailing spaces
+    compacted = re.sub(r"\n{3,}", "\n\n", compacted)    # Runs of blank lines
+    compacted = compacted.strip()
+
+    return compacted, CompactionReport(
+        original_tokens=estimate_tokens(prompt),
+        compacted_tokens=estimate_tokens(compacted),
+        json_blocks_minified=minified
+    )
+
+
+COMPACT_SYSTEM_PROMPT, COMPACTION_REPORT = compact_prompt(ENHANCED_SYSTEM_PROMPT)
+
+
+@dataclass
+class BudgetCheck:
+    """Outcome of checking a request against the model's context window"""
+    prompt_tokens: int
+    max_completion_tokens: int
+    context_window: int
+    text: str          # The email text, trimmed if it did not fit
+    trimmed: bool
+
+    @property
+    def total_tokens(self) -> int:
+        return self.prompt_tokens + self.max_completion_tokens
+
+
+def check_token_budget(system_prompt: str, text: str, max_completion_tokens: int, model: str,
+                       threshold: float = 0.9, trim: bool = True) -> BudgetCheck:
+    """
+    Check that prompt + email text + max_completion_tokens fits the model's context window.
+
+    Warns when the request uses more than `threshold` of the window and, if `trim`
+    is set, shortens the email text (keeping its beginning) so the request fits.
+
+    Args:
+        system_prompt: System prompt sent with the request
+        text: Email text sent as the user message
+        max_completion_tokens: Completion budget requested
+        model: Model name (used to look up the context window)
+        threshold: Fraction of the context window that triggers a warning
+        trim: Whether to trim the text when the request doesn't fit
+
+    Returns:
+        BudgetCheck with the (possibly trimmed) text
+    """
+    window = MODEL_CONTEXT_WINDOWS.get(model, DEFAULT_CONTEXT_WINDOW)
+    system_tokens = estimate_tokens(system_prompt) + MESSAGE_OVERHEAD_TOKENS
+    text_tokens = estimate_tokens(text) + MESSAGE_OVERHEAD_TOKENS
+    total = system_tokens + text_tokens + max_completion_tokens
+    trimmed = False
+
+    if total > threshold * window:
+        print(f"[Warning] Request needs ~{total} tokens, {total / window:.0%} of the {window}-token context of {model}.")
+
+        available = window - system_tokens - max_completion_tokens - MESSAGE_OVERHEAD_TOKENS
+        if trim and text_tokens > available > 0:
+            # Cut proportionally, then tighten until the estimate fits
+            cut = int(len(text) * available / text_tokens)
+            while cut > 0 and estimate_tokens(text[:cut]) > available:
+                cut = int(cut * 0.95)
+            text = text[:cut]
+            text_tokens = estimate_tokens(text) + MESSAGE_OVERHEAD_TOKENS
+            trimmed = True
+            print(f"[Warning] Email text trimmed to ~{text_tokens} tokens to fit the context window.")
+
+    return BudgetCheck(
+        prompt_tokens=system_tokens + text_tokens,
+        max_completion_tokens=max_completion_tokens,
+        context_window=window,
+        text=text,
+        trimmed=trimmed
+    )
+
+
+class TokenLedger:
+    """Running totals of estimated and actual token use, for throughput forecasting"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.estimated_prompt_tokens = 0
+        self.tokens_saved = 0
+        self.actual_prompt_tokens = 0
+        self.actual_completion_tokens = 0
+
+    def record(self, estimated_prompt_tokens: int, tokens_saved: int, usage: Optional[Dict[str, int]] = None):
+        """Record one request (usage is the provider-reported token usage, if known)"""
+        with self._lock:
+            self.requests += 1
+            self.estimated_prompt_tokens += estimated_prompt_tokens
+            self.tokens_saved += tokens_saved
+            if usage:
+                self.actual_prompt_tokens += usage.get("prompt_tokens", 0)
+                self.actual_completion_tokens += usage.get("completion_tokens", 0)
+
+    def tokens_per_request(self) -> float:
+        """Average tokens per request; actual usage when reported, estimates otherwise"""
+        if not self.requests:
+            return 0.0
+        actual = self.actual_prompt_tokens + self.actual_completion_tokens
+        return (actual or self.estimated_prompt_tokens) / self.requests
+
+
+def forecast_throughput(tokens_per_request: float, tpm_limit: int, rpm_limit: Optional[int] = None) -> float:
+    """
+    Requests per minute sustainable under a tokens-per-minute (and optional requests-per-minute) limit.
+
+    Args:
+        tokens_per_request: Average tokens per request (prompt + completion)
+        tpm_limit: Tokens-per-minute limit of the account
+        rpm_limit: Optional requests-per-minute limit
+
+    Returns:
+        Maximum requests per minute
+    """
+    if tokens_per_request <= 0:
+        return float(rpm_limit) if rpm_limit else float("inf")
+    requests_per_minute = tpm_limit / tokens_per_request
+    if rpm_limit:
+        requests_per_minute = min(requests_per_minute, rpm_limit)
+    return requests_per_minute
+
+
+# Shared ledger updated by classify_email
+token_ledger = TokenLedger()
+
+
+# Test function
+if __name__ == "__main__":
+    report = COMPACTION_REPORT
+    print(f"Tokenizer: {'tiktoken cl100k_base' if _encoding is not None else 'heuristic estimate'}")
+    print(f"System prompt: ~{report.original_tokens} tokens -> ~{report.compacted_tokens} tokens after compaction")
+    print(f"Saved per request: ~{report.tokens_saved} tokens "
+          f"({report.json_blocks_minified} JSON examples minified)")
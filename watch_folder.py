@@ -0,0 +1,239 @@
+import os
+import json
+import time
+import signal
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Optional, Set, Tuple
+
+from pipeline import PipelineContext, preprocess_stage, classify_stage
+from mail_corpus import message_text
+
+# inotify wakes the daemon as soon as a file lands; without it we fall back to polling
+try:
+    from inotify_simple import INotify, flags as inotify_flags
+except ImportError:
+    INotify = None
+
+WATCHED_EXTENSIONS = (".eml", ".txt")
+
+
+def read_email_file(path: str) -> str:
+    """
+    Read a dropped email file as text for preprocessing.
+
+    .eml files are parsed so only the subject and the text body are kept
+    (text/plain preferred over text/html); .txt files are read as-is.
+    """
+    if not path.lower().endswith(".eml"):
+        with open(path, encoding="utf-8", errors="replace") as f:
+            return f.read()
+
+    with open(path, "rb") as f:
+        return message_text(f.read())
+
+
+def _atomic_write(path: str, content: str):
+    """Write a file so readers never observe a partial result"""
+    tmp_path = os.path.join(os.path.dirname(path), f".{os.path.basename(path)}.tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(content)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def _file_digest(path: str) -> str:
+    """SHA-256 of a file's content"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 16), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _move_aside(path: str, target_dir: str) -> str:
+    """Move a file into target_dir without overwriting an earlier file of the same name"""
+    name = os.path.basename(path)
+    target = os.path.join(target_dir, name)
+    stem, ext = os.path.splitext(name)
+    suffix = 0
+    while os.path.exists(target):
+        # Timestamp plus a counter, as several files of one name can be moved in the same millisecond
+        suffix += 1
+        target = os.path.join(target_dir, f"{stem}.{int(time.time() * 1000)}-{suffix}{ext}")
+    os.replace(path, target)
+    return target
+
+
+class WatchFolderDaemon:
+    """
+    Watches a drop directory and classifies new .eml/.txt files with a worker pool.
+
+    Each result is written atomically to results_dir as '<file name>.<sha256>.json'
+    (keyed on name and content, so a later file reusing a name gets its own result) and
+    the input is then moved to processed_dir (or failed_dir on error). Because inputs
+    leave the drop directory once handled, and a file whose result already exists is
+    only moved, a restarted daemon never reprocesses a file.
+    """
+
+    def __init__(self,
+                 drop_dir: str,
+                 results_dir: Optional[str] = None,
+                 processed_dir: Optional[str] = None,
+                 failed_dir: Optional[str] = None,
+                 workers: int = 4,
+                 poll_interval: float = 0.5,
+                 settle_time: float = 0.2,
+                 classify_kwargs: Optional[Dict] = None,
+                 classify_stage_fn: Callable[..., PipelineContext] = classify_stage):
+        """
+        Args:
+            drop_dir: Directory new email files are dropped into
+            results_dir: Where result JSON files are written (default: '<drop_dir>/results')
+            processed_dir: Where handled inputs are moved (default: '<drop_dir>/processed')
+            failed_dir: Where inputs that failed are moved (default: '<drop_dir>/failed')
+            workers: Number of classification worker threads
+            poll_interval: Seconds between directory scans (upper bound when inotify is available)
+            settle_time: A file must be unchanged for this long before it is picked up
+            classify_kwargs: Extra keyword arguments for classify_email
+            classify_stage_fn: Pipeline stage used to classify (replaceable for testing)
+        """
+        self.drop_dir = drop_dir
+        self.results_dir = results_dir or os.path.join(drop_dir, "results")
+        self.processed_dir = processed_dir or os.path.join(drop_dir, "processed")
+        self.failed_dir = failed_dir or os.path.join(drop_dir, "failed")
+        self.workers = workers
+        self.poll_interval = poll_interval
+        self.settle_time = settle_time
+        self.classify_kwargs = classify_kwargs or {}
+        self.classify_stage_fn = classify_stage_fn
+
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self._in_flight: Set[str] = set()
+        self._pending: Dict[str, Tuple[int, int, float]] = {}  # path -> (size, mtime_ns, first seen unchanged)
+        self.processed_count = 0
+        self.failed_count = 0
+
+        for directory in (self.drop_dir, self.results_dir, self.processed_dir, self.failed_dir):
+            os.makedirs(directory, exist_ok=True)
+
+    def result_path(self, path: str, digest: Optional[str] = None) -> str:
+        """Result file of an input: its name plus the SHA-256 of its content"""
+        digest = digest or _file_digest(path)
+        return os.path.join(self.results_dir, f"{os.path.basename(path)}.{digest}.json")
+
+    def stop(self):
+        """Ask the daemon to stop after in-flight files finish"""
+        self._stop.set()
+
+    def _ready_files(self):
+        """Yield files in the drop directory that have stopped changing"""
+        now = time.monotonic()
+        seen = set()
+        with os.scandir(self.drop_dir) as entries:
+            for entry in entries:
+                name = entry.name
+                if name.startswith(".") or not name.lower().endswith(WATCHED_EXTENSIONS) or not entry.is_file():
+                    continue
+                path = entry.path
+                seen.add(path)
+                if path in self._in_flight:
+                    continue
+
+                stat = entry.stat()
+                signature = (stat.st_size, stat.st_mtime_ns)
+                previous = self._pending.get(path)
+                if previous is None or previous[:2] != signature:
+                    self._pending[path] = signature + (now,)
+                    if self.settle_time > 0:
+                        continue
+                elif now - previous[2] < self.settle_time:
+                    continue
+
+                del self._pending[path]
+                yield path
+
+        # Forget files that disappeared before settling
+        for path in list(self._pending):
+            if path not in seen:
+                del self._pending[path]
+
+    def process_file(self, path: str):
+        """Classify one file, write its result atomically and move the input aside"""
+        try:
+            stat = os.stat(path)
+            digest = _file_digest(path)
+            result_path = self.result_path(path, digest)
+            if os.path.exists(result_path):
+                # Result for this exact file was written before a restart but the input wasn't moved yet
+                _move_aside(path, self.processed_dir)
+                print(f"[Daemon] {os.path.basename(path)} already classified; moved to {self.processed_dir}")
+                return
+
+            received_at = stat.st_mtime
+            ctx = preprocess_stage(PipelineContext(raw_text=read_email_file(path)))
+            self.classify_stage_fn(ctx, **self.classify_kwargs)
+
+            _atomic_write(result_path, json.dumps({
+                "source": os.path.basename(path),
+                "source_size": stat.st_size,
+                "source_mtime_ns": stat.st_mtime_ns,
+                "source_sha256": digest,
+                "timings": ctx.timings,
+                "arrival_to_result_seconds": round(time.time() - received_at, 3),
+                "classification": ctx.result.model_dump(mode="json")
+            }, indent=2))
+            _move_aside(path, self.processed_dir)
+            with self._lock:
+                self.processed_count += 1
+            print(f"[Daemon] Classified {os.path.basename(path)}: {ctx.result.primary_intent.value}")
+
+        except Exception as e:
+            print(f"[Daemon] Error processing {os.path.basename(path)}: {e}")
+            try:
+                moved = _move_aside(path, self.failed_dir)
+                _atomic_write(moved + ".error.txt", f"{type(e).__name__}: {e}\n")
+            except OSError:
+                pass
+            with self._lock:
+                self.failed_count += 1
+
+        finally:
+            with self._lock:
+                self._in_flight.discard(path)
+
+    def _wait_for_changes(self, watcher):
+        """Sleep until the next scan, waking early on inotify events"""
+        # Files waiting to settle are re-checked as soon as they could be ready
+        timeout = min(self.poll_interval, self.settle_time) if self._pending else self.poll_interval
+        if watcher is not None:
+            watcher.read(timeout=int(timeout * 1000))
+        else:
+            self._stop.wait(timeout)
+
+    def run(self):
+        """Watch the drop directory until stop() is called or SIGINT/SIGTERM is received"""
+        watcher = None
+        if INotify is not None:
+            watcher = INotify()
+            watcher.add_watch(self.drop_dir, inotify_flags.CLOSE_WRITE | inotify_flags.MOVED_TO | inotify_flags.CREATE)
+
+        if threading.current_thread() is threading.main_thread():
+            for sig in (signal.SIGINT, signal.SIGTERM):
+                signal.signal(sig, lambda *_: self.stop())
+
+        print(f"[Daemon] Watching {self.drop_dir} ({'inotify' if watcher else 'polling'}, {self.workers} workers)")
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="daemon") as pool:
+            while not self._stop.is_set():
+                for path in self._ready_files():
+                    with self._lock:
+                        self._in_flight.add(path)
+                    pool.submit(self.process_file, path)
+                self._wait_for_changes(watcher)
+
+        if watcher is not None:
+            watcher.close()
+        print(f"[Daemon] Stopped. Processed: {self.processed_count}, Failed: {self.failed_count}")
@@ -0,0 +1,410 @@
+import os
+import time
+import socket
+import sqlite3
+import hashlib
+from dataclasses import dataclass
+from concurrent.futures import ThreadPoolExecutor
+from multiprocessing import Process
+from typing import Callable, Dict, List, Optional, Tuple
+
+from mail_corpus import MailCorpus, CorpusEntry, message_text
+from email_preprocessing import preprocess_email
+from result_export import ResultWriter
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY CHECK (id = 1),
+    corpus TEXT NOT NULL,
+    shard_count INTEGER NOT NULL,
+    created_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS shards (
+    shard INTEGER PRIMARY KEY,
+    status TEXT NOT NULL DEFAULT 'pending',   -- pending, leased, done, failed
+    worker TEXT,
+    lease_until REAL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    error TEXT,
+    finished_at REAL
+);
+CREATE TABLE IF NOT EXISTS results (
+    message_id TEXT PRIMARY KEY,
+    shard INTEGER NOT NULL,
+    classification TEXT NOT NULL,
+    worker TEXT NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS results_by_shard ON results (shard);
+"""
+
+
+def stable_shard(message_id: str, shard_count: int) -> int:
+    """
+    Shard of a message id. Uses blake2b rather than hash(), which is salted per process,
+    so every node assigns a message to the same shard.
+    """
+    digest = hashlib.blake2b(message_id.encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "big") % shard_count
+
+
+@dataclass(frozen=True)
+class Lease:
+    """A shard handed to a worker until lease_until (time.time() seconds)"""
+    shard: int
+    shard_count: int
+    corpus: str
+    worker: str
+    attempt: int
+    lease_until: float
+
+
+class WorkQueue:
+    """
+    SQLite-backed coordinator handing out corpus shards to workers through leases.
+
+    The corpus is split into shard_count shards by a stable hash of the message id.
+    A worker leases a pending shard, processes it and completes it with its results;
+    results are merged with INSERT OR REPLACE keyed by message id, so a shard that is
+    processed twice (e.g. after its lease expired) merges to the same table.
+    Leases not renewed before they expire are re-queued for another worker.
+
+    The database file is the only shared state: workers on other nodes need it and
+    the corpus on a shared path. SQLite locking is reliable on local disks; for many
+    nodes over a network filesystem, put the queue on one node's local disk.
+    """
+
+    def __init__(self, db_path: str, lease_seconds: float = 300.0, max_attempts: int = 3):
+        """
+        Args:
+            db_path: Path of the SQLite queue database
+            lease_seconds: How long a lease lasts without renewal
+            max_attempts: Leases of a shard before it is marked failed
+        """
+        self.db_path = db_path
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self._db = sqlite3.connect(db_path, timeout=60.0, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(SCHEMA)
+
+    def close(self):
+        self._db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _transaction(self):
+        """BEGIN IMMEDIATE takes the write lock up front, so two workers never lease the same shard"""
+        self._db.execute("BEGIN IMMEDIATE")
+
+    def create_job(self, corpus: str, shard_count: int):
+        """
+        Register the corpus and its shards. Calling it again for the same job is a no-op,
+        so a restarted coordinator keeps progress.
+        """
+        self._transaction()
+        try:
+            job = self._db.execute("SELECT corpus, shard_count FROM jobs").fetchone()
+            if job is not None and job != (corpus, shard_count):
+                raise ValueError(f"Queue already holds job {job[0]} with {job[1]} shards")
+            self._db.execute("INSERT OR IGNORE INTO jobs VALUES (1, ?, ?, ?)", (corpus, shard_count, time.time()))
+            self._db.executemany("INSERT OR IGNORE INTO shards (shard) VALUES (?)",
+                                 [(shard,) for shard in range(shard_count)])
+            self._db.execute("COMMIT")
+        except BaseException:
+            self._db.execute("ROLLBACK")
+            raise
+
+    def requeue_expired(self, now: Optional[float] = None) -> int:
+        """
+        Return shards whose lease expired to the pending state; returns how many.
+        Shards that already used max_attempts leases are marked failed instead.
+        """
+        now = now or time.time()
+        self._db.execute(
+            "UPDATE shards SET status = 'failed', worker = NULL, lease_until = NULL, "
+            "error = 'lease expired after ' || attempts || ' attempts', finished_at = ? "
+            "WHERE status = 'leased' AND lease_until < ? AND attempts >= ?",
+            (now, now, self.max_attempts)
+        )
+        cursor = self._db.execute(
+            "UPDATE shards SET status = 'pending', worker = NULL WHERE status = 'leased' AND lease_until < ?",
+            (now,)
+        )
+        return cursor.rowcount
+
+    def lease(self, worker: str) -> Optional[Lease]:
+        """Lease the next pending shard (re-queuing expired leases first); None when nothing is left"""
+        now = time.time()
+        self._transaction()
+        try:
+            job = self._db.execute("SELECT corpus, shard_count FROM jobs").fetchone()
+            if job is None:
+                self._db.execute("COMMIT")
+                return None
+            self.requeue_expired(now)
+            # Pending shards out of attempts (e.g. the queue reopened with a lower max_attempts)
+            self._db.execute(
+                "UPDATE shards SET status = 'failed', finished_at = ?, "
+                "error = COALESCE(error, 'out of attempts') WHERE status = 'pending' AND attempts >= ?",
+                (now, self.max_attempts)
+            )
+            row = self._db.execute(
+                "SELECT shard, attempts FROM shards WHERE status = 'pending' ORDER BY attempts, shard LIMIT 1"
+            ).fetchone()
+            if row is None:
+                self._db.execute("COMMIT")
+                return None
+            shard, attempts = row
+            lease_until = now + self.lease_seconds
+            self._db.execute(
+                "UPDATE shards SET status = 'leased', worker = ?, lease_until = ?, attempts = ? WHERE shard = ?",
+                (worker, lease_until, attempts + 1, shard)
+            )
+            self._db.execute("COMMIT")
+        except BaseException:
+            self._db.execute("ROLLBACK")
+            raise
+        return Lease(shard, job[1], job[0], worker, attempts + 1, lease_until)
+
+    def renew(self, lease: Lease) -> Optional[Lease]:
+        """Extend a lease; returns the renewed lease, or None if it was lost (expired and re-leased)"""
+        lease_until = time.time() + self.lease_seconds
+        cursor = self._db.execute(
+            "UPDATE shards SET lease_until = ? WHERE shard = ? AND status = 'leased' AND worker = ? AND attempts = ?",
+            (lease_until, lease.shard, lease.worker, lease.attempt)
+        )
+        if cursor.rowcount == 0:
+            return None
+        return Lease(lease.shard, lease.shard_count, lease.corpus, lease.worker, lease.attempt, lease_until)
+
+    def completed_ids(self, shard: int) -> set:
+        """Message ids of a shard that already have a result"""
+        return {row[0] for row in self._db.execute("SELECT message_id FROM results WHERE shard = ?", (shard,))}
+
+    def complete(self, lease: Lease, results: List[Tuple[str, str]], errors: Optional[Dict[str, str]] = None) -> bool:
+        """
+        Merge a shard's results and finish its lease.
+
+        Results are merged even if the lease was lost, since they are keyed by message id.
+        A shard with per-message errors goes back to pending (its merged results are kept
+        and skipped next time) until max_attempts, then it is marked failed.
+
+        Args:
+            lease: The lease of the shard
+            results: (message_id, classification JSON) pairs
+            errors: message_id -> error of messages that failed
+
+        Returns:
+            True if the lease was still held
+        """
+        now = time.time()
+        self._transaction()
+        try:
+            self._db.executemany(
+                "INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?)",
+                [(message_id, lease.shard, classification, lease.worker, now) for message_id, classification in results]
+            )
+            if not errors:
+                status, error = "done", None
+            else:
+                status = "pending" if lease.attempt < self.max_attempts else "failed"
+                error = f"{len(errors)} messages failed, e.g. {next(iter(errors.items()))}"
+            cursor = self._db.execute(
+                "UPDATE shards SET status = ?, worker = NULL, lease_until = NULL, error = ?, finished_at = ? "
+                "WHERE shard = ? AND status = 'leased' AND worker = ? AND attempts = ?",
+                (status, error, now, lease.shard, lease.worker, lease.attempt)
+            )
+            self._db.execute("COMMIT")
+        except BaseException:
+            self._db.execute("ROLLBACK")
+            raise
+        return cursor.rowcount == 1
+
+    def release(self, lease: Lease, error: str):
+        """Give a shard back after a worker-level failure"""
+        status = "pending" if lease.attempt < self.max_attempts else "failed"
+        self._db.execute(
+            "UPDATE shards SET status = ?, worker = NULL, lease_until = NULL, error = ? "
+            "WHERE shard = ? AND status = 'leased' AND worker = ? AND attempts = ?",
+            (status, error, lease.shard, lease.worker, lease.attempt)
+        )
+
+    def progress(self) -> Dict[str, int]:
+        """Number of shards per status, and the number of merged results"""
+        counts = {"pending": 0, "leased": 0, "done": 0, "failed": 0}
+        for status, count in self._db.execute("SELECT status, COUNT(*) FROM shards GROUP BY status"):
+            counts[status] = count
+        counts["results"] = self._db.execute("SELECT COUNT(*) FROM results").fetchone()[0]
+        return counts
+
+    def finished(self) -> bool:
+        progress = self.progress()
+        return progress["pending"] == 0 and progress["leased"] == 0
+
+    def export(self, path: str) -> int:
+        """Write merged results to a JSON lines export (see result_export); returns the count"""
+        with ResultWriter(path) as writer:
+            for message_id, classification in self._db.execute(
+                    "SELECT message_id, classification FROM results ORDER BY message_id"):
+                writer.write_json(message_id, classification.encode("utf-8"))
+        return writer.count
+
+
+def default_worker_id() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def classify_to_json(processed) -> str:
+    """Default work function: classify a preprocessed email and serialize the result"""
+    from intent_classification import classify_email
+    return classify_email(processed).model_dump_json()
+
+
+class ShardWorker:
+    """
+    Leases shards from a WorkQueue and processes them until none are left.
+
+    Messages of a shard are preprocessed and classified by a small thread pool (the
+    work is dominated by waiting on the LLM); the lease is renewed while it runs.
+    """
+
+    def __init__(self,
+                 db_path: str,
+                 worker_id: Optional[str] = None,
+                 threads: int = 4,
+                 fn: Callable = classify_to_json,
+                 lease_seconds: float = 300.0):
+        """
+        Args:
+            db_path: Path of the SQLite queue database
+            worker_id: Name of this worker (default: 'host:pid')
+            threads: Messages of a shard processed concurrently
+            fn: Function turning a ProcessedEmail into the JSON stored as its result
+            lease_seconds: Lease length requested from the queue
+        """
+        self.queue = WorkQueue(db_path, lease_seconds=lease_seconds)
+        self.worker_id = worker_id or default_worker_id()
+        self.threads = threads
+        self.fn = fn
+        self.processed_count = 0
+        self.failed_count = 0
+        self._corpus: Optional[MailCorpus] = None
+        self._shards: Dict[int, List[CorpusEntry]] = {}
+
+    def _entries(self, lease: Lease) -> List[CorpusEntry]:
+        """Entries of the leased shard; the corpus is opened and hashed into shards once"""
+        if self._corpus is None or self._corpus.path != lease.corpus:
+            self._corpus = MailCorpus(lease.corpus)
+            self._corpus.open_index()
+            self._shards = {}
+            for entry in self._corpus.entries:
+                self._shards.setdefault(stable_shard(entry.message_id, lease.shard_count), []).append(entry)
+        return self._shards.get(lease.shard, [])
+
+    def _process(self, entry: CorpusEntry):
+        try:
+            return entry.message_id, self.fn(preprocess_email(message_text(self._corpus.slice(entry)))), None
+        except Exception as e:
+            return entry.message_id, None, f"{type(e).__name__}: {e}"
+
+    def process_shard(self, lease: Lease) -> bool:
+        """Process one leased shard and complete it; returns False if the lease was lost"""
+        done = self.queue.completed_ids(lease.shard)
+        entries = [entry for entry in self._entries(lease) if entry.message_id not in done]
+        results, errors = [], {}
+        renew_at = time.time() + self.queue.lease_seconds / 3
+
+        with ThreadPoolExecutor(max_workers=self.threads) as executor:
+            for message_id, result, error in executor.map(self._process, entries):
+                if error is None:
+                    results.append((message_id, result))
+                else:
+                    errors[message_id] = error
+                if time.time() >= renew_at:
+                    lease = self.queue.renew(lease) or lease
+                    renew_at = time.time() + self.queue.lease_seconds / 3
+
+        held = self.queue.complete(lease, results, errors)
+        self.processed_count += len(results)
+        self.failed_count += len(errors)
+        print(f"[Worker {self.worker_id}] Shard {lease.shard}/{lease.shard_count}: {len(results)} done, "
+              f"{len(errors)} failed, {len(done)} already merged" + ("" if held else " (lease lost)"))
+        return held
+
+    def run(self, wait: bool = True, idle_interval: float = 1.0):
+        """
+        Process shards until the job is finished.
+
+        Args:
+            wait: When no shard is pending, wait for leased shards (which may expire and be re-queued)
+            idle_interval: Seconds between lease attempts while waiting
+        """
+        while True:
+            lease = self.queue.lease(self.worker_id)
+            if lease is None:
+                if not wait or self.queue.finished():
+                    break
+                time.sleep(idle_interval)
+                continue
+            try:
+                self.process_shard(lease)
+            except Exception as e:
+                self.queue.release(lease, f"{type(e).__name__}: {e}")
+                raise
+        self.queue.close()
+        if self._corpus is not None:
+            self._corpus.close()
+
+
+def _run_worker(db_path: str, worker_id: str, threads: int, fn: Callable, lease_seconds: float):
+    ShardWorker(db_path, worker_id, threads=threads, fn=fn, lease_seconds=lease_seconds).run()
+
+
+def run_local_workers(db_path: str, workers: int = 4, threads: int = 4, fn: Callable = classify_to_json,
+                      lease_seconds: float = 300.0):
+    """Run worker processes on this node until the job is finished"""
+    processes = [Process(target=_run_worker,
+                         args=(db_path, f"{default_worker_id()}-{i}", threads, fn, lease_seconds))
+                 for i in range(workers)]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+
+
+# Test function
+if __name__ == "__main__":
+    import json
+    import tempfile
+    from mock_llm_server import start_mock_server
+    from synthetic_corpus import SyntheticCorpusGenerator, write_mbox
+
+    directory = tempfile.mkdtemp()
+    corpus_path = os.path.join(directory, "corpus.mbox")
+    write_mbox(corpus_path, SyntheticCorpusGenerator(seed=1).generate(400))
+
+    # Workers classify against a mock endpoint with a fixed latency per request
+    server = start_mock_server(latency=0.2)
+    endpoints_path = os.path.join(directory, "endpoints.json")
+    with open(endpoints_path, "w") as f:
+        json.dump([{"name": "mock", "api_key": "test", "base_url": f"http://127.0.0.1:{server.server_port}"}], f)
+    os.environ["LLM_ENDPOINTS_FILE"] = endpoints_path
+
+    for workers in (1, 2, 4):
+        db_path = os.path.join(directory, f"queue-{workers}.db")
+        with WorkQueue(db_path) as queue:
+            queue.create_job(corpus_path, shard_count=16)
+        start = time.perf_counter()
+        run_local_workers(db_path, workers=workers, threads=4)
+        elapsed = time.perf_counter() - start
+        with WorkQueue(db_path) as queue:
+            progress = queue.progress()
+            queue.export(os.path.join(directory, f"results-{workers}.jsonl"))
+        print(f"{workers} workers: {progress['results']} results in {elapsed:.2f}s "
+              f"({progress['results'] / elapsed:.0f} emails/s), shards: {progress}")